@@ -1,18 +1,21 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
 import heapq
 import os
 import sys
 from itertools import permutations
-import matplotlib
-matplotlib.use('Agg')
 
 PREFERRED_ROWS_DEFAULT = {0}       # top aisle row (free in create_warehouse)
 PREFERRED_COLS_DEFAULT = set()     # you can add a right-edge vertical lane if you want
 LANE_COST = 1
 NORMAL_COST = 5
 
+def _pyplot():
+    # matplotlib is only needed to draw; routing alone never imports it
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
 def _step_cost(cell, preferred_rows, preferred_cols):
     r, c = cell
     return LANE_COST if (r in preferred_rows or c in preferred_cols) else NORMAL_COST
@@ -122,9 +125,9 @@ def animate_dynamic_step_by_step(warehouse,
                                  optimize_order=True,
                                  lock_picked=True,
                                  shelf_interval=2):
-    import matplotlib.pyplot as plt
     import matplotlib.animation as animation
     from matplotlib.patches import FancyArrowPatch
+    plt = _pyplot()
 
     base_grid = warehouse.copy()
     obs = list(obstacles or [])
@@ -235,26 +238,9 @@ def animate_dynamic_step_by_step(warehouse,
 
 
 
-def run_pathfinding_animation_dynamic(
-    shelf_height,
-    shelf_count,
-    shelf_interval,
-    picking_locations,
-    obstacles=None,
-    save_path="static/path.gif",
-    optimize_order=True,
-    lock_picked=True,
-):
-    from matplotlib.animation import PillowWriter, FFMpegWriter
-    from matplotlib.patches import FancyArrowPatch
-    import os
-
-    os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
-
-    warehouse = create_warehouse(shelf_height, shelf_count, shelf_interval, obstacles)
-    route = order_stops(warehouse, picking_locations, optimize=optimize_order)
-
-    fig, ax = plt.subplots(figsize=(6, 7), facecolor="#f8f9fb")
+def _route_figure(warehouse, route, obstacles, shelf_interval):
+    """Figure with the static layers: grid, picks + shelf labels, obstacles."""
+    fig, ax = _pyplot().subplots(figsize=(6, 7), facecolor="#f8f9fb")
     ax.set_xticks([]); ax.set_yticks([]); ax.grid(False); ax.invert_yaxis()
     ax.set_title("Warehouse Route", fontsize=14, fontweight="semibold", pad=12)
     ax.set_facecolor("#ffffff")
@@ -274,10 +260,78 @@ def run_pathfinding_animation_dynamic(
         for ox, oy in obstacles:
             ax.plot(oy, ox, 's', markersize=8, markerfacecolor="#90caf9", markeredgecolor="#1565c0")
 
+    return fig, ax
+
+
+def _route_arrow():
+    from matplotlib.patches import FancyArrowPatch
+    return FancyArrowPatch((0, 0), (0, 0), arrowstyle='-|>', mutation_scale=14,
+                           linewidth=2.0, color="#c62828", alpha=0.95)
+
+
+def _route_segments(warehouse, route, lock_picked=True):
+    """Yields the grid path of each leg of the route; picked cells block later legs when lock_picked."""
+    picked = set([tuple(route[0])])
+    for i in range(len(route) - 1):
+        start = tuple(route[i])
+        goal = tuple(route[i + 1])
+
+        grid = warehouse.copy()
+        if lock_picked:
+            for px, py in picked:
+                if (px, py) != goal:
+                    grid[px, py] = 1
+
+        path = shortest_path(
+            grid, start, goal,
+            preferred_rows={0},  # <- hug the top aisle
+            preferred_cols=set()  # or e.g. {grid.shape[1]-1} for a right-edge vertical lane
+        )
+        if not path:
+            print(f"No path from {start} to {goal}")
+            continue
+
+        yield path
+        picked.add(goal)
+
+
+def run_pathfinding_animation_dynamic(
+    shelf_height,
+    shelf_count,
+    shelf_interval,
+    picking_locations,
+    obstacles=None,
+    save_path="static/path.gif",
+    optimize_order=True,
+    lock_picked=True,
+    timings=None,
+):
+    """
+    timings: optional dict; seconds spent routing ("solve"), drawing and
+    rasterizing frames ("render") and writing the file ("encode") are added to it.
+    """
+    from matplotlib.animation import PillowWriter, FFMpegWriter
+    import os
+    import time
+
+    def spent(stage, since):
+        now = time.perf_counter()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + (now - since)
+        return now
+
+    os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+
+    started = time.perf_counter()
+    warehouse = create_warehouse(shelf_height, shelf_count, shelf_interval, obstacles)
+    route = order_stops(warehouse, picking_locations, optimize=optimize_order)
+    started = spent("solve", started)
+
+    fig, ax = _route_figure(warehouse, route, obstacles, shelf_interval)
+
     # Dynamic layers
     line, = ax.plot([], [], '-', lw=2.5, color="#2e7d32", alpha=0.9)
-    arrow = FancyArrowPatch((0, 0), (0, 0), arrowstyle='-|>', mutation_scale=14,
-                            linewidth=2.0, color="#c62828", alpha=0.95)
+    arrow = _route_arrow()
     ax.add_patch(arrow); arrow.set_visible(False)
 
     def set_arrow(a, p0, p1):
@@ -285,7 +339,6 @@ def run_pathfinding_animation_dynamic(
         a.set_visible(True)
 
     full_path = []
-    picked = set([tuple(route[0])])
 
     # Writer selection as you had it
     ext = os.path.splitext(save_path)[1].lower()
@@ -296,25 +349,10 @@ def run_pathfinding_animation_dynamic(
 
     try:
         with writer.saving(fig, save_path, dpi=70):
-            for i in range(len(route) - 1):
-                start = tuple(route[i])
-                goal = tuple(route[i + 1])
-
-                grid = warehouse.copy()
-                if lock_picked:
-                    for px, py in picked:
-                        if (px, py) != goal:
-                            grid[px, py] = 1
-
-                path = shortest_path(
-                    grid, start, goal,
-                    preferred_rows={0},  # <- hug the top aisle
-                    preferred_cols=set()  # or e.g. {grid.shape[1]-1} for a right-edge vertical lane
-                )
-                if not path:
-                    print(f"No path from {start} to {goal}")
-                    continue
-
+            started = spent("render", started)
+            # segments are routed lazily, so each step of this loop is "solve" time
+            for path in _route_segments(warehouse, route, lock_picked):
+                started = spent("solve", started)
                 # Step through the path, update trail and arrow
                 for idx, step in enumerate(path):
                     full_path.append(step)
@@ -329,19 +367,55 @@ def run_pathfinding_animation_dynamic(
                         arrow.set_visible(False)
 
                     writer.grab_frame()
-
-                picked.add(goal)
+                started = spent("render", started)
+        # leaving writer.saving() assembles and writes the file
+        spent("encode", started)
     except FileNotFoundError as e:
         raise RuntimeError(
             "Failed to write animation. If you're saving to MP4 you need ffmpeg installed and in PATH. "
             "Either install ffmpeg or save as .gif to use PillowWriter."
         ) from e
     finally:
-        plt.close(fig)
+        _pyplot().close(fig)
 
     print("All paths done.")
 
 
+def render_route_snapshot(
+    shelf_height,
+    shelf_count,
+    shelf_interval,
+    picking_locations,
+    obstacles=None,
+    save_path="static/path.png",
+    optimize_order=True,
+    lock_picked=True,
+    image_format="png",
+    dpi=70,
+):
+    """
+    Still PNG/WebP of the finished route (the last frame of the animation),
+    drawn once with savefig instead of writing one frame per grid step.
+    """
+    warehouse = create_warehouse(shelf_height, shelf_count, shelf_interval, obstacles)
+    route = order_stops(warehouse, picking_locations, optimize=optimize_order)
+
+    fig, ax = _route_figure(warehouse, route, obstacles, shelf_interval)
+    try:
+        full_path = [step for path in _route_segments(warehouse, route, lock_picked) for step in path]
+        if full_path:
+            ax.plot([p[1] for p in full_path], [p[0] for p in full_path], '-', lw=2.5, color="#2e7d32", alpha=0.9)
+        if len(full_path) >= 2:
+            p0, p1 = full_path[-2], full_path[-1]
+            arrow = _route_arrow()
+            arrow.set_positions((p0[1], p0[0]), (p1[1], p1[0]))
+            ax.add_patch(arrow)
+
+        fig.savefig(save_path, format=image_format, dpi=dpi, facecolor=fig.get_facecolor())
+    finally:
+        _pyplot().close(fig)
+
+
 
 # if __name__ == "__main__":
 #     # your example
@@ -1,89 +1,116 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 import os
-import uuid
 import sys
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room
 import base64
 import io
-from PIL import Image
-import pandas as pd
+import json
 from flask_cors import CORS
-import serial
-import serial.tools.list_ports
 
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from ShelfSpaceOptimization.shelf_problem import FixedShelfPacker3D
-from RouteOptimization.path_finding import run_pathfinding_animation_dynamic
-from InboundOutboundForecast.inbound_outbound_forecast import predict_forecast_for_a_category
-from FireDetection.shelf_detection import process_image
-from InboundOutboundForecast.employee_perf import predict_performance
+from RouteOptimization.path_finding import render_route_snapshot
 from ShelfSpaceOptimization.shelf_problem_new import FixedShelfPacker3DIncremental
-from ShelfSpaceOptimization.shelf_compare import compare_packers
+from ShelfSpaceOptimization.shelf_portfolio import pack_portfolio, ORDERINGS
+from ShelfSpaceOptimization.shelf_state import ColumnarState
+from ShelfSpaceOptimization.shelf_state_store import PackingStateStore, StateVersionConflict, pack_delta, CONFIG_KEYS
+from ShelfSpaceOptimization.shelf_compaction import plan_compaction
+from ShelfSpaceOptimization.shelf_sharding import pack_sharded
+from ShelfSpaceOptimization.shelf_batch import pack_batch, iter_batch
+from ServerRuntime.job_queue import JobQueue, QueueFull
+from ServerRuntime.job_store import JobStore
+from ServerRuntime.frame_slots import FrameSlots, native_thread_runner
+from ServerRuntime.serial_writer import serial_writer_from_env
+from ServerRuntime.warmup import warm_up, parse_subsystems
+from ServerRuntime.model_registry import models
+from ServerRuntime.metrics import metrics, install as install_metrics
+from ServerRuntime.performance_batch import records_frame, iter_predictions, predict_batch
+from ServerRuntime.forecasts import forecast_cache, cached_forecast, forecast_data_args, forecast_batch
+from ServerRuntime.jobs import JOB_KINDS, run_generate, run_generate_incremental, run_compare, run_pathfinding, artifact_cache
+
+# ---------- Models ----------
+# Loaded once per process through the registry (ServerRuntime/model_registry.py):
+# preloaded and warmed by boot(), or on first use otherwise. Forecasts go through
+# ServerRuntime/forecasts.py (cached, shared by the forecast endpoints).
+
+def process_image(image):
+    detect = models.get("fire_detection")
+    with metrics.stage("inference"):
+        # off the event loop under eventlet/gevent, see run_native below
+        return run_native(detect, image)
+
+
+def predict_performance(data):
+    predict = models.get("employee_performance")
+    with metrics.stage("inference"):
+        return predict(data)
+
+
+def boot():
+    """
+    Per-process start-up, before serving:
+      PRELOAD_MODELS  all (default) | none | comma-separated model names
+      WARMUP          subsystems to import up front, see ServerRuntime/warmup.py
+    """
+    preload = os.getenv("PRELOAD_MODELS", "all").strip()
+    if preload != "none":
+        models.preload(None if preload == "all" else [n.strip() for n in preload.split(",") if n.strip()])
+    # e.g. WARMUP=all or WARMUP=render,fire to load those subsystems before serving
+    for name, entry in warm_up(parse_subsystems(os.getenv("WARMUP"))).items():
+        print(f"[Warmup] {name}: {'ok' if entry['ok'] else entry['error']} ({entry['ms']:.0f} ms)")
+
 
 app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Set by Server/serve.py for multi-worker serving; defaults keep `python main.app.py` as before
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    async_mode=os.getenv("SOCKETIO_ASYNC_MODE") or None,
+    message_queue=os.getenv("SOCKETIO_MESSAGE_QUEUE") or None,
+)
+# CPU-bound inference runs on a real thread (eventlet.tpool / gevent threadpool), inline for threading
+run_native = native_thread_runner(socketio.async_mode)
 CORS(app)
+# Per-route latency / in-flight / status counts for GET /metrics
+install_metrics(app, metrics)
+
+# Server-side packing state (per warehouse, versioned) for /generate-delta
+packing_state_store = PackingStateStore(os.getenv("PACKING_STATE_DB", "state/packing_state.sqlite3"))
+
+
+def _emit_job_event(event, job):
+    # clients join the job's room with the "subscribe_job" event
+    socketio.emit(event, job, to=job["job_id"])
+    if event == "job_finished":
+        metrics.observe_job(job)
+
+
+# Background jobs for the heavy endpoints (POST /jobs); bounded so overload turns into 429s.
+# JOB_STORE_PATH (set by serve.py with several workers) shares job records between processes.
+job_queue = JobQueue(
+    max_workers=int(os.getenv("JOB_WORKERS", "2")),
+    max_queued=int(os.getenv("JOB_QUEUE_SIZE", "16")),
+    on_event=_emit_job_event,
+    store=JobStore.from_env(),
+)
 
 # ---------- Arduino Serial Config ----------
-SERIAL_BAUD = 9600
-# Let users override; default to a likely port
-SERIAL_PORT = os.getenv("ARDUINO_PORT", "COM3" if os.name == "nt" else "/dev/ttyUSB0")
-arduino_ser = None
+# Serial writes happen on the writer's thread; handlers only enqueue. Any pyserial
+# URL works as ARDUINO_PORT, e.g. loop:// to run without hardware. Under serve.py
+# the launcher owns the port and this is a relay client (ARDUINO_RELAY).
+arduino = serial_writer_from_env()
 
 def init_serial():
-    global arduino_ser
-    try:
-        arduino_ser = serial.Serial(SERIAL_PORT, SERIAL_BAUD, timeout=0.5)
-        print(f"[Serial] Connected to {SERIAL_PORT} @ {SERIAL_BAUD}")
-    except Exception as e:
-        arduino_ser = None
-        print(f"[Serial] Could not open {SERIAL_PORT} ({e}). Set ARDUINO_PORT env var to the correct port.")
-
-# def init_serial():
-#     global arduino_ser
-#     try:
-#         port = SERIAL_PORT
-#         # If a URL like loop:// is provided, use serial_for_url; otherwise normal Serial
-#         if port and "://" in port:
-#             arduino_ser = serial.serial_for_url(port, SERIAL_BAUD, timeout=0.5)
-#         else:
-#             arduino_ser = serial.Serial(port, SERIAL_BAUD, timeout=0.5)
-#         print(f"[Serial] Connected to {port} @ {SERIAL_BAUD}")
-#     except Exception as e:
-#         arduino_ser = None
-#         print(f"[Serial] Could not open {SERIAL_PORT} ({e}). Set ARDUINO_PORT to the correct port.")
+    arduino.start()
 
 def send_to_arduino(line: str):
     """
-    Sends a single line (e.g., '1,0,0,0\\n') to Arduino, if serial is available.
+    Queues a single line (e.g., '1,0,0,0\\n') for the Arduino; never blocks.
+    Repeats of the current signal are coalesced (the heartbeat keeps it fresh).
     """
-    global arduino_ser
-    if not arduino_ser or not arduino_ser.is_open:
-        return
-    try:
-        if not line.endswith("\n"):
-            line += "\n"
-        arduino_ser.write(line.encode("utf-8"))
-    except Exception as e:
-        print(f"[Serial] Write error: {e}")
-
-# def send_to_arduino(line: str):
-#     global arduino_ser
-#     if not arduino_ser or not arduino_ser.is_open:
-#         return
-#     try:
-#         if not line.endswith("\n"):
-#             line += "\n"
-#         arduino_ser.write(line.encode("utf-8"))
-#
-#         # Only for loop:// testing — read back what we just wrote
-#         echoed = arduino_ser.readline().decode("utf-8", errors="ignore").strip()
-#         if echoed:
-#             print(f"[Serial][echo] {echoed}")
-#     except Exception as e:
-#         print(f"[Serial] Write error: {e}")
+    arduino.send(line)
 
 def encode_direction(full_direction: str | None) -> str:
     """
@@ -141,30 +168,143 @@ def pick_top_fire_direction(result: dict) -> str:
 #     finally:
 #         return True  # ack
 
+def _frame_bytes(image):
+    # binary websocket frames arrive as bytes; data URLs / base64 strings still work
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    return base64.b64decode(image.split(",")[-1])
+
+
+def _detect_fire(frames):
+    # FrameSlots hands over one frame at a time (batch_size=1); decoding happens
+    # here so dropped frames are never decoded
+    with metrics.route("socket:detect_fire_from_frame"):
+        return [process_image(io.BytesIO(_frame_bytes(frame))) for frame in frames]
+
+
+def _emit_fire_result(sid, result, latency):
+    if "error" in result:
+        send_to_arduino("0,0,0,0")
+    else:
+        send_to_arduino(pick_top_fire_direction(result))
+    socketio.emit('fire_detection_result', {**result, "latency_ms": latency * 1000.0}, to=sid)
+
+
+# One waiting frame per camera connection (newer frames replace it). Inference
+# stays per frame: the detector (FireDetection.shelf_detection.process_image)
+# takes a single image, so grouping frames from several cameras would only
+# queue them behind each other without sharing a model call.
+fire_frames = FrameSlots(
+    infer_batch=_detect_fire,
+    on_result=_emit_fire_result,
+    spawn=socketio.start_background_task,
+)
+
+
 @socketio.on('detect_fire_from_frame')
 def handle_detect_fire_from_frame(data):
-    try:
-        image_base64 = data.get("image")
-        if not image_base64:
-            emit('fire_detection_result', {"error": "No image received"})
-            # send "nofire" when nothing received (optional)
-            send_to_arduino("0,0,0,0")
-            return True  # ack
+    """
+    Accepts {"image": <base64 | data URL | bytes>} or the raw bytes of a binary
+    frame. The frame goes to this connection's slot and the ack returns at once;
+    'fire_detection_result' is emitted when inference on it (or on a newer
+    frame that replaced it) finishes.
+    """
+    image = data if isinstance(data, (bytes, bytearray)) else (data or {}).get("image")
+    if not image:
+        emit('fire_detection_result', {"error": "No image received"})
+        # send "nofire" when nothing received (optional)
+        send_to_arduino("0,0,0,0")
+        return True  # ack
+
+    fire_frames.put(request.sid, image)
+    return True  # ack
+
+
+@socketio.on('disconnect')
+def handle_disconnect(*args):
+    fire_frames.discard(request.sid)
+
+
+@app.route('/detect-fire/stats', methods=['GET'])
+def fire_frame_stats():
+    return jsonify(fire_frames.stats())
+
 
-        image_bytes = base64.b64decode(image_base64.split(",")[-1])
-        result = process_image(io.BytesIO(image_bytes))
+@app.route('/models', methods=['GET'])
+def model_stats():
+    """Per model: state, load_ms, warmup_ms, rss_mb (growth while loading + warming), error, warmup_error."""
+    return jsonify(models.stats())
 
-        # --- NEW: send signal to Arduino
-        signal = pick_top_fire_direction(result)
-        send_to_arduino(signal)
 
-        emit('fire_detection_result', result)
+@app.route("/forecast-batch", methods=["POST"])
+def get_forecast_batch():
+    """
+    Many forecasts in one round trip (e.g. the whole category overview).
+    Request JSON:
+    {
+        "requests": [{"category": "A", "start_month": 1, "end_month": 3, ...}, ...],
+        "categories": ["A", "B", ...],   # OPTIONAL shorthand: one request per category
+        "defaults": {"start_month": 1, "end_month": 3, "year": 2025},   # OPTIONAL, under every request
+        "timeout_seconds": null          # OPTIONAL: forecasts still running after this fail
+    }
+    Parameters and defaults are those of /forecast-data. Uncached forecasts run
+    concurrently on a process pool; results come back as one columnar payload
+    ("columns", "data" with a "request" column, per-request "requests" records).
+    """
+    try:
+        data = request.get_json() or {}
+        requests_ = list(data.get("requests") or []) + [{"category": c} for c in data.get("categories") or []]
+        if not requests_:
+            return jsonify({"error": "requests or categories must be a non-empty list"}), 400
+        defaults = data.get("defaults") or {}
+        if not isinstance(defaults, dict):
+            return jsonify({"error": "defaults must be an object"}), 400
+
+        return jsonify(forecast_batch(requests_, shared=defaults, timeout=data.get("timeout_seconds")))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        emit('fire_detection_result', {"error": str(e)})
-        # optional: send "nofire" on error
-        send_to_arduino("0,0,0,0")
-    finally:
-        return True  # ack
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/forecast/stats', methods=['GET'])
+def forecast_cache_stats():
+    return jsonify(forecast_cache.stats())
+
+
+@app.route('/arduino/stats', methods=['GET'])
+def arduino_stats():
+    return jsonify(arduino.stats())
+
+
+# ---------- Metrics ----------
+
+def _forecast_cache_counts():
+    stats = forecast_cache.stats()
+    # callers that joined an in-flight forecast did not run the model: count them as hits
+    return {"hits": stats["hits"] + stats["shared"], "misses": stats["misses"]}
+
+
+# Artifact cache kinds: generate / generate-incremental / pathfinding (GIFs),
+# route (route snapshots), shelf_full / shelf_incremental (layout snapshots)
+metrics.register_cache("artifact", artifact_cache.stats)
+metrics.register_cache("forecast", _forecast_cache_counts)
+metrics.register_gauge("job_queue_active", "Background jobs running right now.", lambda: job_queue.stats()["active"])
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Prometheus text format, for this server process:
+      http_request_duration_seconds / http_requests_total / http_requests_in_flight  per route
+      stage_duration_seconds{route,stage}  solve | render | encode | inference
+      job_duration_seconds, job_queue_wait_seconds                              POST /jobs
+      cache_hits_total / cache_misses_total / cache_hit_ratio{cache,kind}        artifact + forecast caches
+    Every series also carries pid="<this process>" (one per serve.py worker).
+    e.g. where /generate time goes:
+      sum by (stage) (rate(stage_duration_seconds_sum{route="/generate"}[5m]))
+    """
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route('/generate-incremental', methods=['POST'])
@@ -183,135 +323,590 @@ def generate_incremental():
         "selected_shelf_id": null,
         "compatibility_rules": { ... },
         "items": [ [w,h,d,"type","color"], ... ],           # NEW items only
-        "existing_state": { ... }                            # OPTIONAL: result from previous run
+        "existing_state": { ... },                           # OPTIONAL: result from previous run
+        "existing_state_columnar": "<base64>",               # OPTIONAL: same, compact binary form
+        "state_format": "json" | "columnar"                  # OPTIONAL: form of the returned state
     }
     """
     try:
-        data = request.get_json()
+        return jsonify(run_generate_incremental(request.get_json()))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        shelf_width = data.get('shelf_width')
-        shelf_height = data.get('shelf_height')
-        shelf_depth = data.get('shelf_depth')
-        shelf_count = data.get('shelf_count')
-        selected_shelf_id = data.get('selected_shelf_id')
-        compatibility_rules = data.get('compatibility_rules')
-        items_to_pack = data.get('items', [])
-        existing_state = data.get('existing_state')  # pass what you loaded from MongoDB
 
-        if not all([shelf_width, shelf_height, shelf_depth, shelf_count, compatibility_rules]) \
-           or items_to_pack is None:
-            return jsonify({"error": "Missing required parameters"}), 400
+@app.route('/generate-incremental-stream', methods=['POST'])
+def generate_incremental_stream():
+    """
+    Streaming incremental packing for very large inbound batches.
+    Request body is NDJSON:
+        line 1: the /generate-incremental parameters WITHOUT "items"
+                (optionally "return_state": true to get the final state at the end)
+        line 2..n: one item per line, [w,h,d,"type","color"]
+    Response is NDJSON: one {"event": "placed"|"unplaced", ...} line per item as it
+    is processed, then {"event": "summary", ...} (and {"event": "state", ...} if asked).
+    Items reported as "unplaced" are not repeated in the final state's unplaced_items.
+    """
+    lines = (line for line in request.stream if line.strip())
+    try:
+        header = json.loads(next(lines))
+    except (StopIteration, ValueError):
+        return jsonify({"error": "First NDJSON line must be the packing parameters"}), 400
 
+    required = ["shelf_width", "shelf_height", "shelf_depth", "shelf_count", "compatibility_rules"]
+    if not all(header.get(k) for k in required):
+        return jsonify({"error": f"Missing required parameters: {required}"}), 400
+
+    try:
         packer = FixedShelfPacker3DIncremental(
-            shelf_width=shelf_width,
-            shelf_height=shelf_height,
-            shelf_depth=shelf_depth,
-            shelf_count=shelf_count,
-            compatibility_rules=compatibility_rules,
-            selected_shelf_id=selected_shelf_id,
-            existing_state=existing_state
+            shelf_width=header['shelf_width'],
+            shelf_height=header['shelf_height'],
+            shelf_depth=header['shelf_depth'],
+            shelf_count=header['shelf_count'],
+            compatibility_rules=header['compatibility_rules'],
+            selected_shelf_id=header.get('selected_shelf_id'),
+            existing_state=header.get('existing_state')
         )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        for item in items_to_pack:
-            packer.add_item(*item)
+    def generate_lines():
+        placed = unplaced = 0
+        try:
+            for record in packer.iter_place_items(json.loads(line) for line in lines):
+                if record["event"] == "placed":
+                    placed += 1
+                else:
+                    unplaced += 1
+                yield json.dumps(record) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "error", "error": str(e)}) + "\n"
+            return
 
-        # Place only the NEW items; existing placements stay fixed
-        packer.place_all_new_items()
+        yield json.dumps({"event": "summary", "placed": placed, "unplaced": unplaced}) + "\n"
+        if header.get("return_state"):
+            yield json.dumps({"event": "state", "result": packer.get_packing_result_json()}) + "\n"
 
-        # Save to unique file
-        filename = f"static/shelf_inc_{uuid.uuid4().hex}.gif"
-        packer.animate(save_path=filename)
+    return Response(stream_with_context(generate_lines()), mimetype="application/x-ndjson")
 
-        # Updated state
-        packing_result = packer.get_packing_result_json()
 
-        return jsonify({
-            "video_url": f"/{filename}",
-            "result": packing_result
-        })
+@app.route('/packing-state/<warehouse_id>', methods=['GET'])
+def get_packing_state(warehouse_id):
+    version, config, state = packing_state_store.get(warehouse_id)
+    if state is None:
+        return jsonify({"error": f"No packing state for {warehouse_id}"}), 404
+    return jsonify({"warehouse_id": warehouse_id, "version": version, "config": config, "result": state.to_json()})
+
+
+@app.route('/packing-state/<warehouse_id>', methods=['PUT'])
+def put_packing_state(warehouse_id):
+    """
+    Seeds/replaces the server-side state (e.g. with what is in MongoDB today).
+    Request JSON: shelf_width, shelf_height, shelf_depth, shelf_count, compatibility_rules,
+                  "existing_state": {...} (optional), "expected_version": int (0 for a new warehouse)
+    """
+    try:
+        data = request.get_json()
+        if not all(data.get(k) for k in CONFIG_KEYS) or "expected_version" not in data:
+            return jsonify({"error": f"Missing required parameters: {list(CONFIG_KEYS) + ['expected_version']}"}), 400
 
+        packer = FixedShelfPacker3DIncremental(
+            shelf_width=data['shelf_width'],
+            shelf_height=data['shelf_height'],
+            shelf_depth=data['shelf_depth'],
+            shelf_count=data['shelf_count'],
+            compatibility_rules=data['compatibility_rules'],
+            existing_state=data.get('existing_state')
+        )
+        config = {k: data[k] for k in CONFIG_KEYS}
+        version = packing_state_store.put(
+            warehouse_id, config, packer.get_packing_result_columnar(), int(data["expected_version"])
+        )
+        return jsonify({"warehouse_id": warehouse_id, "version": version})
+
+    except StateVersionConflict as e:
+        return jsonify({"error": str(e), "current_version": e.current_version}), 409
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/compare-shelf-packers", methods=["POST"])
-def compare_shelf_packers():
+@app.route('/generate-delta', methods=['POST'])
+def generate_delta():
+    """
+    Incremental packing against the server-side state; only changes travel.
+    Request JSON:
+    {
+        "warehouse_id": "wh-1",
+        "expected_version": 3,                               # 0 for a warehouse not stored yet
+        "items": [ [w,h,d,"type","color"], ... ],            # NEW items only
+        "shelf_width": .., ..., "compatibility_rules": {..}  # required on first use, optional after
+    }
+    Response: new version, placements, unplaced, per-shelf free-space changes.
+    409 with current_version when the state moved on since expected_version.
+    """
     try:
         data = request.get_json()
-        required = ["shelf_width", "shelf_height", "shelf_depth", "shelf_count", "compatibility_rules"]
-        if not all(k in data for k in required):
-            return jsonify({"error": f"Missing required parameters: {required}"}), 400
-        result = compare_packers(data)
+        warehouse_id = data.get('warehouse_id')
+        items_to_pack = data.get('items')
+        if not warehouse_id or items_to_pack is None or "expected_version" not in data:
+            return jsonify({"error": "Missing required parameters : warehouse_id, expected_version, items"}), 400
+
+        config = {k: data[k] for k in CONFIG_KEYS if k in data} or None
+        result = pack_delta(
+            packing_state_store, warehouse_id, int(data["expected_version"]), items_to_pack, config
+        )
         return jsonify(result)
+
+    except StateVersionConflict as e:
+        return jsonify({"error": str(e), "current_version": e.current_version}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/plan-compaction', methods=['POST'])
+def plan_shelf_compaction():
+    """
+    Plans item moves that empty whole shelves, within a move budget. Nothing is changed.
+    Only whole-shelf evacuations are planned (see shelf_compaction.plan_compaction).
+    Request JSON:
+    {
+        "compatibility_rules": { ... },
+        "existing_state": { ... },     # or "warehouse_id" to use the server-side state
+        "move_budget": 20,
+        "include_state": false         # true -> also return the state after the moves
+    }
+    """
+    try:
+        data = request.get_json()
+        compatibility_rules = data.get('compatibility_rules')
+        existing_state = data.get('existing_state')
+        move_budget = data.get('move_budget')
+
+        if data.get('warehouse_id') and not existing_state:
+            _, config, existing_state = packing_state_store.get(data['warehouse_id'])
+            if config and not compatibility_rules:
+                compatibility_rules = config["compatibility_rules"]
+
+        if not compatibility_rules or not existing_state or move_budget is None:
+            return jsonify({"error": "Missing required parameters : compatibility_rules, existing_state, move_budget"}), 400
+
+        plan = plan_compaction(existing_state, compatibility_rules, int(move_budget),
+                               include_state=bool(data.get('include_state')))
+        return jsonify(plan)
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/check-feasibility', methods=['POST'])
+def check_inbound_feasibility():
+    """
+    Fast capacity query for an inbound delivery: can these cartons be placed, and
+    roughly where. Nothing is packed or stored.
+    Request JSON:
+    {
+        "shelf_width": 100, "shelf_height": 50, "shelf_depth": 60, "shelf_count": 10,
+        "compatibility_rules": { ... },
+        "items": [ [w,h,d,"type","color"], ... ],
+        "existing_state": { ... }          # or "existing_state_columnar", or "warehouse_id"
+    }
+    Response: {"feasible", "placeable_count", "unplaceable_count", "items": [...], "by_class": {...}, "elapsed_ms"}
+    """
+    try:
+        data = request.get_json()
+        config = {k: data.get(k) for k in CONFIG_KEYS}
+        existing_state = data.get('existing_state')
+        items = data.get('items')
+
+        if data.get('existing_state_columnar'):
+            existing_state = ColumnarState.from_bytes(base64.b64decode(data['existing_state_columnar']))
+        elif data.get('warehouse_id') and not existing_state:
+            _, stored_config, existing_state = packing_state_store.get(data['warehouse_id'])
+            if stored_config:
+                config = {k: config[k] or stored_config[k] for k in CONFIG_KEYS}
+
+        if not all(config.values()) or items is None:
+            return jsonify({"error": f"Missing required parameters: {list(CONFIG_KEYS) + ['items']}"}), 400
+
+        packer = FixedShelfPacker3DIncremental(**config, existing_state=existing_state)
+        return jsonify(packer.check_feasibility(items))
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/compare-shelf-packers", methods=["POST"])
+def compare_shelf_packers():
+    try:
+        return jsonify(run_compare(request.get_json()))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except TimeoutError as e:
+        return jsonify({"error": str(e)}), 504
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/generate', methods=['POST'])
 def generate():
-    data = request.get_json()
+    try:
+        return jsonify(run_generate(request.get_json()))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/generate-portfolio', methods=['POST'])
+def generate_portfolio():
+    """
+    Portfolio packing: runs several orderings x fit rules in parallel and keeps the best layout.
+    Request JSON: same as /generate, plus optional
+        "orderings": ["arrival", "volume_desc", "longest_side_desc", "grouped_by_type"],
+        "fit_rules": ["best", "first"],
+        "objective": "utilization" | "unplaced",
+        "deadline_seconds": 5,
+        "render": false                                     # true -> GIF of the best layout (cached by content; adds "cached")
+    """
+    try:
+        data = request.get_json()
+
+        required = ["shelf_width", "shelf_height", "shelf_depth", "shelf_count", "compatibility_rules", "items"]
+        if not all(data.get(k) for k in required):
+            return jsonify({"error": f"Missing required parameters: {required}"}), 400
+
+        portfolio = pack_portfolio(
+            data,
+            orderings=data.get("orderings"),
+            fit_rules=data.get("fit_rules"),
+            objective=data.get("objective", "utilization"),
+            deadline=data.get("deadline_seconds"),
+        )
 
-    # Required inputs
-    shelf_width = data.get('shelf_width')
-    shelf_height = data.get('shelf_height')
-    shelf_depth = data.get('shelf_depth')
-    shelf_count = data.get('shelf_count')
-    selected_shelf_id = data.get('selected_shelf_id')
-    compatibility_rules = data.get('compatibility_rules')
-    items_to_pack = data.get('items')
+        response = dict(portfolio)
+        if data.get("render"):
+            best = portfolio["best"]
+            # the best variant is a pure function of these, so a hit skips re-packing and drawing
+            state = {
+                "shelf": [data["shelf_width"], data["shelf_height"], data["shelf_depth"], data["shelf_count"]],
+                "selected_shelf_id": data.get("selected_shelf_id"),
+                # rule lists are used as sets, so their order must not change the key
+                "compatibility_rules": {str(k): sorted({str(t) for t in v}) for k, v in data["compatibility_rules"].items()},
+                "items": data["items"],
+                "ordering": best["ordering"],
+                "fit_rule": best["fit_rule"],
+            }
+
+            def render(gif_path):
+                packer = FixedShelfPacker3D(
+                    shelf_width=data["shelf_width"],
+                    shelf_height=data["shelf_height"],
+                    shelf_depth=data["shelf_depth"],
+                    shelf_count=data["shelf_count"],
+                    compatibility_rules=data["compatibility_rules"],
+                    selected_shelf_id=data.get("selected_shelf_id"),
+                    fit_rule=best["fit_rule"]
+                )
+                for item in ORDERINGS[best["ordering"]]([tuple(i) for i in data["items"]]):
+                    packer.add_item(*item)
+                packer.animate(save_path=gif_path)
+
+            path, cached = artifact_cache.get_or_render("portfolio", state, {"format": "gif"}, render)
+            response["video_url"] = artifact_cache.url_for(path)
+            response["cached"] = cached
 
-    if not all([shelf_width, shelf_height, shelf_depth, shelf_count, compatibility_rules, items_to_pack]):
-        return jsonify({"error": "Missing required parameters"}), 400
+        return jsonify(response)
 
-    packer = FixedShelfPacker3D(
-        shelf_width=shelf_width,
-        shelf_height=shelf_height,
-        shelf_depth=shelf_depth,
-        shelf_count=shelf_count,
-        compatibility_rules=compatibility_rules,
-        selected_shelf_id=selected_shelf_id
-    )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except TimeoutError as e:
+        return jsonify({"error": str(e)}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-    for item in items_to_pack:
-        packer.add_item(*item)
 
-    # Save to unique file
-    filename = f"static/shelf_{uuid.uuid4().hex}.gif"
-    packer.animate(save_path=filename)
+@app.route('/generate-sharded', methods=['POST'])
+def generate_sharded():
+    """
+    Headless packing sharded by compatibility class across worker processes.
+    Request JSON: same as /generate (mode "full") or /generate-incremental (mode "incremental"), plus
+        "mode": "full" | "incremental",
+        "timeout_seconds": null                             # OPTIONAL: 504 when the shards take longer
+    Response: {"result": {...same shape as /generate "result"...}, "shards": [...]}
+    """
+    try:
+        data = request.get_json()
+        required = ["shelf_width", "shelf_height", "shelf_depth", "shelf_count", "compatibility_rules"]
+        if not all(data.get(k) for k in required) or data.get("items") is None:
+            return jsonify({"error": f"Missing required parameters: {required + ['items']}"}), 400
 
-    # Get the packing result JSON
-    packing_result = packer.get_packing_result_json()
+        return jsonify(pack_sharded(data, mode=data.get("mode", "full"), timeout=data.get("timeout_seconds")))
 
-    return jsonify({
-        "video_url": f"/{filename}",
-        "result": packing_result
-    })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except TimeoutError as e:
+        return jsonify({"error": str(e)}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/generate-batch', methods=['POST'])
+def generate_batch():
+    """
+    Headless packing for many warehouses in one request, spread over a worker pool.
+    Request JSON:
+    {
+        "jobs": [
+            { ...same as /generate..., "job_id": "wh-1" },                        # mode "full" (default)
+            { ...same as /generate-incremental..., "mode": "incremental", "job_id": "wh-2" },
+            ...
+        ],
+        "stream": false,              # OPTIONAL: true -> NDJSON, one line per job as it finishes
+        "timeout_seconds": null       # OPTIONAL: jobs still running after this are reported as failed
+    }
+    Each job either succeeds ({"ok": true, "result", "metrics", ...}) or fails on
+    its own ({"ok": false, "error", "error_type", ...}); one bad job never fails the batch.
+    Response (stream=false): {"results": [...in request order...], "succeeded": n, "failed": k}
+    Response (stream=true):  NDJSON job records in completion order, then
+                             {"event": "summary", "succeeded": n, "failed": k}
+    """
+    try:
+        data = request.get_json()
+        jobs = data.get('jobs')
+        if not isinstance(jobs, list) or not jobs:
+            return jsonify({"error": "jobs must be a non-empty list"}), 400
+        timeout = data.get('timeout_seconds')
+
+        if not data.get('stream'):
+            return jsonify(pack_batch(jobs, timeout=timeout))
+
+        records = iter_batch(jobs, timeout=timeout)  # bad timeout -> 400 before streaming starts
+
+        def generate_lines():
+            succeeded = failed = 0
+            for record in records:
+                if record["ok"]:
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield json.dumps(record) + "\n"
+            yield json.dumps({"event": "summary", "succeeded": succeeded, "failed": failed}) + "\n"
+
+        return Response(stream_with_context(generate_lines()), mimetype="application/x-ndjson")
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 
 @app.route('/pathfinding', methods=['POST'])
 def generate_pathfinding_video():
-    data = request.get_json()
-
-    # Extract parameters from request
-    shelf_height = data.get('shelf_height')
-    shelf_count = data.get('shelf_count')
-    shelf_interval = data.get('shelf_interval')
-    picking_locations = data.get('picking_locations')
-    workers = data.get('workers')
-
-    if not all([shelf_height, shelf_count, shelf_interval, picking_locations, workers]):
-        return jsonify({"error": "Missing picking_locations or workers : shelf_height, shelf_count, shelf_interval, picking_locations, workers"}), 400
-
-    filename = f"static/path_{uuid.uuid4().hex}.gif"
-    run_pathfinding_animation_dynamic(
-        shelf_height=shelf_height,
-        shelf_count=shelf_count,
-        shelf_interval=shelf_interval,
-        picking_locations=picking_locations,
-        obstacles=workers,
-        save_path=filename
-    )
-
-    return jsonify({"video_url": f"/{filename}"})
+    try:
+        return jsonify(run_pathfinding(request.get_json()))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Runs a heavy endpoint in the background instead of the request thread.
+    Request JSON:
+    {
+        "kind": "generate" | "generate-incremental" | "compare-shelf-packers" | "pathfinding",
+        "payload": { ...the JSON that endpoint takes... }
+    }
+    202 -> {"job_id", "status": "queued", "status_url", ...}; poll GET /jobs/<job_id>.
+    Socket.IO events "job_queued", "job_progress" and "job_finished" carry the job
+    status (no result) and go to the room named after the job id; join it with
+    the "subscribe_job" event ({"job_id": ...}).
+    429 when the queue is full or this server process is shutting down.
+    """
+    try:
+        data = request.get_json()
+        kind = data.get('kind')
+        payload = data.get('payload')
+        if kind not in JOB_KINDS:
+            return jsonify({"error": f"Unknown kind {kind!r}; expected one of {list(JOB_KINDS)}"}), 400
+        if not isinstance(payload, dict):
+            return jsonify({"error": "payload must be a JSON object"}), 400
+
+        job = job_queue.submit(kind, JOB_KINDS[kind], payload)
+        job["status_url"] = f"/jobs/{job['job_id']}"
+        return jsonify(job), 202
+
+    except QueueFull as e:
+        response = jsonify({"error": str(e)})
+        response.headers["Retry-After"] = "5"
+        return response, 429
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+    return jsonify(job)
+
+
+@app.route('/jobs', methods=['GET'])
+def job_queue_stats():
+    return jsonify(job_queue.stats())
+
+
+@socketio.on('subscribe_job')
+def handle_subscribe_job(data):
+    job_id = (data or {}).get("job_id")
+    if job_id:
+        join_room(job_id)
+    return True  # ack
+
+
+def _snapshot_view(data, defaults):
+    """View parameters that change the picture; they are part of the render cache key."""
+    view = {key: data.get(key, default) for key, default in defaults.items()}
+    view["format"] = data.get('image_format', 'png')
+    return view
+
+
+@app.route('/snapshot/shelves', methods=['POST'])
+def snapshot_shelves():
+    """
+    Still PNG/WebP of a packing result, cached by content.
+    Request JSON: same as /generate ("mode": "full", default) or
+    /generate-incremental ("mode": "incremental", optional existing_state), plus
+    optional view parameters: image_format (png | webp), dpi, elev, azim.
+    Identical layouts + view parameters are served from the cache without rendering.
+    """
+    try:
+        data = request.get_json()
+
+        shelf_width = data.get('shelf_width')
+        shelf_height = data.get('shelf_height')
+        shelf_depth = data.get('shelf_depth')
+        shelf_count = data.get('shelf_count')
+        compatibility_rules = data.get('compatibility_rules')
+        items_to_pack = data.get('items', [])
+        mode = data.get('mode', 'full')
+
+        if not all([shelf_width, shelf_height, shelf_depth, shelf_count, compatibility_rules]):
+            return jsonify({"error": "Missing required parameters"}), 400
+
+        if mode == 'incremental':
+            existing_state = data.get('existing_state')
+            if data.get('existing_state_columnar'):
+                existing_state = ColumnarState.from_bytes(base64.b64decode(data['existing_state_columnar']))
+            packer = FixedShelfPacker3DIncremental(
+                shelf_width=shelf_width,
+                shelf_height=shelf_height,
+                shelf_depth=shelf_depth,
+                shelf_count=shelf_count,
+                compatibility_rules=compatibility_rules,
+                selected_shelf_id=data.get('selected_shelf_id'),
+                existing_state=existing_state
+            )
+            for item in items_to_pack:
+                packer.add_item(*item)
+            packer.place_all_new_items()
+        elif mode == 'full':
+            packer = FixedShelfPacker3D(
+                shelf_width=shelf_width,
+                shelf_height=shelf_height,
+                shelf_depth=shelf_depth,
+                shelf_count=shelf_count,
+                compatibility_rules=compatibility_rules,
+                selected_shelf_id=data.get('selected_shelf_id')
+            )
+            for item in items_to_pack:
+                packer.add_item(*item)
+            packer.place_all_items()
+        else:
+            return jsonify({"error": f"Unknown mode {mode!r}; expected 'full' or 'incremental'"}), 400
+
+        view = _snapshot_view(data, {"selected_shelf_id": None, "dpi": 100, "elev": 25, "azim": -60})
+        path, cached = artifact_cache.get_or_render(
+            f"shelf_{mode}",
+            packer.snapshot_state(),
+            view,
+            lambda tmp: packer.snapshot(tmp, image_format=view["format"], dpi=view["dpi"],
+                                        elev=view["elev"], azim=view["azim"]),
+        )
+
+        return jsonify({
+            "image_url": artifact_cache.url_for(path),
+            "cached": cached,
+            "result": packer.get_packing_result_json()
+        })
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/snapshot/route', methods=['POST'])
+def snapshot_route():
+    """
+    Still PNG/WebP of the finished picking route, cached by content.
+    Request JSON: same as /pathfinding, plus optional optimize_order,
+    image_format (png | webp) and dpi. The route is a pure function of these
+    inputs, so a cache hit skips path finding as well as rendering.
+    """
+    try:
+        data = request.get_json()
+
+        shelf_height = data.get('shelf_height')
+        shelf_count = data.get('shelf_count')
+        shelf_interval = data.get('shelf_interval')
+        picking_locations = data.get('picking_locations')
+        workers = data.get('workers')
+
+        if not all([shelf_height, shelf_count, shelf_interval, picking_locations, workers]):
+            return jsonify({"error": "Missing picking_locations or workers : shelf_height, shelf_count, shelf_interval, picking_locations, workers"}), 400
+
+        state = {
+            "shelf_height": shelf_height,
+            "shelf_count": shelf_count,
+            "shelf_interval": shelf_interval,
+            "picking_locations": picking_locations,
+            "obstacles": workers,
+            "optimize_order": data.get('optimize_order', True),
+        }
+        view = _snapshot_view(data, {"dpi": 70})
+        path, cached = artifact_cache.get_or_render(
+            "route",
+            state,
+            view,
+            lambda tmp: render_route_snapshot(
+                shelf_height=shelf_height,
+                shelf_count=shelf_count,
+                shelf_interval=shelf_interval,
+                picking_locations=picking_locations,
+                obstacles=workers,
+                save_path=tmp,
+                optimize_order=state["optimize_order"],
+                image_format=view["format"],
+                dpi=view["dpi"],
+            ),
+        )
+
+        return jsonify({"image_url": artifact_cache.url_for(path), "cached": cached})
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 # @app.route('/detect-fire', methods=['POST'])
 # def detect_route():
@@ -352,34 +947,70 @@ def predict():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/predict-performance-batch', methods=['POST'])
+def predict_performance_batch():
+    """
+    Scores many employee records at once (e.g. a whole shift).
+    Input, either:
+      JSON      {"records": [{...same as /predict-performance...}, ...], "stream": false, "chunk_size": 1000}
+      multipart "file": CSV with one record per row (header = field names),
+                optional form fields "stream", "chunk_size"
+    The records become one DataFrame, scored with one model.predict call for all
+    of them (one per chunk when streaming).
+    Response (stream=false): {"predictions": [...input order...], "errors": [{"index", "error"}], "count": n}
+    Response (stream=true):  NDJSON {"index", "predicted_performance"} | {"index", "error"}
+                             in input order, then {"event": "summary", "count", "failed"}
+    """
+    try:
+        if 'file' in request.files:
+            options = request.form
+            frame = records_frame(csv_file=request.files['file'])
+        else:
+            options = request.get_json() or {}
+            frame = records_frame(options.get('records'))
+        if frame.empty:
+            return jsonify({"error": "No records provided"}), 400
+
+        stream = str(options.get('stream', False)).lower() in ("1", "true", "yes")
+        if not stream:
+            return jsonify(predict_batch(frame))
+
+        chunk_size = options.get('chunk_size', 1000)
+        if isinstance(chunk_size, bool) or not str(chunk_size).strip().isdigit() or int(chunk_size) < 1:
+            return jsonify({"error": f"chunk_size must be a positive integer, got {chunk_size!r}"}), 400
+        chunk_size = int(chunk_size)
+
+        records = iter_predictions(frame, chunk_size=chunk_size)
+
+        def generate_lines():
+            count = failed = 0
+            for record in records:
+                count += 1
+                failed += "error" in record
+                yield json.dumps(record) + "\n"
+            yield json.dumps({"event": "summary", "count": count, "failed": failed}) + "\n"
+
+        return Response(stream_with_context(generate_lines()), mimetype="application/x-ndjson")
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route("/forecast-image", methods=["POST"])
 def get_forecast_plot():
     try:
-        data = request.get_json()
-        category = data["category"]
-        start_month = data.get("start_month")
-        end_month = data.get("end_month")
-        start_week = data.get("start_week")
-        end_week = data.get("end_week")
-        year = data.get("year")
-        time_frame = data.get("time_frame")
-        threshold = data.get("threshold")
-
-        if not all([category, start_month, end_month, time_frame, year]):
+        data = request.get_json() or {}
+        # year and time_frame have no defaults here, but the rest is normalized like
+        # /forecast-data so both routes share one cache entry per forecast
+        if not all(data.get(k) for k in ["category", "start_month", "end_month", "time_frame", "year"]):
             return jsonify({"error": "Missing required parameters : category, start_month, end_month, time_frame, year"}), 400
 
-        forecast_df, image_path = predict_forecast_for_a_category(
-            category,
-            start_month,
-            end_month,
-            start_week,
-            end_week,
-            year,
-            time_frame,
-            threshold
-        )
+        _, plot_png, cached = cached_forecast(**forecast_data_args(data))
 
-        return send_file(image_path, mimetype="image/png")
+        response = send_file(io.BytesIO(plot_png), mimetype="image/png")
+        response.headers["X-Cache"] = "HIT" if cached else "MISS"
+        return response
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -387,33 +1018,16 @@ def get_forecast_plot():
 @app.route("/forecast-data", methods=["POST"])
 def get_forecast_data():
     try:
-        data = request.get_json()
-        category = data.get("category")
-        start_month = data.get("start_month")
-        end_month = data.get("end_month")
-        start_week = data.get("start_week", 1)
-        end_week = data.get("end_week", 5)
-        year = data.get("year", pd.Timestamp.now().year)
-        time_frame = data.get("time_frame", 60)
-        threshold = data.get("threshold", 0.1)
-
-        if not all([category, start_month, end_month, time_frame, year]):
+        params = forecast_data_args(request.get_json())
+
+        if not all(params[k] for k in ["category", "start_month", "end_month", "time_frame", "year"]):
             return jsonify({"error": "Missing required parameters : category, start_month, end_month, time_frame, year"}), 400
 
-        # Call your function
-        forecast_df, _ = predict_forecast_for_a_category(
-            category,
-            start_month,
-            end_month,
-            start_week,
-            end_week,
-            year,
-            time_frame,
-            threshold
-        )
+        forecast_df, _, cached = cached_forecast(**params)
 
-        # For better charting, convert any timestamps to string (ISO format)
-        forecast_df['ds'] = forecast_df['ds'].astype(str)
+        # For better charting, convert any timestamps to string (ISO format);
+        # on a copy, the cached DataFrame is shared
+        forecast_df = forecast_df.assign(ds=forecast_df['ds'].astype(str))
 
         # Optionally: also return real data if you want
         # comparison["ds"] = comparison["ds"].astype(str)
@@ -423,7 +1037,8 @@ def get_forecast_data():
         # }
 
         response = {
-            "forecast": forecast_df.to_dict(orient="records")
+            "forecast": forecast_df.to_dict(orient="records"),
+            "cached": cached
         }
 
         return jsonify(response)
@@ -434,5 +1049,8 @@ def get_forecast_data():
 
 
 if __name__ == '__main__':
+    # the debug reloader's parent process only watches files; don't load models there
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        boot()
     init_serial()
     socketio.run(app, debug=True, allow_unsafe_werkzeug=True)
\ No newline at end of file
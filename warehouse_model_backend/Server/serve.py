@@ -0,0 +1,264 @@
+# Server/serve.py
+"""
+Production entry point: several worker processes serving main.app.py on one port.
+
+  python serve.py --port 5000
+  SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 SOCKETIO_ASYNC_MODE=eventlet python serve.py --workers 4
+
+The launcher binds the listening socket and starts `--workers` copies of this
+script in worker mode (WORKERS, default 1), each inheriting the socket (the
+kernel spreads new connections over them). Each worker runs the app on an
+async server supported by Flask-SocketIO:
+  eventlet   eventlet.wsgi       (pip install eventlet)
+  gevent     gevent.pywsgi       (pip install gevent)
+  threading  werkzeug, threaded  (always available; fallback)
+--async-mode / SOCKETIO_ASYNC_MODE picks one; default: the first installed.
+
+Socket.IO across workers:
+  - SOCKETIO_MESSAGE_QUEUE (e.g. a local Redis) is needed with more than one
+    worker, so events emitted in one worker (job progress, broadcasts) reach
+    clients connected to another;
+  - without a sticky load balancer, clients must use the websocket transport
+    (io(url, {transports: ["websocket"]})): long-polling sessions live in the
+    worker that created them.
+
+State across workers (any request may land on any worker):
+  - POST /jobs runs the job in the accepting worker, but job records are also
+    written to a SQLite file (JOB_STORE_PATH, default state/jobs.sqlite3 when
+    --workers > 1), so GET /jobs/<id> works from every worker. GET /jobs
+    (queue stats) is per worker. Jobs of a worker that crashes stay "queued" /
+    "running" in the store;
+  - the forecast result cache, artifact locks and camera frame slots are per
+    worker: results stay correct, a forecast cached in one worker is just
+    computed again in another (artifacts themselves are shared files).
+
+The Arduino serial port is opened by the launcher only; workers forward their
+signals to it (ServerRuntime/serial_writer.py, ARDUINO_RELAY).
+
+GET /metrics answers from whichever worker takes the connection, with that
+worker's numbers only; every series carries a pid label, so series from
+different workers never collide (sum without (pid) for totals).
+
+SIGTERM / SIGINT: workers stop accepting, let in-flight requests (including
+streamed bodies) and accepted background jobs finish for up to
+--graceful-timeout seconds, mark jobs still unfinished as failed, kill their
+job pools and exit; the launcher waits for them, kills stragglers, then
+releases the serial port. Workers that die on their own are restarted.
+"""
+
+import argparse
+import importlib.util
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(SERVER_DIR, '..')))
+
+ASYNC_MODES = ("eventlet", "gevent", "threading")
+
+
+def detect_async_mode() -> str:
+    for mode in ASYNC_MODES[:-1]:
+        if importlib.util.find_spec(mode) is not None:
+            return mode
+    return "threading"
+
+
+# ---------- Worker ----------
+
+class InFlight:
+    """
+    WSGI middleware counting requests being handled, for graceful shutdown.
+    A request counts until the server closes its response iterable, so
+    streamed bodies (NDJSON, GIF downloads) are included.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _done(self):
+        with self._lock:
+            self.count -= 1
+
+    def __call__(self, environ, start_response):
+        from werkzeug.wsgi import ClosingIterator
+
+        with self._lock:
+            self.count += 1
+        try:
+            body = self.app(environ, start_response)
+        except BaseException:
+            self._done()
+            raise
+        return ClosingIterator(body, self._done)
+
+
+def _load_app():
+    spec = importlib.util.spec_from_file_location("main_app", os.path.join(SERVER_DIR, "main.app.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["main_app"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _start_server(mode, listener, app):
+    """Serves `app` on the inherited listener in the background; returns stop() (stops accepting)."""
+    if mode == "eventlet":
+        import eventlet
+        import eventlet.wsgi
+
+        server = eventlet.spawn(eventlet.wsgi.server, listener, app, log_output=False)
+        return lambda: server.kill()
+
+    if mode == "gevent":
+        from gevent.pywsgi import WSGIServer
+
+        server = WSGIServer(listener, app, log=None)
+        server.start()
+        # stop(timeout=0): close the listener only; in-flight requests are awaited by the caller
+        return lambda: server.stop(timeout=0)
+
+    from werkzeug.serving import make_server
+
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, app, threaded=True, fd=listener.fileno())
+    thread = threading.Thread(target=server.serve_forever, name="wsgi", daemon=True)
+    thread.start()
+    return server.shutdown
+
+
+def run_worker(mode: str, graceful_timeout: float):
+    # green-thread servers must patch the stdlib before anything else is imported
+    if mode == "eventlet":
+        import eventlet
+        eventlet.monkey_patch()
+    elif mode == "gevent":
+        from gevent import monkey
+        monkey.patch_all()
+
+    listener = socket.socket(fileno=int(os.environ["LISTEN_FD"]))
+    main_app = _load_app()
+    main_app.boot()
+    main_app.init_serial()
+
+    app = InFlight(main_app.app)
+    stopping = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stopping.set())
+
+    stop_accepting = _start_server(mode, listener, app)
+    print(f"[Serve] worker {os.getpid()} ready ({mode})", flush=True)
+    while not stopping.wait(1.0):
+        pass
+
+    stop_accepting()
+    deadline = time.monotonic() + graceful_timeout
+    while app.count and time.monotonic() < deadline:
+        time.sleep(0.1)
+    if app.count:
+        print(f"[Serve] worker {os.getpid()}: {app.count} request(s) still running at shutdown", flush=True)
+    # jobs accepted with a 202 get the rest of the grace period, then are marked failed
+    main_app.job_queue.shutdown(wait=True, timeout=max(0.0, deadline - time.monotonic()))
+    main_app.arduino.stop()
+    print(f"[Serve] worker {os.getpid()} stopped", flush=True)
+
+
+# ---------- Launcher ----------
+
+def run_launcher(args):
+    from ServerRuntime.serial_writer import SerialWriter, SerialRelay
+
+    workers = max(1, args.workers)
+    if workers > 1 and not os.getenv("SOCKETIO_MESSAGE_QUEUE"):
+        print("[Serve] SOCKETIO_MESSAGE_QUEUE is not set: Socket.IO events emitted by one worker "
+              "will not reach clients connected to another", flush=True)
+
+    listener = socket.create_server((args.host, args.port), backlog=2048)
+    listener.set_inheritable(True)
+
+    relay = SerialRelay(SerialWriter.from_env())
+    relay.start()
+
+    env = dict(
+        os.environ,
+        LISTEN_FD=str(listener.fileno()),
+        SOCKETIO_ASYNC_MODE=args.async_mode,
+        ARDUINO_RELAY=relay.address,
+    )
+    if workers > 1:
+        # job records must be visible to every worker (relative to SERVER_DIR, like state/ in the app)
+        env.setdefault("JOB_STORE_PATH", os.path.join("state", "jobs.sqlite3"))
+    command = [sys.executable, os.path.abspath(__file__), "--worker",
+               "--async-mode", args.async_mode, "--graceful-timeout", str(args.graceful_timeout)]
+
+    def spawn():
+        return subprocess.Popen(command, env=env, cwd=SERVER_DIR, pass_fds=(listener.fileno(),))
+
+    stopping = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stopping.set())
+
+    procs = [spawn() for _ in range(workers)]
+    print(f"[Serve] {workers} worker(s) on http://{args.host}:{args.port} ({args.async_mode})", flush=True)
+
+    restarts = []
+    while not stopping.wait(1.0):
+        for i, proc in enumerate(procs):
+            if proc.poll() is None:
+                continue
+            # back off if workers keep dying (e.g. the app fails to import)
+            now = time.monotonic()
+            restarts = [t for t in restarts if now - t < 60] + [now]
+            if len(restarts) > 5 * workers:
+                print("[Serve] workers keep exiting; giving up", flush=True)
+                stopping.set()
+                break
+            print(f"[Serve] worker {proc.pid} exited with {proc.returncode}; restarting", flush=True)
+            procs[i] = spawn()
+
+    print("[Serve] shutting down", flush=True)
+    for proc in procs:
+        if proc.poll() is None:
+            proc.send_signal(signal.SIGTERM)
+    deadline = time.monotonic() + args.graceful_timeout + 5
+    for proc in procs:
+        try:
+            proc.wait(max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+    listener.close()
+    relay.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "5000")))
+    # more than one needs SOCKETIO_MESSAGE_QUEUE, see above; one per core is a good upper bound
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", "1")))
+    parser.add_argument("--async-mode", choices=ASYNC_MODES,
+                        default=os.getenv("SOCKETIO_ASYNC_MODE") or detect_async_mode())
+    parser.add_argument("--graceful-timeout", type=float, default=float(os.getenv("GRACEFUL_TIMEOUT", "30")))
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # static/ and state/ paths in the app are relative to the Server directory
+    os.chdir(SERVER_DIR)
+    if args.worker:
+        run_worker(args.async_mode, args.graceful_timeout)
+    elif not hasattr(os, "fork"):
+        raise SystemExit("serve.py needs a POSIX system; on Windows run `python main.app.py`")
+    else:
+        run_launcher(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+# ServerRuntime/artifact_cache.py
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Any, Callable, Optional, Tuple
+
+ARTIFACT_FORMATS = ("png", "webp", "gif")
+SIDECAR_EXT = "json"
+TMP_PREFIX = "tmp"
+
+
+def _temp_owner(name: str) -> Optional[int]:
+    """pid that created temp file `name` (tmp<pid>-<random>.tmp.<ext>), None if it is not one of ours."""
+    if not name.startswith(TMP_PREFIX) or ".tmp" not in name:
+        return None
+    pid = name[len(TMP_PREFIX):].split("-", 1)[0]
+    return int(pid) if pid.isdigit() else None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _normalize(value):
+    """JSON-stable form: tuples -> lists, sets -> sorted lists, numpy scalars -> Python numbers."""
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((_normalize(v) for v in value), key=repr)
+    if hasattr(value, "item") and callable(value.item):
+        return value.item()
+    if isinstance(value, float) and value.is_integer():
+        # 10 and 10.0 render the same picture
+        return int(value)
+    return value
+
+
+def content_key(kind: str, state: Any, view: Dict[str, Any]) -> str:
+    """sha256 over the canonical JSON of (kind, normalized state, view parameters)."""
+    blob = json.dumps(
+        {"kind": kind, "state": _normalize(state), "view": _normalize(view)},
+        sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ArtifactCache:
+    """
+    Content-addressed cache for rendered artifacts (GIF/PNG/WebP) on disk.
+
+    Files are stored as <root>/<key[:2]>/<key>.<ext>, where key = content_key(...),
+    optionally with a <key>.json sidecar holding whatever the producer returned
+    (e.g. the packing result), so a hit can answer a request without redoing the
+    work behind the image. Producers write to temp files in the same directory
+    that are moved into place with os.replace, so readers never see a partial
+    file; concurrent misses on the same key inside one process wait for the
+    first producer instead of running twice. A build that raises has its temp
+    files removed on the way out; temp files carry the producer's pid, so those
+    of a producer that was killed mid-build (e.g. a cancelled job worker) are
+    dropped by the next sweep once that process is gone (discard_orphans).
+
+    Eviction (both optional):
+      ttl_seconds  entries not used for this long are dropped (hits refresh the
+                   file mtime, which is the last-use clock)
+      max_bytes    after a write pushes the cache over this size, least recently
+                   used entries are dropped until it fits
+    """
+
+    def __init__(self, root: str, max_bytes: Optional[int] = None, ttl_seconds: Optional[float] = None,
+                 sweep_interval: float = 60.0):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._size: Optional[int] = None  # bytes on disk, from the last scan + our own writes
+        self._last_sweep = 0.0
+        self._last_orphan_sweep = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.by_kind: Dict[str, Dict[str, int]] = {}  # kind -> {"hits", "misses"}
+
+    @classmethod
+    def from_env(cls) -> "ArtifactCache":
+        """ARTIFACT_CACHE_DIR (static/artifacts), ARTIFACT_CACHE_MAX_MB, ARTIFACT_CACHE_TTL_SECONDS."""
+        max_mb = os.getenv("ARTIFACT_CACHE_MAX_MB")
+        ttl = os.getenv("ARTIFACT_CACHE_TTL_SECONDS")
+        return cls(
+            os.getenv("ARTIFACT_CACHE_DIR", "static/artifacts"),
+            max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else None,
+            ttl_seconds=float(ttl) if ttl else None,
+        )
+
+    # ---------- Paths ----------
+
+    def path_for(self, key: str, fmt: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.{fmt}")
+
+    def url_for(self, path: str) -> str:
+        return "/" + path.replace(os.sep, "/")
+
+    def _count(self, kind: str, outcome: str):
+        with self._lock:
+            if outcome == "hits":
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.by_kind.setdefault(kind, {"hits": 0, "misses": 0})[outcome] += 1
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    # ---------- Lookup / produce ----------
+
+    def _fresh(self, path: str) -> bool:
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return False
+        return self.ttl_seconds is None or time.time() - mtime <= self.ttl_seconds
+
+    def _read_hit(self, key: str, fmt: str, need_meta: bool):
+        path = self.path_for(key, fmt)
+        if not self._fresh(path):
+            return None
+        meta = None
+        sidecar = self.path_for(key, SIDECAR_EXT)
+        if os.path.exists(sidecar):
+            try:
+                with open(sidecar, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                meta = None
+        if need_meta and meta is None:
+            return None
+        # bump last use for LRU / TTL
+        now = time.time()
+        for p in (path, sidecar):
+            try:
+                os.utime(p, (now, now))
+            except OSError:
+                pass
+        return path, meta
+
+    def get_or_create(
+        self,
+        kind: str,
+        state: Any,
+        view: Dict[str, Any],
+        build: Callable[[str], Optional[Dict[str, Any]]],
+        need_meta: bool = True,
+    ) -> Tuple[str, Optional[Dict[str, Any]], bool]:
+        """
+        Returns (path, meta, cached). `view` must contain "format"
+        (png | webp | gif). On a miss build(tmp_path) writes the artifact there
+        and returns the JSON-serializable meta to keep next to it (or None).
+        With need_meta, an artifact whose sidecar is missing counts as a miss.
+        """
+        fmt = view.get("format", "png")
+        if fmt not in ARTIFACT_FORMATS:
+            raise ValueError(f"Unknown image format {fmt!r}; expected one of {ARTIFACT_FORMATS}")
+
+        key = content_key(kind, state, view)
+        hit = self._read_hit(key, fmt, need_meta)
+        if hit is not None:
+            self._count(kind, "hits")
+            return hit[0], hit[1], True
+
+        try:
+            with self._key_lock(key):
+                hit = self._read_hit(key, fmt, need_meta)
+                if hit is not None:
+                    self._count(kind, "hits")
+                    return hit[0], hit[1], True
+
+                path = self.path_for(key, fmt)
+                directory = os.path.dirname(path)
+                os.makedirs(directory, exist_ok=True)
+                self._sweep_orphans_if_due()
+                tmp = None
+                written = 0
+                try:
+                    # keep the real extension last: writers pick the file format from it
+                    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f"{TMP_PREFIX}{os.getpid()}-", suffix=f".tmp.{fmt}")
+                    os.close(fd)
+                    meta = build(tmp)
+                    if meta is not None:
+                        sidecar_tmp = tmp + f".{SIDECAR_EXT}"
+                        with open(sidecar_tmp, "w", encoding="utf-8") as f:
+                            json.dump(meta, f)
+                        written += os.path.getsize(sidecar_tmp)
+                        os.replace(sidecar_tmp, self.path_for(key, SIDECAR_EXT))
+                    written += os.path.getsize(tmp)
+                    os.replace(tmp, path)
+                finally:
+                    # failed or interrupted build: nothing half-written stays behind
+                    if tmp is not None:
+                        for leftover in (tmp, tmp + f".{SIDECAR_EXT}"):
+                            try:
+                                os.remove(leftover)
+                            except OSError:
+                                pass
+                self._count(kind, "misses")
+        finally:
+            # dropped on errors and early hits too, so failed keys do not pile up
+            with self._lock:
+                self._key_locks.pop(key, None)
+        self._after_write(written)
+        return path, meta, False
+
+    def get_or_render(
+        self,
+        kind: str,
+        state: Any,
+        view: Dict[str, Any],
+        render: Callable[[str], None],
+    ) -> Tuple[str, bool]:
+        """Image-only variant of get_or_create: render(tmp_path) writes the image; returns (path, cached)."""
+        def build(tmp):
+            render(tmp)
+            return None
+
+        path, _, cached = self.get_or_create(kind, state, view, build, need_meta=False)
+        return path, cached
+
+    # ---------- Eviction ----------
+
+    def _orphaned(self, name: str, mtime: float, now: float) -> bool:
+        """Temp file whose producer process is gone, or any temp file older than an hour."""
+        owner = _temp_owner(name)
+        if owner is not None and owner != os.getpid() and not _pid_alive(owner):
+            return True
+        return now - mtime > 3600
+
+    def discard_orphans(self) -> int:
+        """Removes temp files left by producers that died mid-build; returns how many."""
+        removed = 0
+        if not os.path.isdir(self.root):
+            return removed
+        now = time.time()
+        for bucket in os.scandir(self.root):
+            if not bucket.is_dir():
+                continue
+            for f in os.scandir(bucket.path):
+                if ".tmp" not in f.name:
+                    continue
+                try:
+                    if self._orphaned(f.name, f.stat().st_mtime, now):
+                        os.remove(f.path)
+                        removed += 1
+                except OSError:
+                    pass
+        self._last_orphan_sweep = now
+        return removed
+
+    def _sweep_orphans_if_due(self):
+        # on misses only, at most once per sweep_interval, so hits never walk the tree
+        if time.time() - self._last_orphan_sweep >= self.sweep_interval:
+            self.discard_orphans()
+
+    def _scan(self) -> Dict[str, Dict[str, Any]]:
+        """key -> {"files": [...], "bytes": n, "last_used": mtime}; removes stale temp files."""
+        entries: Dict[str, Dict[str, Any]] = {}
+        if not os.path.isdir(self.root):
+            return entries
+        now = time.time()
+        for bucket in os.scandir(self.root):
+            if not bucket.is_dir():
+                continue
+            for f in os.scandir(bucket.path):
+                try:
+                    st = f.stat()
+                except OSError:
+                    continue
+                if ".tmp" in f.name:
+                    # abandoned by a producer that died mid-build
+                    if self._orphaned(f.name, st.st_mtime, now):
+                        try:
+                            os.remove(f.path)
+                        except OSError:
+                            pass
+                    continue
+                key = f.name.split(".", 1)[0]
+                entry = entries.setdefault(key, {"files": [], "bytes": 0, "last_used": 0.0})
+                entry["files"].append(f.path)
+                entry["bytes"] += st.st_size
+                entry["last_used"] = max(entry["last_used"], st.st_mtime)
+        return entries
+
+    def evict(self) -> Dict[str, int]:
+        """Applies the TTL and size cap now; returns {"removed": entries, "bytes": freed}."""
+        with self._lock:
+            entries = self._scan()
+            now = time.time()
+            removed = freed = 0
+            total = sum(e["bytes"] for e in entries.values())
+
+            victims = []
+            if self.ttl_seconds is not None:
+                victims = [k for k, e in entries.items() if now - e["last_used"] > self.ttl_seconds]
+            if self.max_bytes is not None:
+                remaining = total - sum(entries[k]["bytes"] for k in victims)
+                chosen = set(victims)
+                for key in sorted(entries, key=lambda k: entries[k]["last_used"]):
+                    if remaining <= self.max_bytes:
+                        break
+                    if key not in chosen:
+                        victims.append(key)
+                        chosen.add(key)
+                        remaining -= entries[key]["bytes"]
+
+            for key in victims:
+                for path in entries[key]["files"]:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                removed += 1
+                freed += entries[key]["bytes"]
+
+            self._size = total - freed
+            self._last_sweep = now
+            self.evictions += removed
+            return {"removed": removed, "bytes": freed}
+
+    def _after_write(self, written: int):
+        if self.max_bytes is None and self.ttl_seconds is None:
+            return
+        with self._lock:
+            if self._size is not None:
+                self._size += written
+            over = self._size is None or (self.max_bytes is not None and self._size > self.max_bytes)
+            due = time.time() - self._last_sweep >= self.sweep_interval
+        if over or due:
+            self.evict()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "by_kind": {kind: dict(counts) for kind, counts in self.by_kind.items()},
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+        }
@@ -0,0 +1,234 @@
+# ServerRuntime/forecasts.py
+"""
+Forecast computations behind /forecast-image, /forecast-data and /forecast-batch.
+
+All three go through one result cache keyed by the model version and the
+forecast parameters, so the image, the data and the batch overview of the
+same window share a single model run.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import as_completed, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from .metrics import metrics
+from .model_registry import models
+from .pools import WorkerPool, check_timeout
+from .result_cache import ResultCache
+
+# Positional order of predict_forecast_for_a_category's arguments
+FORECAST_PARAMS = ("category", "start_month", "end_month", "start_week", "end_week", "year", "time_frame", "threshold")
+REQUIRED_PARAMS = ("category", "start_month", "end_month", "time_frame", "year")
+
+# bump FORECAST_MODEL_VERSION when the model changes to stop serving old results
+FORECAST_MODEL_VERSION = os.getenv("FORECAST_MODEL_VERSION", "1")
+forecast_cache = ResultCache(
+    ttl_seconds=float(os.getenv("FORECAST_CACHE_TTL_SECONDS", "900")),
+    max_entries=int(os.getenv("FORECAST_CACHE_SIZE", "64")),
+)
+
+
+def forecast_data_args(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Forecast parameters from a request, with the /forecast-data defaults."""
+    return {
+        "category": data.get("category"),
+        "start_month": data.get("start_month"),
+        "end_month": data.get("end_month"),
+        "start_week": data.get("start_week", 1),
+        "end_week": data.get("end_week", 5),
+        "year": data.get("year", datetime.now().year),
+        "time_frame": data.get("time_frame", 60),
+        "threshold": data.get("threshold", 0.1),
+    }
+
+
+def forecast_key(args: List[Any]) -> str:
+    return json.dumps([FORECAST_MODEL_VERSION] + list(args), default=str)
+
+
+def _compute_forecast(args: List[Any]) -> Tuple[Any, bytes]:
+    predict = models.get("forecast")
+    with metrics.stage("inference"):
+        forecast_df, image_path = predict(*args)
+    # keep the bytes: the model may reuse its plot file for the next forecast
+    with open(image_path, "rb") as f:
+        return forecast_df, f.read()
+
+
+def cached_forecast(category, start_month, end_month, start_week, end_week, year, time_frame, threshold):
+    """
+    (forecast_df, plot_png_bytes, cached). Concurrent identical requests share
+    one model run. The DataFrame is shared with other requests: don't mutate it.
+    """
+    args = [category, start_month, end_month, start_week, end_week, year, time_frame, threshold]
+    (forecast_df, plot_png), cached = forecast_cache.get_or_compute(
+        forecast_key(args), lambda: _compute_forecast(args)
+    )
+    return forecast_df, plot_png, cached
+
+
+# ---------- Batch ----------
+
+# Created on first batch and reused; every worker loads the model once at start
+_forecast_pool = None
+
+
+def _init_forecast_worker():
+    models.preload(["forecast"])
+
+
+def _get_forecast_pool() -> WorkerPool:
+    global _forecast_pool
+    if _forecast_pool is None:
+        workers = int(os.getenv("FORECAST_WORKERS", str(min(4, os.cpu_count() or 1))))
+        _forecast_pool = WorkerPool(workers, initializer=_init_forecast_worker, name="forecast")
+    return _forecast_pool
+
+
+def _column_values(series) -> List[Any]:
+    # timestamps as strings, the same way /forecast-data sends 'ds'
+    if series.dtype.kind == "M":
+        series = series.astype(str)
+    return series.tolist()
+
+
+def _columnar(frames: List[Tuple[int, Any]]) -> Tuple[List[str], Dict[str, List[Any]]]:
+    """[(request_index, df), ...] -> column names + one list per column, rows of all frames stacked."""
+    columns = ["request"]
+    for _, df in frames:
+        columns.extend(c for c in df.columns if c not in columns)
+    data: Dict[str, List[Any]] = {c: [] for c in columns}
+    for index, df in frames:
+        rows = len(df)
+        data["request"].extend([index] * rows)
+        for c in columns[1:]:
+            data[c].extend(_column_values(df[c]) if c in df.columns else [None] * rows)
+    return columns, data
+
+
+def forecast_batch(
+    requests: List[Dict[str, Any]],
+    shared: Optional[Dict[str, Any]] = None,
+    timeout: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Runs many forecasts in one call. Each request is `shared` overlaid with
+    its own fields (defaults as in /forecast-data). Cached windows are answered
+    from forecast_cache; identical requests run once, also across concurrent
+    callers (forecast_cache flights); the rest run concurrently on the forecast
+    worker pool and are added to the cache. Forecasts not done after `timeout`
+    seconds fail with TimeoutError and the pool workers still running them are
+    killed (other batches' forecasts on the pool are not touched). Raises
+    ValueError for a timeout that is not a positive number.
+
+    Returns one columnar payload:
+      {
+        "columns": ["request", "ds", "yhat", ...],
+        "data": {"request": [0, 0, ..., 1, ...], "ds": [...], ...},  # rows of all forecasts
+        "requests": [{"index", <params>, "ok", "rows", "cached"} |
+                     {"index", <params>, "ok": false, "error", "error_type"}],
+        "succeeded": n, "failed": k, "elapsed_ms": float
+      }
+    """
+    check_timeout(timeout)
+    started = time.perf_counter()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    shared = shared or {}
+    records: List[Dict[str, Any]] = []
+    frames: Dict[str, Any] = {}          # key -> forecast_df
+    cached_keys = set()
+    leading: Dict[str, Tuple[List[Any], Any]] = {}  # key -> (args, flight), computed by this batch
+    joined: Dict[str, Any] = {}                     # key -> flight of a concurrent caller
+    keys: List[Optional[str]] = []
+
+    for index, req in enumerate(requests):
+        params = forecast_data_args({**shared, **(req if isinstance(req, dict) else {})})
+        record = {"index": index, **params}
+        records.append(record)
+        missing = [p for p in REQUIRED_PARAMS if not params[p]]
+        if not isinstance(req, dict) or missing:
+            record.update({"ok": False, "error": f"Missing required parameters: {missing}", "error_type": "ValueError"})
+            keys.append(None)
+            continue
+        args = [params[p] for p in FORECAST_PARAMS]
+        key = forecast_key(args)
+        keys.append(key)
+        if key in frames or key in leading or key in joined:
+            continue
+        state, found = forecast_cache.begin(key)
+        if state == "hit":
+            frames[key] = found[0]
+            cached_keys.add(key)
+        elif state == "shared":
+            joined[key] = found
+        else:
+            leading[key] = (args, found)
+
+    errors: Dict[str, BaseException] = {}
+    if leading:
+        pool = _get_forecast_pool()
+        futures = {}
+        try:
+            for key, (args, _) in leading.items():
+                futures[pool.submit(_compute_forecast, args)] = key
+            for future in as_completed(futures, timeout=timeout):
+                key = futures[future]
+                try:
+                    value = future.result()
+                except BrokenProcessPool as e:
+                    errors[key] = e if str(e) else BrokenProcessPool("worker process died")
+                    continue
+                except Exception as e:
+                    errors[key] = e
+                    continue
+                forecast_cache.finish(key, leading[key][1], value=value)
+                frames[key] = value[0]
+        except FuturesTimeoutError:
+            # queued forecasts are cancelled, running ones go with their workers
+            for future in futures:
+                pool.kill(future)
+            for future, key in futures.items():
+                if key not in frames and key not in errors:
+                    errors[key] = TimeoutError(f"Forecast did not finish within {timeout} seconds")
+        finally:
+            # every flight this batch leads must end, or callers waiting on it would hang
+            for key, (_, flight) in leading.items():
+                if key not in frames:
+                    errors.setdefault(key, RuntimeError("Forecast did not run"))
+                    forecast_cache.finish(key, flight, error=errors[key])
+
+    for key, flight in joined.items():
+        left = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if not flight.done.wait(left):
+            errors[key] = TimeoutError(f"Forecast did not finish within {timeout} seconds")
+        elif flight.error is not None:
+            errors[key] = flight.error
+        else:
+            frames[key] = flight.value[0]
+            cached_keys.add(key)
+
+    ok_frames = []
+    for record, key in zip(records, keys):
+        if key is None:
+            continue
+        if key in frames:
+            ok_frames.append((record["index"], frames[key]))
+            record.update({"ok": True, "rows": len(frames[key]), "cached": key in cached_keys})
+        else:
+            error = errors.get(key) or RuntimeError("Forecast did not run")
+            record.update({"ok": False, "error": str(error), "error_type": type(error).__name__})
+
+    columns, data = _columnar(ok_frames)
+    succeeded = sum(1 for r in records if r["ok"])
+    return {
+        "columns": columns,
+        "data": data,
+        "requests": records,
+        "succeeded": succeeded,
+        "failed": len(records) - succeeded,
+        "elapsed_ms": (time.perf_counter() - started) * 1000.0,
+    }
@@ -0,0 +1,143 @@
+# ServerRuntime/frame_slots.py
+
+import threading
+import time
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+
+def native_thread_runner(async_mode: Optional[str]) -> Callable[..., Any]:
+    """
+    run(fn, *args) -> fn(*args), executed on a real OS thread under eventlet /
+    gevent so CPU-bound work (model inference) does not stall their event loop;
+    called inline for "threading". fn must not block on green locks or queues.
+    """
+    if async_mode == "eventlet":
+        from eventlet import tpool
+        return tpool.execute
+    if async_mode == "gevent":
+        from gevent import get_hub
+        return lambda fn, *args: get_hub().threadpool.apply(fn, args)
+    return lambda fn, *args: fn(*args)
+
+
+class FrameSlots:
+    """
+    Latest-frame-wins inference feed for camera streams.
+
+    Every client has a single slot. put() overwrites whatever frame is still
+    waiting there (the older one is dropped and counted), so a camera that sends
+    faster than inference runs never builds a backlog: a result is at most one
+    inference behind the newest frame.
+
+    One worker takes up to `batch_size` waiting frames from different clients,
+    waiting at most `batch_window` seconds for more once the first one is
+    there, and passes them to infer_batch(frames) -> results in one call.
+    on_result(client_id, result, latency_s) gets each result; a failed batch
+    passes {"error": ...} to every client in it.
+
+    `spawn(target)` starts the worker (socketio.start_background_task keeps it
+    compatible with eventlet/gevent); a daemon thread by default. Under
+    eventlet/gevent that worker is a greenlet, so infer_batch should hand the
+    model call to native_thread_runner() rather than run it on the event loop.
+    """
+
+    def __init__(
+        self,
+        infer_batch: Callable[[List[Any]], List[Dict[str, Any]]],
+        on_result: Callable[[str, Dict[str, Any], float], None],
+        batch_size: int = 1,
+        batch_window: float = 0.0,
+        spawn: Optional[Callable[[Callable[[], None]], Any]] = None,
+    ):
+        self.infer_batch = infer_batch
+        self.on_result = on_result
+        self.batch_size = max(1, batch_size)
+        self.batch_window = max(0.0, batch_window)
+        self.spawn = spawn
+
+        self._cond = threading.Condition()
+        self._slots: Dict[str, Tuple[Any, float]] = {}  # client -> (frame, received_at), insertion = arrival order
+        self._worker = None
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+        self.batches = 0
+        self._latency_total = 0.0
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            if self.spawn is not None:
+                self._worker = self.spawn(self._run)
+            else:
+                self._worker = threading.Thread(target=self._run, name="frame-slots", daemon=True)
+                self._worker.start()
+
+    # ---------- Producer side ----------
+
+    def put(self, client_id: str, frame: Any) -> bool:
+        """Stores the client's newest frame; returns True if it replaced an unprocessed one."""
+        with self._cond:
+            replaced = self._slots.pop(client_id, None) is not None
+            self._slots[client_id] = (frame, time.monotonic())
+            self.received += 1
+            if replaced:
+                self.dropped += 1
+            self._ensure_worker()
+            self._cond.notify()
+        return replaced
+
+    def discard(self, client_id: str):
+        """Forgets a waiting frame (e.g. the client disconnected)."""
+        with self._cond:
+            self._slots.pop(client_id, None)
+
+    # ---------- Worker ----------
+
+    def _take_batch(self) -> List[Tuple[str, Any, float]]:
+        with self._cond:
+            while not self._slots:
+                self._cond.wait()
+            if self.batch_size > 1 and self.batch_window > 0:
+                deadline = time.monotonic() + self.batch_window
+                while len(self._slots) < self.batch_size:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        break
+                    self._cond.wait(left)
+            batch = []
+            for client_id in list(self._slots)[:self.batch_size]:
+                frame, received_at = self._slots.pop(client_id)
+                batch.append((client_id, frame, received_at))
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                results = self.infer_batch([frame for _, frame, _ in batch])
+            except Exception as e:
+                results = [{"error": str(e)}] * len(batch)
+
+            now = time.monotonic()
+            with self._cond:
+                self.batches += 1
+                self.processed += len(batch)
+                self._latency_total += sum(now - received_at for _, _, received_at in batch)
+            for (client_id, _, received_at), result in zip(batch, results):
+                try:
+                    self.on_result(client_id, result, now - received_at)
+                except Exception as e:
+                    print(f"[Frames] Result handler failed for {client_id}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "clients_waiting": len(self._slots),
+                "received": self.received,
+                "dropped": self.dropped,
+                "processed": self.processed,
+                "batches": self.batches,
+                "batch_size": self.batch_size,
+                "batch_window_ms": self.batch_window * 1000.0,
+                "avg_latency_ms": self._latency_total / self.processed * 1000.0 if self.processed else 0.0,
+            }
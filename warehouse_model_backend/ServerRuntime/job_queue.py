@@ -0,0 +1,277 @@
+# ServerRuntime/job_queue.py
+
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Optional
+
+from .job_store import JobStore
+from .pools import WorkerPool
+
+# ---------- Worker side ----------
+
+# Set in every worker process by _init_worker; job code reports through report_progress()
+_progress_queue = None
+_current_job_id = None
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def report_progress(stage: str, done: Optional[int] = None, total: Optional[int] = None):
+    """
+    Publishes a progress update for the job running in this worker process.
+    No-op when called outside a queued job (e.g. from a synchronous endpoint).
+    """
+    if _progress_queue is None or _current_job_id is None:
+        return
+    _progress_queue.put((_current_job_id, {"stage": stage, "done": done, "total": total}))
+
+
+def _run_job(job_id: str, fn: Callable[[Dict[str, Any]], Any], payload: Dict[str, Any]):
+    global _current_job_id
+    _current_job_id = job_id
+    try:
+        report_progress("started")
+        return fn(payload)
+    finally:
+        _current_job_id = None
+
+
+# ---------- Server side ----------
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when running + queued jobs hit the admission limit."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        super().__init__(f"Job queue is full ({limit} jobs running or queued)")
+
+
+class QueueClosed(QueueFull):
+    """Raised by JobQueue.submit once shutdown() has begun; the client may retry (another worker takes it)."""
+
+    def __init__(self):
+        Exception.__init__(self, "Job queue is shutting down")
+        self.limit = 0
+
+
+class JobQueue:
+    """
+    Bounded background job runner for heavy endpoints.
+
+    Jobs run on a WorkerPool with `max_workers` processes; at most
+    `max_queued` more may wait for a free worker, beyond that submit() raises
+    QueueFull (the HTTP layer turns it into 429). Every state change is passed
+    to `on_event(event, job)`:
+      "job_queued", "job_progress" (from report_progress in the worker),
+      "job_finished" (status "completed" | "failed")
+    Finished jobs are kept for polling; only the newest `keep_finished` are retained.
+
+    With a JobStore every record is also written there on each change, and
+    get() falls back to it, so jobs accepted by another server process on the
+    same machine can be polled too (serve.py with several workers).
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_queued: int = 16,
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        keep_finished: int = 500,
+        store: Optional[JobStore] = None,
+    ):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.on_event = on_event
+        self.keep_finished = keep_finished
+        self.store = store
+
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)  # notified whenever a job finishes
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._active = 0
+        self._closed = False
+        self._pool = None
+        self._progress = None
+        self._listener = None
+
+    # ---------- Lifecycle ----------
+
+    def _ensure_pool(self) -> WorkerPool:
+        # created on first submit so importing the server never forks workers
+        if self._pool is None:
+            self._progress = multiprocessing.get_context().Queue()
+            self._pool = WorkerPool(
+                self.max_workers, initializer=_init_worker, initargs=(self._progress,), name="jobs"
+            )
+            self._listener = threading.Thread(target=self._listen, name="job-progress", daemon=True)
+            self._listener.start()
+        return self._pool
+
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None):
+        """
+        Stops accepting jobs (submit raises QueueClosed). With `wait`, jobs
+        already accepted get up to `timeout` seconds (None: no limit) to finish;
+        any still queued or running after that are marked failed, so pollers
+        are not left with a job that never ends, and their worker processes
+        are killed.
+        """
+        with self._idle:
+            self._closed = True
+            if wait:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while self._active:
+                    left = None if deadline is None else deadline - time.monotonic()
+                    if left is not None and left <= 0:
+                        break
+                    self._idle.wait(left)
+
+            now = time.time()
+            abandoned = []
+            for job in self._jobs.values():
+                if job["status"] not in ("completed", "failed"):
+                    job.update(status="failed", error="server shut down before the job finished", finished_at=now)
+                    abandoned.append(dict(job))
+            pool, self._pool = self._pool, None
+
+        for job in abandoned:
+            self._persist(job)
+            self._emit("job_finished", job)
+        if pool is not None:
+            pool.shutdown(wait=False, kill=True)
+            self._progress.put(None)  # stops the listener
+
+    # ---------- Jobs ----------
+
+    def submit(self, kind: str, fn: Callable[[Dict[str, Any]], Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Queues fn(payload) (fn must be a picklable module-level function); returns the job record."""
+        with self._lock:
+            if self._closed:
+                raise QueueClosed()
+            limit = self.max_workers + self.max_queued
+            if self._active >= limit:
+                raise QueueFull(limit)
+            self._active += 1
+
+            job_id = uuid.uuid4().hex
+            job = {
+                "job_id": job_id,
+                "kind": kind,
+                "status": "queued",
+                "progress": None,
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+            self._jobs[job_id] = job
+            queued = dict(job)
+
+        try:
+            # stored before it can run, so a fast job's final record is never overwritten by this one
+            self._persist(queued)
+            future = self._ensure_pool().submit(_run_job, job_id, fn, payload)
+        except Exception:
+            with self._idle:
+                self._active -= 1
+                self._jobs.pop(job_id, None)
+                self._idle.notify_all()
+            if self.store is not None:
+                self.store.delete(job_id)
+            raise
+
+        self._emit("job_queued", queued)
+        future.add_done_callback(lambda f: self._finish(job_id, f))
+        return queued
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                return dict(job)
+        # accepted by another process (or pruned here)
+        return self.store.load(job_id) if self.store is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return {
+                "max_workers": self.max_workers,
+                "max_queued": self.max_queued,
+                "active": self._active,
+                "by_status": counts,
+            }
+
+    # ---------- Internals ----------
+
+    def _persist(self, job: Dict[str, Any]):
+        if self.store is None:
+            return
+        try:
+            self.store.save(job)
+        except Exception as e:
+            print(f"[Jobs] Could not store job {job['job_id']}: {e}")
+
+    def _emit(self, event: str, job: Dict[str, Any]):
+        if self.on_event is None:
+            return
+        # events carry status/progress only; results are fetched by polling
+        message = {k: v for k, v in job.items() if k != "result"}
+        try:
+            self.on_event(event, message)
+        except Exception as e:
+            print(f"[Jobs] Event handler failed for {event}: {e}")
+
+    def _listen(self):
+        while True:
+            message = self._progress.get()
+            if message is None:
+                return
+            job_id, progress = message
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job["status"] in ("completed", "failed"):
+                    continue
+                job["status"] = "running"
+                job["started_at"] = job["started_at"] or time.time()
+                job["progress"] = progress
+                snapshot = dict(job)
+            self._persist(snapshot)
+            self._emit("job_progress", snapshot)
+
+    def _finish(self, job_id: str, future):
+        with self._idle:
+            self._active -= 1
+            self._idle.notify_all()
+            job = self._jobs.get(job_id)
+            # None: pruned; finished: already failed by shutdown()
+            if job is None or job["status"] in ("completed", "failed"):
+                return
+            job["finished_at"] = time.time()
+            if future.cancelled():
+                job["status"] = "failed"
+                job["error"] = "cancelled"
+            elif future.exception() is not None:
+                job["status"] = "failed"
+                job["error"] = str(future.exception())
+                job["error_type"] = type(future.exception()).__name__
+            else:
+                job["status"] = "completed"
+                job["result"] = future.result()
+            snapshot = dict(job)
+            self._prune()
+        self._persist(snapshot)
+        self._emit("job_finished", snapshot)
+
+    def _prune(self):
+        finished = [jid for jid, j in self._jobs.items() if j["status"] in ("completed", "failed")]
+        for jid in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[jid]
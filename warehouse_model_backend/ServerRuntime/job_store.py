@@ -0,0 +1,72 @@
+# ServerRuntime/job_store.py
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Dict, Any, Optional
+
+
+class JobStore:
+    """
+    Job records shared by every server process on one machine, one row per job:
+      (job_id, finished, updated_at, record JSON)
+
+    JobQueue writes a job's record here on every state change, so with several
+    serve.py workers GET /jobs/<id> finds a job whichever worker accepted it.
+    A finished record is final: late progress writes never overwrite it. Only
+    the newest `keep_finished` finished jobs are retained.
+    """
+
+    def __init__(self, path: str = "state/jobs.sqlite3", keep_finished: int = 500):
+        self.path = path
+        self.keep_finished = keep_finished
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")  # pollers read while workers write
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    finished INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    record TEXT NOT NULL
+                )
+                """
+            )
+
+    @classmethod
+    def from_env(cls) -> Optional["JobStore"]:
+        """JOB_STORE_PATH (set by serve.py for several workers); None keeps jobs in memory only."""
+        path = os.getenv("JOB_STORE_PATH")
+        return cls(path) if path else None
+
+    def _connect(self):
+        # one short-lived connection per call keeps this safe across threads
+        return sqlite3.connect(self.path, timeout=10)
+
+    def save(self, job: Dict[str, Any]):
+        finished = job["status"] in ("completed", "failed")
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, finished, updated_at, record) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(job_id) DO UPDATE SET finished = excluded.finished, "
+                "updated_at = excluded.updated_at, record = excluded.record WHERE jobs.finished = 0",
+                (job["job_id"], int(finished), time.time(), json.dumps(job, default=str)),
+            )
+            if finished:
+                conn.execute(
+                    "DELETE FROM jobs WHERE finished = 1 AND job_id NOT IN "
+                    "(SELECT job_id FROM jobs WHERE finished = 1 ORDER BY updated_at DESC LIMIT ?)",
+                    (self.keep_finished,),
+                )
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT record FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, job_id: str):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
@@ -0,0 +1,228 @@
+# ServerRuntime/jobs.py
+"""
+Bodies of the heavy endpoints as plain functions of the request JSON.
+
+The Flask routes call them directly; POST /jobs runs the same functions on the
+JobQueue process pool. They raise ValueError for bad input and report progress
+through job_queue.report_progress, which is a no-op inside a request.
+
+GIFs go through the content-addressed artifact cache (under static/, relative to
+the server's working directory, which worker processes share): the key is a
+hash of the normalized request, and the response without the URL is kept as a
+sidecar, so a repeated request returns the existing GIF without packing,
+routing or encoding anything.
+
+Time spent placing/routing ("solve"), drawing ("render") and writing the GIF
+("encode") on a miss is recorded in ServerRuntime.metrics.
+"""
+
+import base64
+from typing import Dict, Any
+
+from ShelfSpaceOptimization.shelf_problem import FixedShelfPacker3D
+from ShelfSpaceOptimization.shelf_problem_new import FixedShelfPacker3DIncremental
+from ShelfSpaceOptimization.shelf_compare import compare_packers
+from ShelfSpaceOptimization.shelf_state import ColumnarState
+from RouteOptimization.path_finding import run_pathfinding_animation_dynamic
+
+from .artifact_cache import ArtifactCache
+from .job_queue import report_progress
+from .metrics import metrics
+
+# One instance per process (server and job workers), all on the same directory
+artifact_cache = ArtifactCache.from_env()
+
+
+def _rules_key(compatibility_rules):
+    # rule lists are used as sets, so their order must not change the key
+    return {str(k): sorted({str(t) for t in v}) for k, v in compatibility_rules.items()}
+
+
+def _positive_int(data, key, default):
+    """Optional positive integer parameter; raises ValueError (-> 400) for anything else."""
+    value = data.get(key, default)
+    try:
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise ValueError(f"{key} must be a positive integer, got {value!r}")
+    return number
+
+
+def _cached_gif(kind, state, view, build):
+    """Runs build(gif_path) -> response-without-URL on a miss; adds video_url and cached."""
+    path, response, cached = artifact_cache.get_or_create(kind, state, {**view, "format": "gif"}, build)
+    return {"video_url": artifact_cache.url_for(path), **response, "cached": cached}
+
+
+def run_generate(data: Dict[str, Any]) -> Dict[str, Any]:
+    """/generate: full packing + per-item GIF."""
+    shelf_width = data.get('shelf_width')
+    shelf_height = data.get('shelf_height')
+    shelf_depth = data.get('shelf_depth')
+    shelf_count = data.get('shelf_count')
+    selected_shelf_id = data.get('selected_shelf_id')
+    compatibility_rules = data.get('compatibility_rules')
+    items_to_pack = data.get('items')
+
+    if not all([shelf_width, shelf_height, shelf_depth, shelf_count, compatibility_rules, items_to_pack]):
+        raise ValueError("Missing required parameters")
+
+    state = {
+        "shelf": [shelf_width, shelf_height, shelf_depth, shelf_count],
+        "selected_shelf_id": selected_shelf_id,
+        "compatibility_rules": _rules_key(compatibility_rules),
+        "items": items_to_pack,
+    }
+    view = {
+        "keyframe_every": _positive_int(data, 'keyframe_every', 1),
+        "max_info_lines": _positive_int(data, 'max_info_lines', 40),
+    }
+
+    def build(gif_path):
+        packer = FixedShelfPacker3D(
+            shelf_width=shelf_width,
+            shelf_height=shelf_height,
+            shelf_depth=shelf_depth,
+            shelf_count=shelf_count,
+            compatibility_rules=compatibility_rules,
+            selected_shelf_id=selected_shelf_id
+        )
+
+        for item in items_to_pack:
+            packer.add_item(*item)
+
+        # keyframe_every > 1 places several items per frame; items are placed while frames are drawn
+        timings = {}
+        packer.animate(
+            save_path=gif_path,
+            keyframe_every=view["keyframe_every"],
+            max_info_lines=view["max_info_lines"],
+            progress_callback=lambda frame, total: report_progress("rendering", frame + 1, total),
+            timings=timings,
+        )
+        metrics.observe_timings(timings)
+        return {"result": packer.get_packing_result_json()}
+
+    return _cached_gif("generate", state, view, build)
+
+
+def run_generate_incremental(data: Dict[str, Any]) -> Dict[str, Any]:
+    """/generate-incremental: place only new items around the existing state + snapshot GIF."""
+    shelf_width = data.get('shelf_width')
+    shelf_height = data.get('shelf_height')
+    shelf_depth = data.get('shelf_depth')
+    shelf_count = data.get('shelf_count')
+    selected_shelf_id = data.get('selected_shelf_id')
+    compatibility_rules = data.get('compatibility_rules')
+    items_to_pack = data.get('items', [])
+    existing_state = data.get('existing_state')
+    state_format = data.get('state_format', 'json')
+
+    if not all([shelf_width, shelf_height, shelf_depth, shelf_count, compatibility_rules]) \
+       or items_to_pack is None:
+        raise ValueError("Missing required parameters")
+
+    state = {
+        "shelf": [shelf_width, shelf_height, shelf_depth, shelf_count],
+        "selected_shelf_id": selected_shelf_id,
+        "compatibility_rules": _rules_key(compatibility_rules),
+        "items": items_to_pack,
+        "existing_state": existing_state,
+        "existing_state_columnar": data.get('existing_state_columnar'),
+    }
+
+    def build(gif_path):
+        prior = existing_state
+        if data.get('existing_state_columnar'):
+            prior = ColumnarState.from_bytes(base64.b64decode(data['existing_state_columnar']))
+
+        packer = FixedShelfPacker3DIncremental(
+            shelf_width=shelf_width,
+            shelf_height=shelf_height,
+            shelf_depth=shelf_depth,
+            shelf_count=shelf_count,
+            compatibility_rules=compatibility_rules,
+            selected_shelf_id=selected_shelf_id,
+            existing_state=prior
+        )
+
+        for item in items_to_pack:
+            packer.add_item(*item)
+
+        # Place only the NEW items; existing placements stay fixed
+        report_progress("packing", 0, len(items_to_pack))
+        with metrics.stage("solve"):
+            packer.place_all_new_items()
+
+        report_progress("rendering")
+        timings = {}
+        packer.animate(save_path=gif_path, timings=timings)
+        metrics.observe_timings(timings)
+
+        # Updated state
+        if state_format == 'columnar':
+            state_bytes = packer.get_packing_result_columnar().to_bytes()
+            return {"result_columnar": base64.b64encode(state_bytes).decode("ascii")}
+        return {"result": packer.get_packing_result_json()}
+
+    return _cached_gif("generate-incremental", state, {"state_format": state_format}, build)
+
+
+def run_compare(data: Dict[str, Any]) -> Dict[str, Any]:
+    """/compare-shelf-packers."""
+    required = ["shelf_width", "shelf_height", "shelf_depth", "shelf_count", "compatibility_rules"]
+    if not all(k in data for k in required):
+        raise ValueError(f"Missing required parameters: {required}")
+    report_progress("packing")
+    with metrics.stage("solve"):
+        return compare_packers(data)
+
+
+def run_pathfinding(data: Dict[str, Any]) -> Dict[str, Any]:
+    """/pathfinding: route animation GIF."""
+    shelf_height = data.get('shelf_height')
+    shelf_count = data.get('shelf_count')
+    shelf_interval = data.get('shelf_interval')
+    picking_locations = data.get('picking_locations')
+    workers = data.get('workers')
+
+    if not all([shelf_height, shelf_count, shelf_interval, picking_locations, workers]):
+        raise ValueError("Missing picking_locations or workers : shelf_height, shelf_count, shelf_interval, picking_locations, workers")
+
+    state = {
+        "shelf_height": shelf_height,
+        "shelf_count": shelf_count,
+        "shelf_interval": shelf_interval,
+        "picking_locations": picking_locations,
+        "obstacles": workers,
+    }
+
+    def build(gif_path):
+        report_progress("rendering")
+        timings = {}
+        run_pathfinding_animation_dynamic(
+            shelf_height=shelf_height,
+            shelf_count=shelf_count,
+            shelf_interval=shelf_interval,
+            picking_locations=picking_locations,
+            obstacles=workers,
+            save_path=gif_path,
+            timings=timings,
+        )
+        metrics.observe_timings(timings)
+        return {}
+
+    return _cached_gif("pathfinding", state, {}, build)
+
+
+# POST /jobs "kind" -> job function
+JOB_KINDS = {
+    "generate": run_generate,
+    "generate-incremental": run_generate_incremental,
+    "compare-shelf-packers": run_compare,
+    "pathfinding": run_pathfinding,
+}
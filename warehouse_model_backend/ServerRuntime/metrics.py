@@ -0,0 +1,246 @@
+# ServerRuntime/metrics.py
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+
+# Seconds; GIF endpoints take several seconds, so the tail goes up to a minute
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Route of the request being handled in this thread/greenlet; stage timings are labelled with it
+_current_route: contextvars.ContextVar = contextvars.ContextVar("metrics_route", default="background")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None, base: Labels = ()) -> str:
+    pairs = list(base) + list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set (Prometheus semantics)."""
+
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, List[float]] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, labels: Labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self, base: Labels = ()) -> List[str]:
+        """`base` labels (e.g. the pid) go in front of every series' own labels."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', _format_value(bound)), base)} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', '+Inf'), base)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(labels, base=base)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(labels, base=base)} {series[-1]}")
+        return lines
+
+
+class Metrics:
+    """
+    Process-local metrics rendered in the Prometheus text format (no client library needed).
+
+      http_request_duration_seconds{route,method}   histogram, per Flask route rule
+      http_requests_total{route,method,status}       counter
+      http_requests_in_flight{route}                  gauge
+      stage_duration_seconds{route,stage}             histogram: solve | render | encode | inference | ...
+      job_duration_seconds{kind,status}, job_queue_wait_seconds{kind}   background jobs
+      cache_hits_total / cache_misses_total / cache_hit_ratio{cache,kind}  from registered caches
+
+    Every server process keeps its own numbers and labels every series it
+    renders with pid="<its pid>", so series scraped from different serve.py
+    workers never collide (sum without (pid) adds them up); stages that run
+    inside job or pool worker processes are not included.
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self._lock = threading.Lock()
+        self.request_latency = Histogram(
+            "http_request_duration_seconds", "Request latency by route (until the response is finished).", buckets)
+        self.stage_latency = Histogram(
+            "stage_duration_seconds", "Time spent per processing stage, by route.", buckets)
+        self.job_latency = Histogram(
+            "job_duration_seconds", "Background job run time (started to finished), by kind.", buckets)
+        self.job_wait = Histogram(
+            "job_queue_wait_seconds", "Background job time in the queue before a worker picked it up.", buckets)
+        self._requests: Dict[Labels, int] = {}
+        self._in_flight: Dict[Labels, int] = {}
+        self._caches: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+
+    # ---------- Recording ----------
+
+    def request_started(self, route: str):
+        with self._lock:
+            key = (("route", route),)
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+
+    def request_finished(self, route: str, method: str, status: int, seconds: float):
+        with self._lock:
+            key = (("route", route),)
+            self._in_flight[key] = self._in_flight.get(key, 1) - 1
+            self.request_latency.observe(seconds, (("method", method), ("route", route)))
+            counter = (("method", method), ("route", route), ("status", str(status)))
+            self._requests[counter] = self._requests.get(counter, 0) + 1
+
+    def observe_stage(self, stage: str, seconds: float, route: Optional[str] = None):
+        with self._lock:
+            self.stage_latency.observe(seconds, (("route", route or _current_route.get()), ("stage", stage)))
+
+    def observe_timings(self, timings: Dict[str, float], route: Optional[str] = None):
+        """Records a {stage: seconds} dict as filled in by the packers / renderers."""
+        for stage, seconds in timings.items():
+            self.observe_stage(stage, seconds, route)
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(name, time.perf_counter() - started)
+
+    @contextmanager
+    def route(self, name: str):
+        """Labels stages recorded outside a Flask request (e.g. Socket.IO handlers, background tasks)."""
+        token = _current_route.set(name)
+        try:
+            yield
+        finally:
+            _current_route.reset(token)
+
+    def observe_job(self, job: Dict[str, Any]):
+        """Called with a finished JobQueue record."""
+        with self._lock:
+            kind = (("kind", job["kind"]),)
+            if job.get("started_at"):
+                self.job_wait.observe(job["started_at"] - job["submitted_at"], kind)
+                self.job_latency.observe(job["finished_at"] - job["started_at"], kind + (("status", job["status"]),))
+
+    def register_cache(self, name: str, stats: Callable[[], Dict[str, Any]]):
+        """stats() -> {"hits", "misses", optional "by_kind": {kind: {"hits", "misses"}}}."""
+        self._caches[name] = stats
+
+    def register_gauge(self, name: str, help_text: str, value: Callable[[], float]):
+        self._gauges[name] = (help_text, value)
+
+    # ---------- Exposition ----------
+
+    def _cache_lines(self, base: Labels) -> List[str]:
+        rows = []
+        for cache, stats_fn in sorted(self._caches.items()):
+            try:
+                stats = stats_fn()
+            except Exception:
+                continue
+            per_kind = stats.get("by_kind") or {"all": stats}
+            for kind, counts in sorted(per_kind.items()):
+                rows.append(((("cache", cache), ("kind", kind)), counts.get("hits", 0), counts.get("misses", 0)))
+
+        lines = []
+        for name, kind, help_text, pick in (
+            ("cache_hits_total", "counter", "Cache lookups answered from the cache.", lambda h, m: h),
+            ("cache_misses_total", "counter", "Cache lookups that had to compute.", lambda h, m: m),
+            ("cache_hit_ratio", "gauge", "hits / (hits + misses) since start.",
+             lambda h, m: h / (h + m) if h + m else 0.0),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{_format_labels(labels, base=base)} {_format_value(pick(h, m))}" for labels, h, m in rows]
+        return lines
+
+    def render(self) -> str:
+        # read at render time: the numbers belong to whichever process answers
+        base = (("pid", str(os.getpid())),)
+        with self._lock:
+            lines = self.request_latency.render(base)
+            lines += ["# HELP http_requests_total Finished requests by route and status.",
+                      "# TYPE http_requests_total counter"]
+            lines += [f"http_requests_total{_format_labels(k, base=base)} {v}" for k, v in sorted(self._requests.items())]
+            lines += ["# HELP http_requests_in_flight Requests being handled right now.",
+                      "# TYPE http_requests_in_flight gauge"]
+            lines += [f"http_requests_in_flight{_format_labels(k, base=base)} {v}"
+                      for k, v in sorted(self._in_flight.items())]
+            lines += self.stage_latency.render(base)
+            lines += self.job_latency.render(base)
+            lines += self.job_wait.render(base)
+        lines += self._cache_lines(base)
+        for name, (help_text, value_fn) in sorted(self._gauges.items()):
+            try:
+                value = value_fn()
+            except Exception:
+                continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge",
+                      f"{name}{_format_labels((), base=base)} {_format_value(value)}"]
+        lines += ["# HELP process_info Server process the numbers above belong to.",
+                  "# TYPE process_info gauge", f"process_info{_format_labels((), base=base)} 1"]
+        return "\n".join(lines) + "\n"
+
+
+def install(app, metrics: "Metrics"):
+    """Flask hooks: in-flight gauge, per-route latency histogram and request counter."""
+    from flask import g, request
+
+    @app.before_request
+    def _metrics_start():
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        g.metrics_route = route
+        g.metrics_started = time.perf_counter()
+        g.metrics_token = _current_route.set(route)
+        metrics.request_started(route)
+
+    @app.after_request
+    def _metrics_status(response):
+        g.metrics_status = response.status_code
+        if response.is_streamed and "metrics_started" in g:
+            # the body is produced after teardown: count the request until the server closes it
+            route, method, status, started = g.metrics_route, request.method, response.status_code, g.metrics_started
+            response.call_on_close(
+                lambda: metrics.request_finished(route, method, status, time.perf_counter() - started))
+            g.metrics_deferred = True
+        return response
+
+    @app.teardown_request
+    def _metrics_finish(exc):
+        # runs on unhandled errors too, and twice for stream_with_context bodies: only the first call counts
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return
+        if not g.pop("metrics_deferred", False):
+            metrics.request_finished(g.metrics_route, request.method, g.get("metrics_status", 500),
+                                     time.perf_counter() - started)
+        try:
+            _current_route.reset(g.pop("metrics_token"))
+        except (KeyError, ValueError):
+            pass
+
+
+# One per process; endpoints and runners record into it
+metrics = Metrics()
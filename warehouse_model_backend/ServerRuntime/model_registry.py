@@ -0,0 +1,162 @@
+# ServerRuntime/model_registry.py
+
+import importlib
+import io
+import os
+import resource
+import sys
+import threading
+import time
+from typing import Dict, Any, Callable, Iterable, Optional
+
+
+def _rss_bytes() -> int:
+    """Current resident set size (falls back to the peak where /proc is missing)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class ModelRegistry:
+    """
+    Loads each inference model once per process and warms it up before use.
+
+    register(name, loader, warmup) only records how to load: loader() returns
+    the callable the endpoints use, warmup(model) runs one throw-away
+    inference on it. get(name) loads and warms on first use; preload() does it
+    at boot so the first real request does not pay for it. Concurrent callers
+    of a model that is still loading wait for the one load instead of
+    repeating it.
+
+    stats() reports, per model: state, load_ms, warmup_ms and the RSS growth
+    (MB) measured around loading and warm-up. A warm-up that raises is kept in
+    warmup_error; the model is still ready, since only loading it is required.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+
+    def register(self, name: str, loader: Callable[[], Any], warmup: Optional[Callable[[Any], Any]] = None):
+        with self._lock:
+            self._entries[name] = {
+                "loader": loader,
+                "warmup": warmup,
+                "lock": threading.Lock(),
+                "model": None,
+                "state": "registered",
+                "load_ms": None,
+                "warmup_ms": None,
+                "rss_mb": None,
+                "error": None,
+                "warmup_error": None,
+            }
+
+    def names(self):
+        return list(self._entries)
+
+    def _entry(self, name: str) -> Dict[str, Any]:
+        entry = self._entries.get(name)
+        if entry is None:
+            raise ValueError(f"Unknown model {name!r}; registered: {self.names()}")
+        return entry
+
+    def get(self, name: str) -> Any:
+        """The loaded (and warmed) model; raises whatever loading raised."""
+        entry = self._entry(name)
+        if entry["state"] == "ready":
+            return entry["model"]
+        with entry["lock"]:
+            if entry["state"] != "ready":
+                self._load(name, entry)
+            return entry["model"]
+
+    def _load(self, name: str, entry: Dict[str, Any]):
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+        entry["state"] = "loading"
+        try:
+            model = entry["loader"]()
+        except Exception as e:
+            entry.update({"state": "failed", "error": f"{type(e).__name__}: {e}"})
+            raise
+        entry["load_ms"] = (time.perf_counter() - started) * 1000.0
+        entry["warmup_error"] = None
+        if entry["warmup"] is not None:
+            started = time.perf_counter()
+            try:
+                entry["warmup"](model)
+            except Exception as e:
+                # the first real request pays for the warm-up instead
+                entry["warmup_error"] = f"{type(e).__name__}: {e}"
+                print(f"[Models] {name} warm-up failed: {entry['warmup_error']}")
+            entry["warmup_ms"] = (time.perf_counter() - started) * 1000.0
+        entry.update({
+            "model": model,
+            "state": "ready",
+            "error": None,
+            "rss_mb": (_rss_bytes() - rss_before) / (1024.0 * 1024.0),
+        })
+        print(f"[Models] {name} ready: load {entry['load_ms']:.0f} ms, "
+              f"warm-up {entry['warmup_ms'] or 0:.0f} ms, +{entry['rss_mb']:.1f} MB")
+
+    def preload(self, names: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Loads + warms the given models (all when None); failures are reported, not raised."""
+        for name in (self.names() if names is None else names):
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"[Models] {name} failed to load: {e}")
+        return self.stats()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {k: entry[k] for k in ("state", "load_ms", "warmup_ms", "rss_mb", "error", "warmup_error")}
+            for name, entry in self._entries.items()
+        }
+
+
+# ---------- Server models ----------
+
+def _import_attr(module: str, attr: str) -> Callable[[], Any]:
+    return lambda: getattr(importlib.import_module(module), attr)
+
+
+def _load_performance_estimator():
+    # the fitted estimator behind predict_performance; batch scoring calls its predict(DataFrame) directly
+    estimator = getattr(importlib.import_module("InboundOutboundForecast.employee_perf"), "model", None)
+    if not callable(getattr(estimator, "predict", None)):
+        raise AttributeError("InboundOutboundForecast.employee_perf.model has no predict(DataFrame) method")
+    return estimator
+
+
+def _warm_fire_detection(process_image):
+    # one blank frame through the detector: allocates buffers and compiles kernels
+    from PIL import Image
+
+    frame = io.BytesIO()
+    Image.new("RGB", (640, 480)).save(frame, format="JPEG")
+    frame.seek(0)
+    process_image(frame)
+
+
+models = ModelRegistry()
+models.register(
+    "fire_detection",
+    _import_attr("FireDetection.shelf_detection", "process_image"),
+    warmup=_warm_fire_detection,
+)
+# The forecast and performance models need a real category / feature row to
+# run, so their warm-up is the load itself.
+models.register(
+    "forecast",
+    _import_attr("InboundOutboundForecast.inbound_outbound_forecast", "predict_forecast_for_a_category"),
+)
+models.register(
+    "employee_performance",
+    _import_attr("InboundOutboundForecast.employee_perf", "predict_performance"),
+)
+models.register("employee_performance_model", _load_performance_estimator)
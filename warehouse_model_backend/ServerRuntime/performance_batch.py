@@ -0,0 +1,68 @@
+# ServerRuntime/performance_batch.py
+
+from typing import Dict, Any, Iterator, List, Optional
+
+from .metrics import metrics
+from .model_registry import models
+
+
+def records_frame(records: Optional[List[Dict[str, Any]]] = None, csv_file=None):
+    """One DataFrame from a list of /predict-performance records or an uploaded CSV (header row = fields)."""
+    import pandas as pd
+
+    if csv_file is not None:
+        return pd.read_csv(csv_file)
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        raise ValueError("records must be a list of JSON objects")
+    return pd.DataFrame.from_records(records)
+
+
+def _plain(value):
+    return value.item() if hasattr(value, "item") else value
+
+
+def _iter_chunks(model, frame, size: int) -> Iterator[Dict[str, Any]]:
+    for lo in range(0, len(frame), size):
+        chunk = frame.iloc[lo:lo + size].reset_index(drop=True)
+        try:
+            with metrics.stage("inference"):
+                values = list(model.predict(chunk))
+            if len(values) != len(chunk):
+                raise ValueError(f"model returned {len(values)} predictions for {len(chunk)} rows")
+        except Exception as e:
+            for i in range(len(chunk)):
+                yield {"index": lo + i, "error": str(e)}
+            continue
+        for i, value in enumerate(values):
+            yield {"index": lo + i, "predicted_performance": _plain(value)}
+
+
+def iter_predictions(frame, chunk_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yields {"index", "predicted_performance"} or {"index", "error"} per row, in input order.
+
+    Each chunk of `chunk_size` rows (the whole frame when None) is one
+    model.predict(chunk) call on the estimator from the registry
+    ("employee_performance_model"); a failing call fails only its chunk.
+    The arguments are checked and the model is loaded before the first row,
+    so those errors surface here rather than halfway through a stream.
+    """
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError(f"chunk_size must be a positive integer, got {chunk_size!r}")
+    model = models.get("employee_performance_model")
+    return _iter_chunks(model, frame, chunk_size or max(1, len(frame)))
+
+
+def predict_batch(frame) -> Dict[str, Any]:
+    """
+    All rows in one model.predict call:
+      {"predictions": [value | null, ...], "errors": [{"index", "error"}], "count": n}
+    """
+    predictions: List[Any] = [None] * len(frame)
+    errors = []
+    for record in iter_predictions(frame):
+        if "error" in record:
+            errors.append(record)
+        else:
+            predictions[record["index"]] = record["predicted_performance"]
+    return {"predictions": predictions, "errors": errors, "count": len(frame)}
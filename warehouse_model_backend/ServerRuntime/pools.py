@@ -0,0 +1,246 @@
+# ServerRuntime/pools.py
+"""
+Process pools whose tasks can be stopped one at a time.
+
+concurrent.futures.ProcessPoolExecutor cannot stop a running task; the only
+way out is killing its worker processes, and then every other task on the
+pool (other requests' included) fails with BrokenProcessPool. WorkerPool
+knows which worker runs which task, so kill(future) stops just that task's
+process and a fresh worker takes its place. Shared pools can therefore
+enforce per-request timeouts without touching anybody else's work.
+"""
+
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.connection import wait
+from multiprocessing.util import Finalize
+from typing import Callable, Optional, Tuple
+
+
+# Held from Pipe() until the parent closes the child's end: a worker forked in between would
+# inherit that end and keep the pipe open after the worker it belongs to has died
+_spawn_lock = threading.Lock()
+
+
+class TaskKilled(Exception):
+    """Set on a future whose task was stopped by WorkerPool.kill() or shutdown(kill=True)."""
+
+
+def _worker_main(conn, initializer, initargs):
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        fn, args, kwargs = task
+        try:
+            reply = (True, fn(*args, **kwargs))
+        except BaseException as e:
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # the result (or the exception) could not be pickled
+            conn.send((False, RuntimeError(f"Could not return the task result: {e!r}")))
+
+
+class _Worker:
+    __slots__ = ("process", "conn", "killed")
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.killed = False
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.conn.close()
+        self.process.join(1.0)
+        if self.process.is_alive():
+            # SIGKILL: workers forked from a serve.py worker inherit its SIGTERM handler
+            self.process.kill()
+            self.process.join()
+
+
+class WorkerPool:
+    """
+    Fixed-size process pool with per-task kill.
+
+    submit() returns a concurrent.futures.Future, so callers keep using
+    wait() / as_completed() with their own timeouts. Each of the up to
+    `max_workers` worker processes is driven by one thread of this process
+    and started on first use; `initializer(*initargs)` runs once in every
+    worker, replacements included. A worker that dies while running a task
+    fails only that task (BrokenProcessPool) and is replaced.
+    """
+
+    def __init__(self, max_workers: int, initializer: Optional[Callable] = None,
+                 initargs: Tuple = (), name: str = "pool"):
+        if max_workers < 1:
+            raise ValueError(f"max_workers must be a positive integer, got {max_workers!r}")
+        self.max_workers = max_workers
+        self.name = name
+        self._initializer = initializer
+        self._initargs = initargs
+        self._ctx = multiprocessing.get_context()
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._queue = deque()   # (future, fn, args, kwargs) not started yet
+        self._running = {}      # future -> _Worker
+        self._threads = []
+        self._idle = 0          # threads waiting for a task
+        self._closed = False
+        # When this process is itself a pool worker (e.g. a background job), multiprocessing
+        # joins its children on exit: stop this pool's workers first.
+        Finalize(self, self.shutdown, exitpriority=100)
+
+    # ---------- Public API ----------
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Runs fn(*args, **kwargs) on a worker (fn must be a picklable module-level function)."""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"{self.name}: cannot submit after shutdown")
+            self._queue.append((future, fn, args, kwargs))
+            self._ready.notify()
+            if len(self._queue) > self._idle and len(self._threads) < self.max_workers:
+                thread = threading.Thread(
+                    target=self._serve, name=f"{self.name}-{len(self._threads)}", daemon=True
+                )
+                self._threads.append(thread)
+                thread.start()
+        return future
+
+    def kill(self, future: Future) -> bool:
+        """
+        Stops one task: a queued task is cancelled, a running one has its worker
+        process killed (the future then fails with TaskKilled). Other tasks are
+        not affected. False when the task had already finished.
+        """
+        with self._lock:
+            if future.cancel():
+                return True
+            worker = self._running.get(future)
+            if worker is None:
+                return False
+            # under the lock: the worker cannot have moved on to another task yet
+            worker.killed = True
+            worker.process.kill()
+        return True
+
+    def shutdown(self, wait: bool = True, kill: bool = False):
+        """
+        Stops accepting tasks and cancels the queued ones. Running tasks finish
+        (kill=False) or have their workers killed (kill=True); with `wait`,
+        returns once every worker process is gone.
+        """
+        with self._lock:
+            self._closed = True
+            while self._queue:
+                self._queue.popleft()[0].cancel()
+            if kill:
+                for worker in self._running.values():
+                    worker.killed = True
+                    worker.process.kill()
+            threads = list(self._threads)
+            self._ready.notify_all()
+        if wait:
+            for thread in threads:
+                if thread is not threading.current_thread():
+                    thread.join()
+
+    # ---------- Internals ----------
+
+    def _spawn(self) -> _Worker:
+        with _spawn_lock:
+            parent_conn, child_conn = self._ctx.Pipe()
+            process = self._ctx.Process(
+                target=_worker_main, args=(child_conn, self._initializer, self._initargs),
+                name=f"{self.name}-worker",
+            )
+            process.start()
+            child_conn.close()
+        return _Worker(process, parent_conn)
+
+    def _next_task(self, worker: Optional[_Worker]):
+        """Blocks for the next task and marks it running on `worker`; None once the pool is shut down."""
+        with self._lock:
+            while True:
+                while not self._queue and not self._closed:
+                    self._idle += 1
+                    self._ready.wait()
+                    self._idle -= 1
+                if self._closed:
+                    return None
+                task = self._queue.popleft()
+                if task[0].set_running_or_notify_cancel():
+                    if worker is not None:
+                        self._running[task[0]] = worker
+                    return task
+
+    def _serve(self):
+        worker, spawn_error = None, None
+        try:
+            while True:
+                if worker is None:
+                    try:
+                        worker, spawn_error = self._spawn(), None
+                    except Exception as e:
+                        spawn_error = e
+                task = self._next_task(worker)
+                if task is None:
+                    return
+                future, fn, args, kwargs = task
+                if worker is None:
+                    future.set_exception(spawn_error)
+                    continue
+
+                try:
+                    worker.conn.send((fn, args, kwargs))
+                    # the sentinel fires when the worker dies, even if a process forked
+                    # elsewhere (not through this module) still holds its end of the pipe
+                    if worker.conn not in wait([worker.conn, worker.process.sentinel]):
+                        raise EOFError
+                    ok, value = worker.conn.recv()
+                except (EOFError, OSError):
+                    ok, value = None, None
+                except Exception as e:
+                    # arguments could not be pickled: the worker never saw the task
+                    ok, value = False, e
+                with self._lock:
+                    self._running.pop(future, None)
+                    killed = worker.killed
+
+                if ok is None or killed:
+                    # dead, or killed just after it answered: replaced either way
+                    worker.process.join()
+                    worker.conn.close()
+                    worker = None
+                if ok is None:
+                    future.set_exception(TaskKilled("Task was killed") if killed
+                                         else BrokenProcessPool("Worker process died while running the task"))
+                elif ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+        finally:
+            if worker is not None:
+                worker.stop()
+
+
+def check_timeout(value, name: str = "timeout_seconds") -> Optional[float]:
+    """A timeout / deadline argument: None or a positive number of seconds, else ValueError."""
+    if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+        raise ValueError(f"{name} must be a positive number, got {value!r}")
+    return value
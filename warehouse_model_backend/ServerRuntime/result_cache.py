@@ -0,0 +1,139 @@
+# ServerRuntime/result_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Hashable, Optional, Tuple
+
+
+class _Flight:
+    """One in-progress computation that concurrent callers of the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class ResultCache:
+    """
+    In-memory TTL + LRU cache with single-flight computation.
+
+    get_or_compute(key, compute) returns (value, cached). On a miss the first
+    caller runs compute(); callers arriving for the same key while it runs
+    wait for that result (or its exception) instead of computing again.
+    Entries expire `ttl_seconds` after they were computed; beyond
+    `max_entries` the least recently used one is dropped. Failures are not
+    cached.
+
+    begin()/finish() are the same protocol for callers that compute the value
+    elsewhere (e.g. on a process pool) and cannot block in compute().
+
+    Values are shared between callers: treat them as read-only.
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = 900.0, max_entries: int = 64):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0  # callers that joined another caller's computation
+        self.evictions = 0
+
+    def _lookup(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created, value = entry
+        if self.ttl_seconds is not None and time.monotonic() - created > self.ttl_seconds:
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: Hashable, value: Any):
+        # caller holds the lock
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Tuple[Any, bool]:
+        state, found = self.begin(key)
+        if state == "hit":
+            return found, True
+        if state == "shared":
+            found.done.wait()
+            if found.error is not None:
+                raise found.error
+            return found.value, True
+
+        try:
+            value = compute()
+        except BaseException as e:
+            self.finish(key, found, error=e)
+            raise
+        self.finish(key, found, value=value)
+        return value, False
+
+    def begin(self, key: Hashable) -> Tuple[str, Any]:
+        """
+        Non-blocking start of a lookup, one of:
+          ("hit", value)      fresh entry
+          ("shared", flight)  another caller is computing it: wait on flight.done,
+                              then read flight.value / flight.error
+          ("leader", flight)  the caller computes it and must call finish(key, flight, ...)
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                return "hit", entry[1]
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.shared += 1
+                return "shared", flight
+            flight = self._flights[key] = _Flight()
+            self.misses += 1
+            return "leader", flight
+
+    def finish(self, key: Hashable, flight: _Flight, value: Any = None, error: Optional[BaseException] = None):
+        """Ends a flight from begin(): caches `value` unless `error` is given, then wakes its waiters."""
+        with self._lock:
+            if error is None:
+                flight.value = value
+                self._store(key, value)
+            else:
+                flight.error = error
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.done.set()
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Drops one key, or everything when key is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.shared
+            return {
+                "entries": len(self._entries),
+                "in_flight": len(self._flights),
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared": self.shared,
+                "hit_ratio": (self.hits + self.shared) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "ttl_seconds": self.ttl_seconds,
+                "max_entries": self.max_entries,
+            }
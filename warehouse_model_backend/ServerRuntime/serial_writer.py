@@ -0,0 +1,314 @@
+# ServerRuntime/serial_writer.py
+
+import os
+import queue
+import socket
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+
+SERIAL_BAUD = 9600
+# Let users override; default to a likely port
+DEFAULT_SERIAL_PORT = "COM3" if os.name == "nt" else "/dev/ttyUSB0"
+
+
+class SerialWriter:
+    """
+    Owns the Arduino serial port on a background thread, so handlers never block on it.
+
+    send() only enqueues and returns immediately:
+      - a signal equal to the one already queued, or (if that was dropped) to
+        the last one actually written, is coalesced (not queued again);
+      - the queue holds at most `max_queue` lines; when full the oldest is
+        dropped, since only the newest signal matters.
+    The writer thread re-sends the newest requested signal every
+    `heartbeat_interval` seconds when nothing else was attempted (so a signal
+    lost while the port was down goes out once it is back), opens the port
+    lazily and, after an I/O error, closes it and retries every
+    `reconnect_interval` seconds.
+
+    `port` may be a device name (COM3, /dev/ttyUSB0) or any pyserial URL
+    (loop://, spy://..., socket://host:port), which makes tests hardware-free.
+    """
+
+    def __init__(
+        self,
+        port: str,
+        baudrate: int = 9600,
+        heartbeat_interval: Optional[float] = 1.0,
+        max_queue: int = 8,
+        reconnect_interval: float = 2.0,
+        write_timeout: float = 0.5,
+    ):
+        self.port = port
+        self.baudrate = baudrate
+        self.heartbeat_interval = heartbeat_interval
+        self.reconnect_interval = reconnect_interval
+        self.write_timeout = write_timeout
+
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=max(1, max_queue))
+        self._lock = threading.Lock()
+        self._ser = None
+        self._thread = None
+        self._stopping = False
+        self._last_requested: Optional[str] = None  # newest line given to send()
+        self._last_queued: Optional[str] = None     # newest line queued and not dropped
+        self._last_written: Optional[str] = None    # last line that reached the port
+        self._last_attempt_at = 0.0
+        self._next_connect_at = 0.0
+        self.counters = {
+            "writes": 0,
+            "heartbeats": 0,
+            "coalesced": 0,
+            "dropped": 0,
+            "write_errors": 0,
+            "connects": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "SerialWriter":
+        """ARDUINO_PORT, ARDUINO_HEARTBEAT_SECONDS (1.0), ARDUINO_QUEUE_SIZE (8)."""
+        return cls(
+            os.getenv("ARDUINO_PORT", DEFAULT_SERIAL_PORT),
+            SERIAL_BAUD,
+            heartbeat_interval=float(os.getenv("ARDUINO_HEARTBEAT_SECONDS", "1.0")),
+            max_queue=int(os.getenv("ARDUINO_QUEUE_SIZE", "8")),
+        )
+
+    # ---------- Lifecycle ----------
+
+    def start(self):
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="arduino-serial", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._enqueue(None)
+        self._thread.join(timeout)
+        self._thread = None
+        self._close()
+
+    # ---------- Producer side ----------
+
+    def send(self, line: str) -> bool:
+        """Queues one signal line; returns False if it was coalesced or the writer is not running."""
+        if self._thread is None:
+            return False
+        if not line.endswith("\n"):
+            line += "\n"
+        with self._lock:
+            self._last_requested = line
+            current = self._last_queued if self._last_queued is not None else self._last_written
+            if line == current:
+                self.counters["coalesced"] += 1
+                return False
+            self._last_queued = line
+        self._enqueue(line)
+        return True
+
+    def _enqueue(self, line: Optional[str]):
+        while True:
+            try:
+                self._queue.put_nowait(line)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    with self._lock:
+                        self.counters["dropped"] += 1
+                except queue.Empty:
+                    pass
+
+    # ---------- Writer thread ----------
+
+    def _connect(self) -> bool:
+        if self._ser is not None:
+            return True
+        if time.monotonic() < self._next_connect_at:
+            return False
+        import serial  # pyserial is loaded by the writer thread, not at server import
+
+        try:
+            # serial_for_url also accepts plain device names
+            self._ser = serial.serial_for_url(
+                self.port, self.baudrate, timeout=0.5, write_timeout=self.write_timeout
+            )
+            self.counters["connects"] += 1
+            print(f"[Serial] Connected to {self.port} @ {self.baudrate}")
+            return True
+        except Exception as e:
+            if self.counters["connects"] == 0 and self._next_connect_at == 0.0:
+                print(f"[Serial] Could not open {self.port} ({e}). Set ARDUINO_PORT env var to the correct port.")
+            self._next_connect_at = time.monotonic() + self.reconnect_interval
+            return False
+
+    def _close(self):
+        if self._ser is not None:
+            try:
+                self._ser.close()
+            except Exception:
+                pass
+            self._ser = None
+
+    def _dropped(self, line: str, heartbeat: bool, write_error: bool = False):
+        with self._lock:
+            # a resend of this line must not be coalesced against a write that never happened
+            if self._last_queued == line:
+                self._last_queued = None
+            if write_error:
+                self.counters["write_errors"] += 1
+            if not heartbeat:
+                self.counters["dropped"] += 1
+
+    def _write(self, line: str, heartbeat: bool = False):
+        import serial
+
+        self._last_attempt_at = time.monotonic()
+        if not self._connect():
+            self._dropped(line, heartbeat)
+            return
+        try:
+            self._ser.write(line.encode("utf-8"))
+        except serial.SerialTimeoutException:
+            # line is stalled but still open: drop this signal, keep the port
+            self._dropped(line, heartbeat, write_error=True)
+            return
+        except Exception as e:
+            print(f"[Serial] Write error: {e}")
+            self._dropped(line, heartbeat, write_error=True)
+            self._close()
+            self._next_connect_at = time.monotonic() + self.reconnect_interval
+            return
+        with self._lock:
+            self._last_written = line
+            self.counters["heartbeats" if heartbeat else "writes"] += 1
+
+    def _run(self):
+        while not self._stopping:
+            timeout = None
+            latest = self._last_requested
+            if self.heartbeat_interval and latest is not None:
+                timeout = max(0.0, self._last_attempt_at + self.heartbeat_interval - time.monotonic())
+            elif self._ser is None:
+                # wake up to retry the connection even when idle
+                timeout = self.reconnect_interval
+            try:
+                line = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                if latest is not None and self.heartbeat_interval:
+                    self._write(latest, heartbeat=True)
+                else:
+                    self._connect()
+                continue
+            if line is None:
+                continue
+            self._write(line)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "port": self.port,
+                "connected": self._ser is not None and self._ser.is_open,
+                "running": self._thread is not None,
+                "queued": self._queue.qsize(),
+                "last_signal": self._last_written.strip() if self._last_written else None,
+                "requested_signal": self._last_requested.strip() if self._last_requested else None,
+                **self.counters,
+            }
+
+
+# ---------- Multi-process serving ----------
+# A serial port can only be opened by one process. With several server workers
+# (Server/serve.py) the launcher owns the SerialWriter and runs a SerialRelay;
+# workers get a RemoteSerialWriter that forwards their lines as UDP datagrams on
+# localhost, which never blocks the worker.
+
+def _parse_address(address: str) -> Tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class SerialRelay:
+    """Receives lines from RemoteSerialWriter instances and passes them to `writer`."""
+
+    def __init__(self, writer: SerialWriter, host: str = "127.0.0.1", port: int = 0):
+        self.writer = writer
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((host, port))
+        self._sock.settimeout(0.5)
+        self._thread = None
+        self._stopping = False
+
+    @property
+    def address(self) -> str:
+        host, port = self._sock.getsockname()
+        return f"{host}:{port}"
+
+    def start(self):
+        self.writer.start()
+        self._thread = threading.Thread(target=self._run, name="arduino-relay", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        if self._thread is not None:
+            self._thread.join(2.0)
+        self._sock.close()
+        self.writer.stop()
+
+    def _run(self):
+        while not self._stopping:
+            try:
+                data = self._sock.recv(256)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            self.writer.send(data.decode("utf-8", errors="ignore"))
+
+
+class RemoteSerialWriter:
+    """
+    SerialWriter stand-in for worker processes: same send()/start()/stop()/stats(), via a SerialRelay.
+    Every line is forwarded; the relay's SerialWriter does the coalescing, since
+    only it knows what other workers sent and what actually reached the port.
+    """
+
+    def __init__(self, address: str):
+        self.address = _parse_address(address)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+        self._last_sent: Optional[str] = None
+        self.counters = {"sent": 0, "dropped": 0}
+
+    def start(self):
+        pass
+
+    def stop(self, timeout: float = 2.0):
+        self._sock.close()
+
+    def send(self, line: str) -> bool:
+        if not line.endswith("\n"):
+            line += "\n"
+        try:
+            self._sock.sendto(line.encode("utf-8"), self.address)
+        except OSError:
+            self.counters["dropped"] += 1
+            return False
+        self._last_sent = line
+        self.counters["sent"] += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"relay": "%s:%d" % self.address, "last_signal": self._last_sent.strip() if self._last_sent else None,
+                **self.counters}
+
+
+def serial_writer_from_env():
+    """The writer for this process: a RemoteSerialWriter when ARDUINO_RELAY is set (serve.py workers)."""
+    relay = os.getenv("ARDUINO_RELAY")
+    return RemoteSerialWriter(relay) if relay else SerialWriter.from_env()
@@ -0,0 +1,50 @@
+# ServerRuntime/warmup.py
+
+import importlib
+import time
+from typing import Dict, Any, Iterable, Optional
+
+# Heavy subsystems the server loads on first use. Naming them in warm_up()
+# (or the WARMUP env var) moves that cost to startup instead of the first request.
+SUBSYSTEMS = {
+    "render": ("ShelfSpaceOptimization.shelf_render", "matplotlib.pyplot", "matplotlib.animation"),
+    "shelf": ("ShelfSpaceOptimization.shelf_problem", "ShelfSpaceOptimization.shelf_problem_new"),
+    "route": ("RouteOptimization.path_finding",),
+    "forecast": ("InboundOutboundForecast.inbound_outbound_forecast", "InboundOutboundForecast.employee_perf"),
+    "fire": ("FireDetection.shelf_detection",),
+    "serial": ("serial",),
+}
+
+
+def parse_subsystems(text: Optional[str]) -> Iterable[str]:
+    """'all' | 'render,fire' | '' -> subsystem names."""
+    if not text:
+        return []
+    if text.strip() == "all":
+        return list(SUBSYSTEMS)
+    return [name.strip() for name in text.split(",") if name.strip()]
+
+
+def warm_up(names: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Imports the given subsystems (all when None) and returns
+    {name: {"ok": bool, "ms": float, "error"?: str}}. A subsystem that fails to
+    load is reported, not raised, so one missing model cannot stop the server.
+    """
+    report: Dict[str, Dict[str, Any]] = {}
+    for name in (SUBSYSTEMS if names is None else names):
+        if name not in SUBSYSTEMS:
+            raise ValueError(f"Unknown subsystem {name!r}; expected one of {sorted(SUBSYSTEMS)}")
+        started = time.perf_counter()
+        entry: Dict[str, Any] = {"ok": True}
+        try:
+            for module in SUBSYSTEMS[name]:
+                importlib.import_module(module)
+            if name == "render":
+                # selects the Agg backend and registers the 3D projection
+                importlib.import_module("ShelfSpaceOptimization.shelf_render").pyplot()
+        except Exception as e:
+            entry.update({"ok": False, "error": f"{type(e).__name__}: {e}"})
+        entry["ms"] = (time.perf_counter() - started) * 1000.0
+        report[name] = entry
+    return report
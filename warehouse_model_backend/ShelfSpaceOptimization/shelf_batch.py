@@ -0,0 +1,125 @@
+# ShelfSpaceOptimization/shelf_batch.py
+
+import base64
+import os
+import time
+from concurrent.futures import as_completed, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Iterator, Optional
+
+from ServerRuntime.pools import WorkerPool, check_timeout
+
+from .shelf_compare import pack_full, pack_incremental
+from .shelf_state import ColumnarState
+
+JOB_MODES = ("full", "incremental")
+REQUIRED_KEYS = ("shelf_width", "shelf_height", "shelf_depth", "shelf_count", "compatibility_rules")
+
+# Created on first use and reused across requests, so a batch pays no process start-up
+_batch_pool = None
+
+
+def _get_batch_pool() -> WorkerPool:
+    global _batch_pool
+    if _batch_pool is None:
+        _batch_pool = WorkerPool(os.cpu_count() or 1, name="batch")
+    return _batch_pool
+
+
+def run_packing_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Packs one warehouse headless (no GIF). Runs inside a worker process.
+
+    `job` is a /generate payload ("mode": "full", default) or a
+    /generate-incremental payload ("mode": "incremental", with optional
+    existing_state / existing_state_columnar). Returns {"result", "metrics"};
+    raises on bad input.
+    """
+    mode = job.get("mode", "full")
+    if mode not in JOB_MODES:
+        raise ValueError(f"Unknown mode {mode!r}; expected one of {JOB_MODES}")
+    missing = [k for k in REQUIRED_KEYS if not job.get(k)]
+    if missing:
+        raise ValueError(f"Missing required parameters: {missing}")
+
+    if mode == "full":
+        # same as /generate: pack the given items onto empty shelves
+        result, metrics = pack_full({**job, "existing_state": None})
+    else:
+        if job.get("existing_state_columnar"):
+            state = ColumnarState.from_bytes(base64.b64decode(job["existing_state_columnar"]))
+            job = {**job, "existing_state": state}
+        result, metrics = pack_incremental(job)
+    return {"result": result, "metrics": metrics}
+
+
+def _run_job(index: int, job: Dict[str, Any]) -> Dict[str, Any]:
+    """Worker entry point: never raises for a bad job, so one failure cannot sink the batch."""
+    started = time.perf_counter()
+    record = {"index": index, "job_id": job.get("job_id", index) if isinstance(job, dict) else index}
+    try:
+        if not isinstance(job, dict):
+            raise ValueError("Each job must be a JSON object")
+        record.update(run_packing_job(job))
+        record["ok"] = True
+    except Exception as e:
+        record.update({"ok": False, "error": str(e), "error_type": type(e).__name__})
+    record["elapsed_ms"] = (time.perf_counter() - started) * 1000.0
+    return record
+
+
+def iter_batch(jobs: List[Dict[str, Any]], timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Runs all jobs on the shared worker pool and yields one record per job as
+    soon as it finishes (completion order, "index" is the position in `jobs`):
+      {"index", "job_id", "ok": true, "result": {...}, "metrics": {...}, "elapsed_ms"}
+      {"index", "job_id", "ok": false, "error": "...", "error_type": "..."}
+
+    Jobs not finished after `timeout` seconds are reported as failed with
+    error_type "TimeoutError"; the ones already running have their worker
+    processes killed so they stop using CPU. Only this batch's jobs are
+    stopped, other batches sharing the pool are not affected; likewise a
+    worker process dying fails only the job it was running. Raises
+    ValueError (before any job runs) unless `timeout` is a positive number.
+    """
+    check_timeout(timeout)
+    return _iter_results(jobs, timeout)
+
+
+def _iter_results(jobs: List[Dict[str, Any]], timeout: Optional[float]) -> Iterator[Dict[str, Any]]:
+    pool = _get_batch_pool()
+    futures = {pool.submit(_run_job, i, job): i for i, job in enumerate(jobs)}
+
+    def _failed(index, error_type, message):
+        job = jobs[index]
+        job_id = job.get("job_id", index) if isinstance(job, dict) else index
+        return {"index": index, "job_id": job_id, "ok": False, "error": message, "error_type": error_type}
+
+    pending = set(futures)
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            pending.discard(future)
+            try:
+                yield future.result()
+            except BrokenProcessPool as e:
+                yield _failed(futures[future], "BrokenProcessPool", str(e) or "worker process died")
+    except FuturesTimeoutError:
+        # queued jobs are cancelled, running ones go with their workers
+        for future in pending:
+            pool.kill(future)
+        for future in sorted(pending, key=futures.get):
+            yield _failed(futures[future], "TimeoutError", f"Job did not finish within {timeout} seconds")
+    finally:
+        # consumer stopped early (e.g. client went away): don't leave its jobs behind
+        for future in pending:
+            pool.kill(future)
+
+
+def pack_batch(jobs: List[Dict[str, Any]], timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Runs every job (see iter_batch) and returns them in request order:
+      {"results": [...], "succeeded": n, "failed": k}
+    """
+    results = sorted(iter_batch(jobs, timeout=timeout), key=lambda r: r["index"])
+    succeeded = sum(1 for r in results if r["ok"])
+    return {"results": results, "succeeded": succeeded, "failed": len(results) - succeeded}
@@ -0,0 +1,153 @@
+# ShelfSpaceOptimization/shelf_compaction.py
+
+from typing import Dict, Any, List
+
+from .shelf_problem_new import FixedShelfPacker3DIncremental
+
+
+def _shelf_volume(shelf: Dict[str, Any]) -> float:
+    return float(shelf["width"]) * float(shelf["height"]) * float(shelf["depth"])
+
+
+def _largest_free_box(shelves: List[Dict[str, Any]]) -> float:
+    return max(
+        (float(w) * float(h) * float(d) for s in shelves for (_, _, _, w, h, d) in s["free_spaces"]),
+        default=0.0,
+    )
+
+
+def _clone_shelf(shelf: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        **shelf,
+        "compatibility": set(shelf["compatibility"]),
+        "placed_items": list(shelf["placed_items"]),
+        "free_spaces": list(shelf["free_spaces"]),
+    }
+
+
+def _try_evacuate(packer, source, targets):
+    """
+    Dry-runs moving every item of `source` into the free spaces of `targets`
+    (largest items first, best fit). Works on clones; returns
+    (cloned_targets, [(item, placed_tuple, target_id), ...]) or None if any item
+    does not fit.
+    """
+    clones = [_clone_shelf(t) for t in targets]
+    planned = []
+    for item in sorted(source["placed_items"], key=lambda it: -(it[3] * it[4] * it[5])):
+        _, _, _, w, h, d, item_type, color = item
+        fit = packer.find_best_slot(item_type, w, h, d, shelves=clones)
+        if fit is None:
+            return None
+        shelf, placed = packer.occupy_slot(fit, item_type, color)
+        planned.append((item, placed, shelf["id"]))
+    return clones, planned
+
+
+def plan_compaction(
+    state: Dict[str, Any],
+    compatibility_rules: Dict[str, List[str]],
+    move_budget: int,
+    include_state: bool = False,
+) -> Dict[str, Any]:
+    """
+    Plans item relocations that turn scattered free space into whole empty shelves.
+
+    Scope: the unit of planning is a whole shelf, not a single item. Individual
+    moves that merely enlarge a free box inside a shelf are never planned, and
+    a budget smaller than the item count of every evacuable shelf yields an
+    empty plan. Rationale: only emptying a shelf completely recovers volume any
+    item type can use (a half-emptied shelf keeps its compatibility class and
+    its fragmented free spaces), and the moves toward an evacuation only pay
+    off once the last item has left.
+
+    The planner works shelf by shelf: every non-empty shelf is a candidate with
+    score = shelf volume / number of items on it (volume recovered per move).
+    Candidates are tried best score first; a candidate is taken if all of its
+    items fit into the free spaces of the other occupied, compatible shelves
+    (best fit, same guillotine split as the incremental packer) and the moves fit
+    the remaining budget. Repeats until no candidate can be emptied.
+
+    `state` is a persisted packing state (JSON dict or ColumnarState).
+    Nothing is mutated; the plan is:
+      {
+        "moves": [{"step", "item_type", "color",
+                   "from": {"shelf_id", "x", "y", "z", "width", "height", "depth"},
+                   "to":   {"shelf_id", "x", "y", "z", "width", "height", "depth"}}, ...],
+        "moves_used": int,
+        "emptied_shelves": [shelf_id, ...],
+        "recovered_volume": float,
+        "largest_free_box_before": float,
+        "largest_free_box_after": float,
+        "empty_shelves_before": int,
+        "empty_shelves_after": int,
+        "result": {...}   # state after the moves, only if include_state
+      }
+    """
+    if move_budget < 0:
+        raise ValueError("move_budget must be >= 0")
+
+    packer = FixedShelfPacker3DIncremental.from_state(compatibility_rules, state)
+    shelves = packer.shelves
+    largest_before = _largest_free_box(shelves)
+    empty_before = sum(1 for s in shelves if not s["placed_items"])
+
+    moves = []
+    emptied = []
+    budget = move_budget
+
+    while budget > 0:
+        occupied = [s for s in shelves if s["placed_items"]]
+        candidates = sorted(
+            (s for s in occupied if len(s["placed_items"]) <= budget),
+            key=lambda s: (-_shelf_volume(s) / len(s["placed_items"]), s["id"]),
+        )
+
+        chosen = None
+        for source in candidates:
+            targets = [s for s in occupied if s is not source]
+            trial = _try_evacuate(packer, source, targets)
+            if trial is not None:
+                # sorted by score, so the first feasible candidate is the best one
+                chosen = (source, targets, trial)
+                break
+
+        if chosen is None:
+            break
+
+        source, targets, (clones, planned) = chosen
+        for target, clone in zip(targets, clones):
+            target["placed_items"] = clone["placed_items"]
+            target["free_spaces"] = clone["free_spaces"]
+
+        for item, placed, target_id in planned:
+            x, y, z, w, h, d, item_type, color = item
+            tx, ty, tz, tw, th, td, _, _ = placed
+            moves.append({
+                "step": len(moves) + 1,
+                "item_type": item_type,
+                "color": color,
+                "from": {"shelf_id": source["id"], "x": x, "y": y, "z": z, "width": w, "height": h, "depth": d},
+                "to": {"shelf_id": target_id, "x": tx, "y": ty, "z": tz, "width": tw, "height": th, "depth": td},
+            })
+
+        source["placed_items"] = []
+        source["free_spaces"] = [(0, 0, 0, source["width"], source["height"], source["depth"])]
+        source["compatibility"] = set()
+        emptied.append(source["id"])
+        budget -= len(planned)
+
+    emptied_ids = set(emptied)
+    plan = {
+        "moves": moves,
+        "moves_used": len(moves),
+        "emptied_shelves": emptied,
+        "recovered_volume": sum(_shelf_volume(s) for s in shelves if s["id"] in emptied_ids),
+        "largest_free_box_before": largest_before,
+        "largest_free_box_after": _largest_free_box(shelves),
+        "empty_shelves_before": empty_before,
+        "empty_shelves_after": sum(1 for s in shelves if not s["placed_items"]),
+    }
+    if include_state:
+        plan["result"] = packer.get_packing_result_json()
+    return plan
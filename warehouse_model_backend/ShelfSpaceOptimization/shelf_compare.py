@@ -2,10 +2,10 @@
 
 import os
 import uuid
-from typing import Dict, Any, List, Tuple
+from concurrent.futures import wait
+from typing import Dict, Any, List, Tuple, Optional
 
-import matplotlib
-matplotlib.use("Agg")
+from ServerRuntime.pools import WorkerPool, check_timeout
 
 from .shelf_problem import FixedShelfPacker3D
 from .shelf_problem_new import FixedShelfPacker3DIncremental
@@ -33,109 +33,168 @@ def _items_from_existing_state(existing_state: Dict[str, Any]) -> List[Tuple[flo
     return items
 
 
-def _volume_sum_free_spaces(shelves_json: List[Dict[str, Any]]) -> float:
-    vol = 0.0
-    for s in shelves_json:
-        for fs in s.get("free_spaces", []):
-            vol += float(fs["width"]) * float(fs["height"]) * float(fs["depth"])
-    return vol
-
-
 def _total_capacity(shelf_width: float, shelf_height: float, shelf_depth: float, shelf_count: int) -> float:
     # Capacity is per-shelf volume times count
     return float(shelf_width) * float(shelf_height) * float(shelf_depth) * int(shelf_count)
 
 
+def pack_full(payload: Dict[str, Any], gif_path: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Full repack: FixedShelfPacker3D with (existing placed + new items) all at once.
+    Renders the per-item GIF only when gif_path is given. Returns (result, metrics).
+    """
+    # Combine existing placed items (if any) + new items, then repack everything from scratch
+    full_items = []
+    if payload.get("existing_state"):
+        full_items.extend(_items_from_existing_state(payload["existing_state"]))
+    full_items.extend([tuple(i) for i in payload.get("items", []) or []])
+
+    packer_full = FixedShelfPacker3D(
+        shelf_width=payload["shelf_width"],
+        shelf_height=payload["shelf_height"],
+        shelf_depth=payload["shelf_depth"],
+        shelf_count=payload["shelf_count"],
+        compatibility_rules=payload["compatibility_rules"],
+        selected_shelf_id=payload.get("selected_shelf_id")
+    )
+    for w, h, d, t, c in full_items:
+        packer_full.add_item(w, h, d, t, c)
+
+    if gif_path:
+        packer_full.animate(save_path=gif_path)
+    else:
+        packer_full.place_all_items()
+    return packer_full.get_packing_result_json(), packer_full.get_metrics()
+
+
+def pack_incremental(payload: Dict[str, Any], gif_path: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Incremental: FixedShelfPacker3DIncremental honoring existing placements, adding NEW items only.
+    Renders the snapshot GIF only when gif_path is given. Returns (result, metrics).
+    """
+    packer_inc = FixedShelfPacker3DIncremental(
+        shelf_width=payload["shelf_width"],
+        shelf_height=payload["shelf_height"],
+        shelf_depth=payload["shelf_depth"],
+        shelf_count=payload["shelf_count"],
+        compatibility_rules=payload["compatibility_rules"],
+        selected_shelf_id=payload.get("selected_shelf_id"),
+        existing_state=payload.get("existing_state")
+    )
+    for w, h, d, t, c in payload.get("items", []) or []:
+        packer_inc.add_item(w, h, d, t, c)
+    packer_inc.place_all_new_items()
+
+    if gif_path:
+        packer_inc.animate(save_path=gif_path)
+    return packer_inc.get_packing_result_json(), packer_inc.get_metrics()
+
+
+_RENDER_STATUS = {False: "none", True: "done", "deferred": "pending"}
+
+# Worker pools are created on first use and reused across requests
+_compare_pool = None
+_render_pool = None
+
+
+def _get_compare_pool() -> WorkerPool:
+    global _compare_pool
+    if _compare_pool is None:
+        _compare_pool = WorkerPool(2, name="compare")
+    return _compare_pool
+
+
+def _get_render_pool() -> WorkerPool:
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = WorkerPool(1, name="compare-render")
+    return _render_pool
+
+
 def compare_packers(payload: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Runs BOTH:
+    Runs BOTH, in parallel worker processes:
       1) Full repack: FixedShelfPacker3D with (existing placed + new items) all at once
       2) Incremental: FixedShelfPacker3DIncremental honoring existing placements, adding NEW items only
 
-    Saves two GIFs and returns metrics for free space, utilization, unplaced counts,
-    and which method leaves the MOST free space.
+    Returns metrics for free space, utilization, unplaced counts, and which method
+    leaves the MOST free space. Metrics never depend on the GIFs, so rendering is
+    off unless asked for.
 
     Expected keys in `payload`:
       - shelf_width, shelf_height, shelf_depth, shelf_count
       - compatibility_rules
       - items  (list of [w,h,d,type,color])   -> "NEW items"
       - existing_state (optional)             -> prior state for incremental
+      - render (optional)                     -> false (default): no GIFs, video_url is null
+                                                 true: render both GIFs before returning
+                                                 "deferred": return now, GIFs are written
+                                                 in the background to the returned URLs
+      - timeout_seconds (optional)            -> latency budget for the packing itself;
+                                                 TimeoutError when exceeded (this call's
+                                                 packers are killed, other requests' are
+                                                 not touched); ValueError unless a
+                                                 positive number
 
     Returns:
       {
-        "full": {"video_url": "...", "result": {...}, "free_volume": ..., "utilization": ..., "unplaced_count": ...},
+        "full": {"video_url": "..." | null, "result": {...}, "free_volume": ..., "utilization": ..., "unplaced_count": ...,
+                 "metrics": {...}},                  # packer.get_metrics()
         "incremental": {...},
-        "better_method": "full" | "incremental" | "tie"
+        "better_method": "full" | "incremental" | "tie",
+        "render_status": "none" | "done" | "pending"
       }
     """
-    _ensure_static_dir()
+    render = payload.get("render") or False
+    if render not in _RENDER_STATUS:
+        raise ValueError(f"render must be one of {list(_RENDER_STATUS)}")
+    timeout = check_timeout(payload.get("timeout_seconds"))
 
     # Common inputs
     sw = payload["shelf_width"]
     sh = payload["shelf_height"]
     sd = payload["shelf_depth"]
     sc = payload["shelf_count"]
-    rules = payload["compatibility_rules"]
-    selected_shelf_id = payload.get("selected_shelf_id")
-    new_items = payload.get("items", []) or []
-    existing_state = payload.get("existing_state")
 
-    # ---------- 1) FULL REPACK ----------
-    # Combine existing placed items (if any) + new items, then repack everything from scratch
-    full_items = []
-    if existing_state:
-        full_items.extend(_items_from_existing_state(existing_state))
-    full_items.extend([tuple(i) for i in new_items])
-
-    packer_full = FixedShelfPacker3D(
-        shelf_width=sw,
-        shelf_height=sh,
-        shelf_depth=sd,
-        shelf_count=sc,
-        compatibility_rules=rules,
-        selected_shelf_id=selected_shelf_id
-    )
-    for w, h, d, t, c in full_items:
-        packer_full.add_item(w, h, d, t, c)
-
-    full_gif = f"static/shelf_full_{uuid.uuid4().hex}.gif"
-    packer_full.animate(save_path=full_gif)
-    full_res = packer_full.get_packing_result_json()
-
-    # ---------- 2) INCREMENTAL ----------
-    # Respect existing placements; place ONLY new items
-    packer_inc = FixedShelfPacker3DIncremental(
-        shelf_width=sw,
-        shelf_height=sh,
-        shelf_depth=sd,
-        shelf_count=sc,
-        compatibility_rules=rules,
-        selected_shelf_id=selected_shelf_id,
-        existing_state=existing_state
-    )
-    for w, h, d, t, c in new_items:
-        packer_inc.add_item(w, h, d, t, c)
-    packer_inc.place_all_new_items()
-
-    inc_gif = f"static/shelf_inc_{uuid.uuid4().hex}.gif"
-    packer_inc.animate(save_path=inc_gif)
-    inc_res = packer_inc.get_packing_result_json()
+    full_gif = inc_gif = None
+    if render:
+        _ensure_static_dir()
+        full_gif = f"static/shelf_full_{uuid.uuid4().hex}.gif"
+        inc_gif = f"static/shelf_inc_{uuid.uuid4().hex}.gif"
+
+    # ---------- 1) FULL REPACK + 2) INCREMENTAL, concurrently ----------
+    inline_gifs = render is True
+    pool = _get_compare_pool()
+    full_future = pool.submit(pack_full, payload, full_gif if inline_gifs else None)
+    inc_future = pool.submit(pack_incremental, payload, inc_gif if inline_gifs else None)
+    done, not_done = wait([full_future, inc_future], timeout=timeout)
+    if not_done:
+        # stop only this comparison's packers, so they don't keep workers busy
+        # for the requests behind it
+        for future in not_done:
+            pool.kill(future)
+        raise TimeoutError(f"Packer comparison exceeded {timeout}s")
+    full_res, full_metrics = full_future.result()
+    inc_res, inc_metrics = inc_future.result()
+
+    if render == "deferred":
+        render_pool = _get_render_pool()
+        render_pool.submit(pack_full, payload, full_gif)
+        render_pool.submit(pack_incremental, payload, inc_gif)
 
     # ---------- Metrics ----------
+    # Occupied volume from the placed items (packing_metrics), not the sum of free
+    # spaces: guillotine free spaces overlap, so summing them overcounts free volume.
     capacity = _total_capacity(sw, sh, sd, sc)
 
-    full_free = _volume_sum_free_spaces(full_res["shelves"])
-    inc_free = _volume_sum_free_spaces(inc_res["shelves"])
-
-    full_used = capacity - full_free
-    inc_used = capacity - inc_free
+    full_free = full_metrics["free_volume"]
+    inc_free = inc_metrics["free_volume"]
 
-    # Avoid division by zero (degenerate shelves)
-    full_util = (full_used / capacity) * 100.0 if capacity > 0 else 0.0
-    inc_util = (inc_used / capacity) * 100.0 if capacity > 0 else 0.0
+    full_util = full_metrics["utilization_pct"]
+    inc_util = inc_metrics["utilization_pct"]
 
-    full_unplaced = len(full_res.get("unplaced_items", []))
-    inc_unplaced = len(inc_res.get("unplaced_items", []))
+    full_unplaced = full_metrics["unplaced_count"]
+    inc_unplaced = inc_metrics["unplaced_count"]
 
     if abs(full_free - inc_free) < 1e-9:
         better = "tie"
@@ -144,19 +203,22 @@ def compare_packers(payload: Dict[str, Any]) -> Dict[str, Any]:
 
     return {
         "full": {
-            "video_url": f"/{full_gif}",
+            "video_url": f"/{full_gif}" if full_gif else None,
             "result": full_res,
             "free_volume": full_free,
             "utilization_pct": full_util,
             "unplaced_count": full_unplaced,
+            "metrics": full_metrics,
         },
         "incremental": {
-            "video_url": f"/{inc_gif}",
+            "video_url": f"/{inc_gif}" if inc_gif else None,
             "result": inc_res,
             "free_volume": inc_free,
             "utilization_pct": inc_util,
             "unplaced_count": inc_unplaced,
+            "metrics": inc_metrics,
         },
         "capacity_volume": capacity,
-        "better_method": better
+        "better_method": better,
+        "render_status": _RENDER_STATUS[render],
     }
@@ -0,0 +1,171 @@
+# ShelfSpaceOptimization/shelf_feasibility.py
+
+import time
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+# Same three axis-aligned orientations the packers try
+ROTATIONS = ((0, 1, 2), (1, 0, 2), (2, 0, 1))
+
+OPEN_CLASS = "open"
+
+
+def _class_label(compatibility) -> str:
+    return ",".join(sorted(str(t) for t in compatibility)) if compatibility else OPEN_CLASS
+
+
+def shelf_summaries(shelves: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Per-shelf capacity summary as flat numpy arrays (read-only view of the shelves):
+      free_dims  (m, 3)  w/h/d of every free space, free_owner (m,) its shelf index
+      max_free   (S, 3)  per-shelf maximum free width/height/depth
+      free_volume (S,)   shelf volume minus the summed volume of its placed items
+      compatibility      per-shelf frozenset, or None for a shelf that is still open
+    """
+    dims, owner = [], []
+    max_free = np.zeros((len(shelves), 3), dtype=float)
+    free_volume = np.zeros(len(shelves), dtype=float)
+    for s, shelf in enumerate(shelves):
+        boxes = np.asarray([fs[3:6] for fs in shelf["free_spaces"]], dtype=float).reshape(-1, 3)
+        dims.append(boxes)
+        owner.append(np.full(len(boxes), s, dtype=np.int64))
+        if len(boxes):
+            max_free[s] = boxes.max(axis=0)
+        capacity = float(shelf["width"]) * float(shelf["height"]) * float(shelf["depth"])
+        used = sum(float(p[3]) * float(p[4]) * float(p[5]) for p in shelf["placed_items"])
+        free_volume[s] = max(0.0, capacity - used)
+
+    return {
+        "ids": [shelf["id"] for shelf in shelves],
+        "free_dims": np.concatenate(dims) if dims else np.zeros((0, 3)),
+        "free_owner": np.concatenate(owner) if owner else np.zeros(0, dtype=np.int64),
+        "max_free": max_free,
+        "free_volume": free_volume,
+        "compatibility": [frozenset(shelf["compatibility"]) if shelf["compatibility"] else None for shelf in shelves],
+    }
+
+
+def _class_report(summary: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Free capacity grouped by compatibility class (what the dock UI shows next to the answer)."""
+    report: Dict[str, Dict[str, Any]] = {}
+    for s, compat in enumerate(summary["compatibility"]):
+        entry = report.setdefault(_class_label(compat), {"shelves": 0, "free_volume": 0.0, "max_free_dims": [0.0, 0.0, 0.0]})
+        entry["shelves"] += 1
+        entry["free_volume"] += float(summary["free_volume"][s])
+        entry["max_free_dims"] = [max(a, float(b)) for a, b in zip(entry["max_free_dims"], summary["max_free"][s])]
+    return report
+
+
+def _fits_matrix(dims: np.ndarray, summary: Dict[str, Any], chunk: int = 256) -> np.ndarray:
+    """
+    (N, S) bool: carton n fits into at least one free space of shelf s in one of
+    the ROTATIONS. Broadcast over cartons in chunks, then OR-reduced per shelf
+    (free spaces are stored grouped by shelf, so reduceat does it in one call).
+    """
+    free_dims, free_owner = summary["free_dims"], summary["free_owner"]
+    shelf_count = len(summary["ids"])
+    result = np.zeros((len(dims), shelf_count), dtype=bool)
+    if not len(dims) or not len(free_dims):
+        return result
+
+    owners, starts = np.unique(free_owner, return_index=True)
+    for lo in range(0, len(dims), chunk):
+        block = dims[lo:lo + chunk]
+        hit = np.zeros((len(block), len(free_dims)), dtype=bool)
+        for rot in ROTATIONS:
+            hit |= (free_dims[None, :, :] >= block[:, None, list(rot)]).all(axis=2)
+        result[lo:lo + chunk, owners] = np.logical_or.reduceat(hit, starts, axis=1)
+    return result
+
+
+def check_feasibility(
+    shelves: List[Dict[str, Any]],
+    compatibility_rules: Dict[str, Any],
+    items: List[List[Any]],
+    summary: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Answers "can these cartons be placed, and roughly where" without packing.
+
+    Works only on the summary arrays (the shelves are never touched):
+      1. per carton, the shelves whose class accepts its type (open shelves
+         accept anything) and that have one free space the carton fits in, in
+         any of the packers' three orientations;
+      2. largest cartons first, each is assigned to the eligible shelf with the
+         least free volume that still holds it (best fit); the shelf's free
+         volume goes down, and an open shelf takes the carton's class.
+
+    Step 1 is exact for each carton on its own against the current layout.
+    Step 2 only tracks volume, not geometry, so "feasible" is a fast estimate; a
+    real packing run can still leave a carton out because of fragmentation.
+
+    Returns:
+      {
+        "feasible": bool,
+        "placeable_count": int,
+        "unplaceable_count": int,
+        "items": [{"index", "placeable", "shelf_id", "reason"}, ...],   # request order
+                 # reason: null | "no_compatible_shelf" | "too_large" | "insufficient_volume"
+        "by_class": {"<type,type>" | "open": {"shelves", "free_volume", "max_free_dims"}},
+        "elapsed_ms": float
+      }
+    """
+    started = time.perf_counter()
+    summary = summary or shelf_summaries(shelves)
+    ids = summary["ids"]
+    shelf_count = len(ids)
+
+    # scratch copies: the assignment pass updates these, never the shelves
+    remaining = summary["free_volume"].copy()
+    compat = list(summary["compatibility"])
+    eligible_cache: Dict[Any, np.ndarray] = {}
+
+    def _eligible(item_type) -> np.ndarray:
+        mask = eligible_cache.get(item_type)
+        if mask is None:
+            mask = np.fromiter((c is None or item_type in c for c in compat), dtype=bool, count=shelf_count)
+            eligible_cache[item_type] = mask
+        return mask
+
+    parsed = []
+    for item in items:
+        w, h, d, item_type = float(item[0]), float(item[1]), float(item[2]), item[3]
+        parsed.append(((w, h, d), item_type, w * h * d))
+
+    fits = _fits_matrix(np.asarray([p[0] for p in parsed], dtype=float).reshape(-1, 3), summary)
+
+    answers: List[Dict[str, Any]] = [None] * len(parsed)
+    for index in sorted(range(len(parsed)), key=lambda i: -parsed[i][2]):
+        dims, item_type, volume = parsed[index]
+        eligible = _eligible(item_type)
+        answer = {"index": index, "placeable": False, "shelf_id": None, "reason": None}
+
+        if not eligible.any():
+            answer["reason"] = "no_compatible_shelf"
+        else:
+            candidates = eligible & fits[index]
+            if not candidates.any():
+                answer["reason"] = "too_large"
+            else:
+                candidates &= remaining >= volume
+                if not candidates.any():
+                    answer["reason"] = "insufficient_volume"
+                else:
+                    s = int(np.flatnonzero(candidates)[np.argmin(remaining[candidates])])
+                    remaining[s] -= volume
+                    if compat[s] is None:
+                        compat[s] = frozenset(compatibility_rules.get(item_type, {item_type}))
+                        eligible_cache.clear()
+                    answer.update({"placeable": True, "shelf_id": ids[s]})
+        answers[index] = answer
+
+    placeable = sum(1 for a in answers if a["placeable"])
+    return {
+        "feasible": placeable == len(answers),
+        "placeable_count": placeable,
+        "unplaceable_count": len(answers) - placeable,
+        "items": answers,
+        "by_class": _class_report(summary),
+        "elapsed_ms": (time.perf_counter() - started) * 1000.0,
+    }
@@ -0,0 +1,248 @@
+# ShelfSpaceOptimization/shelf_geometry.py
+
+from typing import List, Tuple
+
+import numpy as np
+
+# reconstruct_free_spaces() gives up beyond this many free boxes, which bounds its
+# cost (isolated items need about six boxes each; guillotine layouts far fewer)
+MAX_FREE_SPACES = 50000
+
+# occupied_volume() sweeps a grid of at most this many cells (distinct x faces x
+# distinct y faces x distinct z faces), building it this many cells at a time
+UNION_MAX_CELLS = 50_000_000
+_UNION_CHUNK_CELLS = 2_000_000
+
+
+def _boxes_array(placed_items, width, height, depth) -> np.ndarray:
+    """
+    (x, y, z, w, h, d, ...) tuples -> float array of shape (n, 6), clipped to the
+    shelf bounds; boxes left with no volume inside the shelf are dropped.
+    """
+    if len(placed_items) == 0:
+        return np.zeros((0, 6), dtype=float)
+    boxes = np.asarray([tuple(p[:6]) for p in placed_items], dtype=float).reshape(-1, 6)
+    upper = np.array([width, height, depth], dtype=float)
+    lo = np.clip(boxes[:, :3], 0, upper)
+    hi = np.clip(boxes[:, :3] + boxes[:, 3:], 0, upper)
+    keep = np.all(hi > lo, axis=1)
+    return np.hstack([lo, hi - lo])[keep]
+
+
+def _subtract_box(free_lo: np.ndarray, free_hi: np.ndarray, lo: np.ndarray, hi: np.ndarray):
+    """
+    Removes the box [lo, hi) from every free box [free_lo, free_hi) that it
+    intersects (all rows are assumed to intersect it). Each row is cut into up
+    to six disjoint pieces: in front of / behind the box along z (full x/y of
+    the free box), then below / above along y, then left / right along x.
+    """
+    cut_lo = np.maximum(free_lo, lo)
+    cut_hi = np.minimum(free_hi, hi)
+    rest_lo, rest_hi = free_lo.copy(), free_hi.copy()
+    pieces_lo, pieces_hi = [], []
+    for axis in (2, 1, 0):
+        before_hi = rest_hi.copy()
+        before_hi[:, axis] = cut_lo[:, axis]
+        after_lo = rest_lo.copy()
+        after_lo[:, axis] = cut_hi[:, axis]
+        pieces_lo += [rest_lo.copy(), after_lo]
+        pieces_hi += [before_hi, rest_hi.copy()]
+        rest_lo[:, axis] = cut_lo[:, axis]
+        rest_hi[:, axis] = cut_hi[:, axis]
+    pieces_lo, pieces_hi = np.vstack(pieces_lo), np.vstack(pieces_hi)
+    keep = np.all(pieces_hi - pieces_lo > 1e-9, axis=1)
+    return pieces_lo[keep], pieces_hi[keep]
+
+
+def _split_plane(region_lo: np.ndarray, region_hi: np.ndarray, lo: np.ndarray, hi: np.ndarray):
+    """
+    (axis, coordinate) to split a region holding the (clipped) boxes lo/hi.
+    Prefers a plane that crosses no box (always there between the rows of a
+    guillotine layout), the one closest to the middle of the region; otherwise
+    the median box face along the longest axis. None when every box covers the
+    whole region.
+    """
+    best = None
+    for axis in range(3):
+        order = np.argsort(lo[:, axis], kind="stable")
+        starts, ends = lo[order, axis], hi[order, axis]
+        reach = np.maximum.accumulate(ends)
+        # a plane at a box start that no earlier box reaches past crosses nothing
+        cuts = starts[1:][reach[:-1] <= starts[1:]]
+        cuts = np.concatenate((cuts, [starts[0], reach[-1]]))
+        cuts = cuts[(cuts > region_lo[axis]) & (cuts < region_hi[axis])]
+        if len(cuts):
+            middle = (region_lo[axis] + region_hi[axis]) / 2.0
+            c = cuts[np.argmin(np.abs(cuts - middle))]
+            score = abs(c - middle) / (region_hi[axis] - region_lo[axis])
+            if best is None or score < best[0]:
+                best = (score, axis, c)
+    if best is not None:
+        return best[1], best[2]
+
+    for axis in np.argsort(region_lo - region_hi):
+        faces = np.concatenate((lo[:, axis], hi[:, axis]))
+        faces = faces[(faces > region_lo[axis]) & (faces < region_hi[axis])]
+        if len(faces):
+            return axis, np.sort(faces)[len(faces) // 2]
+    return None
+
+
+def reconstruct_free_spaces(width, height, depth, placed_items,
+                            max_spaces: int = MAX_FREE_SPACES) -> List[Tuple[float, float, float, float, float, float]]:
+    """
+    Rebuilds free spaces (x, y, z, w, h, d) of a shelf from its placed items.
+
+    Binary space partition: a region is split by a plane (between items where
+    possible, see _split_plane) until it holds no item (one free box) or a
+    single item (the region minus the item, at most six boxes). The result is
+    a set of disjoint boxes covering exactly the empty volume; on the
+    guillotine layouts the packers produce no item is ever cut, so the output
+    and the work are O(items), and O(items log items) numpy work in general.
+    Raises ValueError when the layout needs more than `max_spaces` boxes plus
+    splits (overlapping placements need extra splits) instead of running on.
+    """
+    boxes = _boxes_array(placed_items, width, height, depth)
+    if not len(boxes):
+        return [(0, 0, 0, width, height, depth)]
+
+    lo = boxes[:, :3]
+    hi = boxes[:, :3] + boxes[:, 3:]
+    out_lo, out_hi = [], []
+    work = 0  # boxes emitted + regions split
+    stack = [(np.zeros(3), np.array([width, height, depth], dtype=float), np.arange(len(boxes)))]
+    while stack:
+        region_lo, region_hi, idx = stack.pop()
+        if not len(idx):
+            out_lo.append(region_lo[None])
+            out_hi.append(region_hi[None])
+            work += 1
+        else:
+            item_lo = np.maximum(lo[idx], region_lo)
+            item_hi = np.minimum(hi[idx], region_hi)
+            if np.any(np.all(item_lo <= region_lo, axis=1) & np.all(item_hi >= region_hi, axis=1)):
+                continue  # one item fills the region (overlapping placements)
+            if len(idx) == 1:
+                pieces_lo, pieces_hi = _subtract_box(region_lo[None], region_hi[None], item_lo[0], item_hi[0])
+                out_lo.append(pieces_lo)
+                out_hi.append(pieces_hi)
+                work += len(pieces_lo)
+            else:
+                plane = _split_plane(region_lo, region_hi, item_lo, item_hi)
+                work += 1
+                if plane is not None:
+                    axis, c = plane
+                    left_hi = region_hi.copy()
+                    left_hi[axis] = c
+                    right_lo = region_lo.copy()
+                    right_lo[axis] = c
+                    stack.append((region_lo, left_hi, idx[item_lo[:, axis] < c]))
+                    stack.append((right_lo, region_hi, idx[item_hi[:, axis] > c]))
+        if work > max_spaces:
+            raise ValueError(
+                f"Cannot rebuild free spaces: {len(placed_items)} placed items fragment the shelf into "
+                f"more than {max_spaces} pieces; send the shelf's free_spaces with the state"
+            )
+
+    if not out_lo:
+        return []
+    free_lo, free_hi = np.vstack(out_lo), np.vstack(out_hi)
+    sizes = free_hi - free_lo
+    spaces = [
+        (x0, y0, z0, w, h, d)
+        for (x0, y0, z0), (w, h, d) in zip(free_lo.tolist(), sizes.tolist())
+    ]
+
+    # biggest first: best-fit scans are cheaper to reason about and the order is stable
+    spaces.sort(key=lambda s: (-(s[3] * s[4] * s[5]), s[2], s[1], s[0]))
+    return spaces
+
+
+def placed_volume(width, height, depth, placed_items) -> float:
+    """
+    Sum of the placed boxes' volumes inside the shelf, O(n). Equal to
+    occupied_volume() when placements don't overlap, larger when they do.
+    """
+    boxes = _boxes_array(placed_items, width, height, depth)
+    return float(np.prod(boxes[:, 3:], axis=1).sum())
+
+
+def occupied_volume(width, height, depth, placed_items) -> float:
+    """
+    Exact volume of the union of the placed boxes inside the shelf (overlaps
+    counted once).
+
+    Sweep over compressed coordinates: the distinct box faces along each axis
+    cut the shelf into a grid of cells; every box adds +-1 at the eight corners
+    of its cell range in a difference array, prefix sums along the three axes
+    give how many boxes cover each cell, and the covered cells' volumes are
+    summed. The grid is built a chunk of x slabs at a time, so memory stays
+    bounded; packer layouts have few distinct sizes, hence small grids. Beyond
+    UNION_MAX_CELLS cells the shelf minus reconstruct_free_spaces() is used.
+    """
+    boxes = _boxes_array(placed_items, width, height, depth)
+    if not len(boxes):
+        return 0.0
+    lo = boxes[:, :3]
+    hi = boxes[:, :3] + boxes[:, 3:]
+    faces = [np.unique(np.concatenate((lo[:, a], hi[:, a]))) for a in range(3)]
+    cell = [np.diff(f) for f in faces]
+    nx, ny, nz = (len(c) for c in cell)
+    if nx * ny * nz > UNION_MAX_CELLS:
+        free = reconstruct_free_spaces(width, height, depth, placed_items)
+        return float(width) * float(height) * float(depth) - sum(w * h * d for _, _, _, w, h, d in free)
+
+    first = [np.searchsorted(faces[a], lo[:, a]) for a in range(3)]
+    stop = [np.searchsorted(faces[a], hi[:, a]) for a in range(3)]
+    area = np.outer(cell[1], cell[2])
+    step = max(1, _UNION_CHUNK_CELLS // (ny * nz))
+    total = 0.0
+    for x0 in range(0, nx, step):
+        x1 = min(nx, x0 + step)
+        rows = (first[0] < x1) & (stop[0] > x0)
+        if not rows.any():
+            continue
+        corners = (
+            ((np.maximum(first[0][rows], x0) - x0, 1), (np.minimum(stop[0][rows], x1) - x0, -1)),
+            ((first[1][rows], 1), (stop[1][rows], -1)),
+            ((first[2][rows], 1), (stop[2][rows], -1)),
+        )
+        diff = np.zeros((x1 - x0 + 1, ny + 1, nz + 1), dtype=np.int32)
+        for xs, sx in corners[0]:
+            for ys, sy in corners[1]:
+                for zs, sz in corners[2]:
+                    np.add.at(diff, (xs, ys, zs), sx * sy * sz)
+        covered = diff.cumsum(0).cumsum(1).cumsum(2)[:-1, :-1, :-1] > 0
+        total += float(cell[0][x0:x1] @ (covered * area).sum(axis=(1, 2)))
+    return total
+
+
+def packing_metrics(shelves, unplaced_count, exact=True) -> dict:
+    """
+    Volume metrics from packer shelves (tuple placed_items):
+      capacity_volume, used_volume, free_volume, utilization_pct,
+      placed_volume_sum (plain sum of item volumes), placed_count, unplaced_count.
+    used_volume is the union of the placed boxes (occupied_volume), so
+    overlapping placements are counted once and utilization never exceeds
+    100%. exact=False sums the item volumes instead (O(n), only equal when
+    nothing overlaps).
+    """
+    capacity = used = placed_sum = 0.0
+    placed_count = 0
+    volume = occupied_volume if exact else placed_volume
+    for shelf in shelves:
+        w, h, d = float(shelf["width"]), float(shelf["height"]), float(shelf["depth"])
+        capacity += w * h * d
+        used += volume(w, h, d, shelf["placed_items"])
+        placed_sum += sum(float(p[3]) * float(p[4]) * float(p[5]) for p in shelf["placed_items"])
+        placed_count += len(shelf["placed_items"])
+
+    return {
+        "capacity_volume": capacity,
+        "used_volume": used,
+        "free_volume": capacity - used,
+        "utilization_pct": (used / capacity) * 100.0 if capacity > 0 else 0.0,
+        "placed_volume_sum": placed_sum,
+        "placed_count": placed_count,
+        "unplaced_count": unplaced_count,
+    }
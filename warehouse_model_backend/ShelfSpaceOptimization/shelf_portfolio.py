@@ -0,0 +1,198 @@
+# ShelfSpaceOptimization/shelf_portfolio.py
+
+import os
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Tuple, Optional
+
+from ServerRuntime.pools import WorkerPool, check_timeout
+
+from .shelf_problem import FixedShelfPacker3D, FIT_RULES
+
+
+def _volume(item: Tuple) -> float:
+    w, h, d = item[0], item[1], item[2]
+    return float(w) * float(h) * float(d)
+
+
+def _order_grouped_by_type(items: List[Tuple]) -> List[Tuple]:
+    """
+    Keep items of the same type together (bulkiest type first, bulkiest item
+    first inside a type) so a shelf's compatibility class fills up before the
+    next class opens a new shelf.
+    """
+    type_volume: Dict[Any, float] = {}
+    for it in items:
+        type_volume[it[3]] = type_volume.get(it[3], 0.0) + _volume(it)
+    return sorted(items, key=lambda it: (-type_volume[it[3]], str(it[3]), -_volume(it)))
+
+
+ORDERINGS = {
+    "arrival": lambda items: list(items),
+    "volume_desc": lambda items: sorted(items, key=lambda it: -_volume(it)),
+    "longest_side_desc": lambda items: sorted(items, key=lambda it: -max(it[0], it[1], it[2])),
+    "grouped_by_type": _order_grouped_by_type,
+}
+
+OBJECTIVES = ("utilization", "unplaced")
+
+# Created on first use and reused across requests, so a portfolio pays no process start-up
+_portfolio_pool = None
+
+
+def _get_portfolio_pool() -> WorkerPool:
+    global _portfolio_pool
+    if _portfolio_pool is None:
+        _portfolio_pool = WorkerPool(os.cpu_count() or 1, name="portfolio")
+    return _portfolio_pool
+
+
+def _run_variant(payload: Dict[str, Any], ordering: str, fit_rule: str) -> Dict[str, Any]:
+    """
+    Pack one (ordering, fit_rule) variant headless. Runs inside a worker process,
+    so it only takes/returns plain picklable data.
+    """
+    started = time.perf_counter()
+
+    items = [tuple(i) for i in payload.get("items", []) or []]
+    packer = FixedShelfPacker3D(
+        shelf_width=payload["shelf_width"],
+        shelf_height=payload["shelf_height"],
+        shelf_depth=payload["shelf_depth"],
+        shelf_count=payload["shelf_count"],
+        compatibility_rules=payload["compatibility_rules"],
+        selected_shelf_id=payload.get("selected_shelf_id"),
+        fit_rule=fit_rule,
+    )
+    for item in ORDERINGS[ordering](items):
+        packer.add_item(*item)
+    packer.place_all_items()
+
+    metrics = packer.get_metrics()
+    metrics["elapsed_ms"] = (time.perf_counter() - started) * 1000.0
+
+    return {
+        "ordering": ordering,
+        "fit_rule": fit_rule,
+        "result": packer.get_packing_result_json(),
+        "metrics": metrics,
+    }
+
+
+def _rank_key(variant: Dict[str, Any], objective: str):
+    m = variant["metrics"]
+    if objective == "unplaced":
+        return (m["unplaced_count"], -m["utilization_pct"])
+    return (-m["utilization_pct"], m["unplaced_count"])
+
+
+def pack_portfolio(
+    payload: Dict[str, Any],
+    orderings: Optional[List[str]] = None,
+    fit_rules: Optional[List[str]] = None,
+    objective: str = "utilization",
+    max_workers: Optional[int] = None,
+    deadline: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Runs several item orderings x fit rules of FixedShelfPacker3D in a process pool
+    and keeps the best layout.
+
+    Expected keys in `payload` are the same as /generate:
+      - shelf_width, shelf_height, shelf_depth, shelf_count
+      - compatibility_rules
+      - items  (list of [w,h,d,type,color])
+      - selected_shelf_id (optional)
+
+    `objective` picks the winner: "utilization" (highest utilization, then fewest
+    unplaced) or "unplaced" (fewest unplaced, then highest utilization).
+    `deadline` is a wall-clock budget in seconds (ValueError unless a positive
+    number); variants not finished when it expires are stopped (a running
+    variant's worker process is killed, so the CPU is freed) and listed in
+    "timed_out". Only this call's variants are stopped: the pool is shared,
+    other requests' variants keep running. A variant whose worker died is
+    listed in "failed".
+    Variants run on the shared pool (one worker per CPU); `max_workers` caps
+    how many of this call's variants run at once (default: the pool size).
+
+    Returns:
+      {
+        "best": {"ordering": ..., "fit_rule": ..., "result": {...}, "metrics": {...}},
+        "variants": [{"ordering": ..., "fit_rule": ..., "metrics": {...}}, ...],
+        "timed_out": [{"ordering": ..., "fit_rule": ...}, ...],
+        "failed": [{"ordering": ..., "fit_rule": ..., "error": ...}, ...]
+      }
+    """
+    orderings = list(orderings or ORDERINGS.keys())
+    fit_rules = list(fit_rules or FIT_RULES)
+
+    unknown = [o for o in orderings if o not in ORDERINGS]
+    if unknown:
+        raise ValueError(f"Unknown orderings {unknown}; expected any of {list(ORDERINGS)}")
+    unknown = [r for r in fit_rules if r not in FIT_RULES]
+    if unknown:
+        raise ValueError(f"Unknown fit_rules {unknown}; expected any of {list(FIT_RULES)}")
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective!r}; expected one of {OBJECTIVES}")
+
+    deadline = check_timeout(deadline, "deadline_seconds")
+    if max_workers is not None and (isinstance(max_workers, bool) or not isinstance(max_workers, int) or max_workers < 1):
+        raise ValueError(f"max_workers must be a positive integer, got {max_workers!r}")
+
+    variants = [(o, r) for o in orderings for r in fit_rules]
+    pool = _get_portfolio_pool()
+    window = max_workers or pool.max_workers
+    ends_at = None if deadline is None else time.monotonic() + deadline
+
+    # at most `window` variants of this call on the pool at a time
+    futures: Dict[Any, Tuple[str, str]] = {}
+    waiting = list(variants)
+    running, done = set(), set()
+    while waiting or running:
+        while waiting and len(running) < window:
+            o, r = waiting.pop(0)
+            future = pool.submit(_run_variant, payload, o, r)
+            futures[future] = (o, r)
+            running.add(future)
+        left = None if ends_at is None else ends_at - time.monotonic()
+        if left is not None and left <= 0:
+            break
+        finished_now, running = wait(running, timeout=left, return_when=FIRST_COMPLETED)
+        done |= finished_now
+    not_done = [f for f in futures if f not in done]
+    # Stragglers past the deadline would keep their workers busy: stop them
+    for f in not_done:
+        pool.kill(f)
+
+    finished, failed = [], []
+    for f in done:
+        try:
+            finished.append(f.result())
+        except BrokenProcessPool as e:
+            failed.append({"ordering": futures[f][0], "fit_rule": futures[f][1],
+                           "error": str(e) or "worker process died"})
+    if not finished:
+        if failed and not not_done and not waiting:
+            raise RuntimeError(f"No packing variant finished: {failed[0]['error']}")
+        raise TimeoutError("No packing variant finished within the deadline")
+
+    # Deterministic order for the report regardless of completion order
+    order = {v: i for i, v in enumerate(variants)}
+    finished.sort(key=lambda v: order[(v["ordering"], v["fit_rule"])])
+    best = min(finished, key=lambda v: _rank_key(v, objective))
+
+    return {
+        "best": best,
+        "variants": [
+            {"ordering": v["ordering"], "fit_rule": v["fit_rule"], "metrics": v["metrics"]}
+            for v in finished
+        ],
+        "timed_out": [
+            {"ordering": futures[f][0], "fit_rule": futures[f][1]}
+            for f in not_done
+        ] + [
+            {"ordering": o, "fit_rule": r} for o, r in waiting  # never started
+        ],
+        "failed": failed,
+    }
@@ -1,20 +1,29 @@
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-from mpl_toolkits.mplot3d import Axes3D  # noqa: F401  (needed for 3D projection)
-import matplotlib.patches as mpatches
-import matplotlib
+import time
 
-matplotlib.use('Agg')
+from .shelf_geometry import packing_metrics
+from .shelf_feasibility import check_feasibility
+from .shelf_render import (
+    setup_axes, visible_shelves, draw_shelf_frames, draw_item, draw_legend, info_panel_text, item_color,
+    shelf_snapshot_state, render_snapshot, pyplot, add_timing, pillow_writer,
+)
+
+
+FIT_RULES = ("best", "first")
 
 
 class FixedShelfPacker3D:
-    def __init__(self, shelf_width, shelf_height, shelf_depth, shelf_count, compatibility_rules, selected_shelf_id=None):
+    def __init__(self, shelf_width, shelf_height, shelf_depth, shelf_count, compatibility_rules, selected_shelf_id=None,
+                 fit_rule="best"):
+        if fit_rule not in FIT_RULES:
+            raise ValueError(f"Unknown fit_rule {fit_rule!r}; expected one of {FIT_RULES}")
+
         self.shelf_width = shelf_width
         self.shelf_height = shelf_height
         self.shelf_depth = shelf_depth
         self.shelf_count = shelf_count
         self.compatibility_rules = {k: set(v) for k, v in compatibility_rules.items()}
         self.selected_shelf_id = selected_shelf_id
+        self.fit_rule = fit_rule  # "best" = least waste, "first" = first free space that fits
 
         self.items = []            # list of (w, h, d, item_type, color)
         self.unplaced_items = []   # list of (w, h, d, item_type, color)
@@ -32,9 +41,17 @@ class FixedShelfPacker3D:
             for i in range(shelf_count)
         ]
 
-        self.fig = plt.figure(figsize=(12, 8))
-        self.ax = self.fig.add_subplot(111, projection='3d')
+        # figure & axes are created lazily so headless packing never opens a figure
+        self.fig = None
+        self.ax = None
         self.current_item_index = 0
+        self.keyframe_every = 1    # items placed per animation frame
+        self.max_info_lines = 40   # info panel keeps only the most recent placements
+
+    def _ensure_figure(self):
+        if self.fig is None:
+            self.fig = pyplot().figure(figsize=(12, 8))
+            self.ax = self.fig.add_subplot(111, projection='3d')
 
     def add_item(self, width, height, depth, item_type, color=None):
         """Append an item; color can be named ('red') or hex ('#FF0000')."""
@@ -50,6 +67,8 @@ class FixedShelfPacker3D:
                     # allow three axis-aligned rotations
                     for rw, rh, rd in [(width, height, depth), (height, width, depth), (depth, width, height)]:
                         if rw <= w and rh <= h and rd <= d:
+                            if self.fit_rule == "first":
+                                return (shelf, i, x, y, z, rw, rh, rd)
                             waste = (w - rw) * (h - rh) * (d - rd)
                             if waste < min_waste:
                                 min_waste = waste
@@ -58,8 +77,9 @@ class FixedShelfPacker3D:
         return best_shelf
 
     def place_item(self):
+        """Places the next queued item; returns (shelf, placed_tuple), or None if unplaced / nothing queued."""
         if self.current_item_index >= len(self.items):
-            return
+            return None
 
         width, height, depth, item_type, color = self.items[self.current_item_index]
         best_fit = self.find_best_shelf(item_type, width, height, depth)
@@ -72,117 +92,147 @@ class FixedShelfPacker3D:
                 shelf["compatibility"] = self.compatibility_rules.get(item_type, {item_type})
 
             # place the item and split free space (simple guillotine split along +x, +y, +z)
-            shelf["placed_items"].append((x, y, z, w, h, d, item_type, color))
+            placed = (x, y, z, w, h, d, item_type, color)
+            shelf["placed_items"].append(placed)
             del shelf["free_spaces"][i]
 
             shelf["free_spaces"].append((x + w, y, z, shelf["width"] - (x + w), h, d))
             shelf["free_spaces"].append((x, y + h, z, w, shelf["height"] - (y + h), d))
             shelf["free_spaces"].append((x, y, z + d, w, h, shelf["depth"] - (z + d)))
+            result = (shelf, placed)
         else:
             self.unplaced_items.append((width, height, depth, item_type, color))
+            result = None
 
         self.current_item_index += 1
+        return result
 
-    def update_animation(self, frame):
-        self.ax.clear()
-        self.place_item()
-
-        self.ax.set_title("3D Shelf Packing (Selected Shelf Only)", fontsize=14)
-        self.ax.set_xlabel("Width (X)")
-        self.ax.set_ylabel("Height (Y)")
-        self.ax.set_zlabel("Depth/Shelf (Z)")
-
-        self.ax.set_xlim(0, self.shelf_width)
-        self.ax.set_ylim(0, self.shelf_height)
-        self.ax.set_zlim(0, self.shelf_depth * self.shelf_count + 20)
-        self.ax.view_init(elev=25, azim=-60)
-
-        # Fallback colors if an item doesn't provide one
-        color_map = {
-            "toxic": "red",
-            "acid": "blue",
-            "flammable": "orange",
-            "biohazard": "purple",
-            "explosive": "yellow",
-            "corrosive": "brown",
-            "normal": "green",
-        }
-
-        # Draw each shelf frame and items
-        for shelf in self.shelves:
-            shelf_id = shelf["id"]
-            if self.selected_shelf_id is not None and shelf_id != self.selected_shelf_id:
-                continue
-
-            x0, y0, z0 = 0, 0, shelf_id * self.shelf_depth
-            x1 = self.shelf_width
-            y1 = self.shelf_height
-            z1 = z0 + self.shelf_depth
-
-            edges = [
-                [(x0, x1), (y0, y0), (z0, z0)],
-                [(x0, x1), (y1, y1), (z0, z0)],
-                [(x0, x1), (y0, y0), (z1, z1)],
-                [(x0, x1), (y1, y1), (z1, z1)],
-                [(x0, x0), (y0, y1), (z0, z0)],
-                [(x1, x1), (y0, y1), (z0, z0)],
-                [(x0, x0), (y0, y1), (z1, z1)],
-                [(x1, x1), (y0, y1), (z1, z1)],
-                [(x0, x0), (y0, y0), (z0, z1)],
-                [(x1, x1), (y0, y0), (z0, z1)],
-                [(x0, x0), (y1, y1), (z0, z1)],
-                [(x1, x1), (y1, y1), (z0, z1)],
-            ]
-            for x_edge, y_edge, z_edge in edges:
-                self.ax.plot3D(x_edge, y_edge, z_edge, color='blue', linewidth=1.0, alpha=0.3)
-
-            # Draw all items for the selected shelf
-            for x, y, z, w, h, d, item_type, item_color in shelf["placed_items"]:
-                z_offset = shelf_id * self.shelf_depth
-                color = item_color if item_color else color_map.get(item_type, "gray")
-                self.ax.bar3d(x, y, z_offset + z, w, h, d, color=color, alpha=0.7, edgecolor="black")
+    def place_all_items(self):
+        """Place every queued item without rendering (headless packing)."""
+        while self.current_item_index < len(self.items):
+            self.place_item()
 
-        # Info panel (right side)
-        info_lines = []
-        for shelf in self.shelves:
-            if self.selected_shelf_id is not None and shelf["id"] != self.selected_shelf_id:
-                continue
-            for idx, (x, y, z, w, h, d, item_type, item_color) in enumerate(shelf["placed_items"]):
-                info_lines.append(
-                    f"[#{idx + 1}] {item_type} ({w}x{h}x{d}) → (x={x}, y={y}, z={z})"
-                )
-
-        if info_lines:
-            self.ax.text2D(
-                1.05, 0.95,
-                "\n".join(info_lines),
-                transform=self.ax.transAxes,
-                fontsize=8,
-                verticalalignment='top',
-                bbox=dict(boxstyle="round", facecolor="white", edgecolor="gray", alpha=0.7)
-            )
-
-        # Build a legend from actually seen types (first seen color per type)
-        seen = {}
+    def _init_animation(self):
+        """Draws the static layers once: axes, shelf wireframes, empty info panel."""
+        self.ax.clear()
+        setup_axes(self.ax, "3D Shelf Packing (Selected Shelf Only)",
+                   self.shelf_width, self.shelf_height, self.shelf_depth, self.shelf_count,
+                   zlabel="Depth/Shelf (Z)")
+
+        shelves = visible_shelves(self.shelves, self.selected_shelf_id)
+        draw_shelf_frames(self.ax, shelves, self.shelf_width, self.shelf_height, self.shelf_depth)
+
+        self._info_lines = []
+        self._legend_seen = {}
+        self._legend_dirty = False
+        self._info_text = self.ax.text2D(
+            1.05, 0.95, "",
+            transform=self.ax.transAxes,
+            fontsize=8,
+            verticalalignment='top',
+            bbox=dict(boxstyle="round", facecolor="white", edgecolor="gray", alpha=0.7)
+        )
+        self._info_text.set_visible(False)
+
+        # anything already placed (e.g. on re-init) is drawn once here
         for shelf in self.shelves:
-            for _, _, _, _, _, _, item_type, item_color in shelf["placed_items"]:
-                if item_type not in seen:
-                    seen[item_type] = item_color if item_color else color_map.get(item_type, "gray")
-
-        legend_patches = [mpatches.Patch(color=c, label=t) for t, c in seen.items()]
-        if legend_patches:
-            self.ax.legend(handles=legend_patches, loc='upper left', fontsize=7)
+            for idx, placed in enumerate(shelf["placed_items"]):
+                self._add_to_frame(shelf, idx, placed)
+        self._refresh_panels()
+        return []
+
+    def _add_to_frame(self, shelf, idx, placed):
+        x, y, z, w, h, d, item_type, color = placed
+        if self.selected_shelf_id is None or shelf["id"] == self.selected_shelf_id:
+            draw_item(self.ax, shelf["id"], self.shelf_depth, placed)
+            self._info_lines.append(f"[#{idx + 1}] {item_type} ({w}x{h}x{d}) → (x={x}, y={y}, z={z})")
+
+        # legend covers every shelf (first seen color per type)
+        if item_type not in self._legend_seen:
+            self._legend_seen[item_type] = item_color(item_type, color)
+            self._legend_dirty = True
+
+    def _refresh_panels(self):
+        if self._info_lines:
+            self._info_text.set_text(info_panel_text(self._info_lines, self.max_info_lines))
+            self._info_text.set_visible(True)
+        if self._legend_dirty:
+            draw_legend(self.ax, self._legend_seen)
+            self._legend_dirty = False
 
-    def animate(self, save_path="static/shelf_animation.mp4"):
-        anim = animation.FuncAnimation(self.fig, self.update_animation, frames=len(self.items) + 2, interval=500, repeat=False, blit=False)
-        anim.save(save_path, writer='pillow')  # .gif supported by pillow
-        plt.close(self.fig)
+    def update_animation(self, frame):
+        """
+        Places the next `keyframe_every` items and adds only their boxes to the
+        persistent artists; nothing already drawn is cleared or redrawn.
+        """
+        timings = getattr(self, "_timings", None)
+        for _ in range(self.keyframe_every):
+            started = time.perf_counter()
+            placed = self.place_item()
+            started = add_timing(timings, "solve", started)
+            if placed is not None:
+                shelf, item = placed
+                self._add_to_frame(shelf, len(shelf["placed_items"]) - 1, item)
+            add_timing(timings, "render", started)
+
+        started = time.perf_counter()
+        self._refresh_panels()
+        add_timing(timings, "render", started)
+        return []
+
+    def animate(self, save_path="static/shelf_animation.mp4", keyframe_every=1, max_info_lines=40,
+                progress_callback=None, timings=None):
+        """
+        keyframe_every: items placed per frame (1 = one frame per item).
+        max_info_lines: info panel shows only the most recent placements.
+        progress_callback: optional f(frame, total_frames), called as frames are written.
+        timings: optional dict; seconds spent placing items ("solve"), drawing and
+                 rasterizing frames ("render") and writing the GIF ("encode") are added to it.
+        """
+        import matplotlib.animation as animation
+
+        self._ensure_figure()
+        self.keyframe_every = max(1, int(keyframe_every))
+        self.max_info_lines = max_info_lines
+        self._timings = timings
+
+        remaining = len(self.items) - self.current_item_index
+        frames = -(-remaining // self.keyframe_every) + 2
+        anim = animation.FuncAnimation(self.fig, self.update_animation, init_func=self._init_animation,
+                                       frames=frames, interval=500, repeat=False, blit=False)
+        # same writer as writer='pillow' (fps = 1000 / interval); .gif supported by pillow
+        anim.save(save_path, writer=pillow_writer(1000 / 500, timings), progress_callback=progress_callback)
+        pyplot().close(self.fig)
+        self._timings = None
 
         if self.unplaced_items:
             print("Unplaced Items:")
             for w, h, d, t, c in self.unplaced_items:
                 print(f"- {t} ({w}x{h}x{d}) color={c}")
 
+    def snapshot_state(self):
+        """Plain-data view of what snapshot() draws (render cache key)."""
+        return shelf_snapshot_state(self.shelves, self.shelf_width, self.shelf_height, self.shelf_depth, self.shelf_count)
+
+    def snapshot(self, save_path, image_format="png", dpi=100, elev=25, azim=-60):
+        """Still PNG/WebP of the current layout; does not place queued items."""
+        render_snapshot(
+            self.shelves, self.shelf_width, self.shelf_height, self.shelf_depth, self.shelf_count, save_path,
+            title="3D Shelf Packing (Selected Shelf Only)", selected_shelf_id=self.selected_shelf_id,
+            image_format=image_format, dpi=dpi, elev=elev, azim=azim, zlabel="Depth/Shelf (Z)",
+        )
+
+    def check_feasibility(self, items):
+        """
+        Read-only capacity query: can these [w,h,d,type,...] cartons be placed on the
+        current layout, and roughly where (see shelf_feasibility.check_feasibility).
+        """
+        return check_feasibility(self.shelves, self.compatibility_rules, items)
+
+    def get_metrics(self, exact=True):
+        """Volume/utilization metrics of the current layout (see shelf_geometry.packing_metrics)."""
+        return packing_metrics(self.shelves, len(self.unplaced_items), exact=exact)
+
     def get_packing_result_json(self):
         shelves_data = []
 
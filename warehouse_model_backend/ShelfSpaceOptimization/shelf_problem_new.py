@@ -1,10 +1,15 @@
 # ShelfSpaceOptimization/shelf_problem_new.py
 
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-import matplotlib.patches as mpatches
+import io
+import time
+from collections import deque
+
+from PIL import Image
+
+from .shelf_state import ColumnarState
+from .shelf_geometry import reconstruct_free_spaces, packing_metrics
+from .shelf_feasibility import check_feasibility
+from .shelf_render import shelf_snapshot_state, render_snapshot, add_timing
 
 class FixedShelfPacker3DIncremental:
     """
@@ -14,6 +19,9 @@ class FixedShelfPacker3DIncremental:
     - If no space is available for a new item, it is added to unplaced_items.
     - State is fully serializable via get_packing_result_json() and restorable via from_state().
 
+    existing_state may also be a ColumnarState (see shelf_state.py), the compact
+    struct-of-arrays encoding produced by get_packing_result_columnar().
+
     Expected persisted state format (same as your current get_packing_result_json()):
     {
       "shelves": [
@@ -51,9 +59,10 @@ class FixedShelfPacker3DIncremental:
         self.compatibility_rules = {k: set(v) for k, v in compatibility_rules.items()}
         self.selected_shelf_id = selected_shelf_id
 
-        # new items queued to place (tuples like old class)
-        self.items = []
+        # new items queued to place (tuples like old class); deque so popping the head is O(1)
+        self.items = deque()
         self.unplaced_items = []
+        self.streamed_unplaced_count = 0  # rejected by iter_place_items: reported, not kept
 
         if existing_state:
             self._load_from_state(existing_state)
@@ -71,9 +80,6 @@ class FixedShelfPacker3DIncremental:
                 else:
                     shelf["compatibility"] = set()
 
-        # figure & axes for optional animation
-        self.fig = plt.figure(figsize=(12, 8))
-        self.ax = self.fig.add_subplot(111, projection='3d')
         self._animation_step_index = 0
 
     # ---------- State helpers ----------
@@ -94,6 +100,10 @@ class FixedShelfPacker3DIncremental:
         ]
 
     def _load_from_state(self, state_dict):
+        if isinstance(state_dict, ColumnarState):
+            self._load_from_columnar(state_dict)
+            return
+
         shelves = state_dict.get("shelves", [])
         self.shelves = []
         for s in shelves:
@@ -115,11 +125,14 @@ class FixedShelfPacker3DIncremental:
                     for fs in s["free_spaces"]
                 ]
             else:
-                # If free spaces are not provided:
-                # If no items: whole shelf free; otherwise we cannot reconstruct exactly—start with no free space.
-                free = []
-                if not placed:
-                    free = [(0, 0, 0, s["width"], s["height"], s["depth"])]
+                # If free spaces are not provided, rebuild them from the placed items
+                # (whole shelf when empty) so the shelf is not treated as full.
+                free = reconstruct_free_spaces(
+                    s.get("width", self.shelf_width),
+                    s.get("height", self.shelf_height),
+                    s.get("depth", self.shelf_depth),
+                    placed
+                )
 
             self.shelves.append({
                 "id": s.get("id"),
@@ -139,20 +152,37 @@ class FixedShelfPacker3DIncremental:
                 ui.get("item_type"), ui.get("color")
             ))
 
+    def _load_from_columnar(self, state):
+        self.shelves = []
+        for s in state.iter_shelves():
+            if not s["free_spaces"]:
+                s["free_spaces"] = reconstruct_free_spaces(s["width"], s["height"], s["depth"], s["placed_items"])
+            s["compatibility"] = set()  # will set later
+            self.shelves.append(s)
+
+        self.unplaced_items.extend(state.unplaced_items())
+
     @classmethod
     def from_state(cls, compatibility_rules, state_dict):
         """
         Convenience constructor when you only have state and compatibility.
         Takes global shelf dimensions from first shelf in state.
         """
-        if not state_dict.get("shelves"):
-            raise ValueError("State dict has no shelves")
-
-        s0 = state_dict["shelves"][0]
-        width = s0["width"]
-        height = s0["height"]
-        depth = s0["depth"]
-        count = len(state_dict["shelves"])
+        if isinstance(state_dict, ColumnarState):
+            dims = state_dict.arrays["shelf_dims"]
+            if not len(dims):
+                raise ValueError("State dict has no shelves")
+            width, height, depth = dims[0].tolist()
+            count = len(dims)
+        else:
+            if not state_dict.get("shelves"):
+                raise ValueError("State dict has no shelves")
+
+            s0 = state_dict["shelves"][0]
+            width = s0["width"]
+            height = s0["height"]
+            depth = s0["depth"]
+            count = len(state_dict["shelves"])
         return cls(
             shelf_width=width,
             shelf_height=height,
@@ -172,16 +202,53 @@ class FixedShelfPacker3DIncremental:
         Attempts to place only the NEW items (self.items), respecting current
         placed items and free_spaces.
         """
-        for _ in range(len(self.items)):
+        while self.items:
             self._place_next_item()
 
-    # ---------- Packing internals ----------
+    def iter_place_items(self, items):
+        """
+        Streaming bulk insert: consumes any iterable of (w, h, d, item_type[, color])
+        lazily and yields one record per item as soon as it is placed or rejected:
+          {"event": "placed", "index": i, "shelf_id": .., "x": .., "y": .., "z": ..,
+           "width": .., "height": .., "depth": .., "item_type": .., "color": ..}
+          {"event": "unplaced", "index": i, "width": .., "height": .., "depth": ..,
+           "item_type": .., "color": ..}
+        Nothing is buffered besides the packer state itself: rejected items are
+        only yielded (and counted in streamed_unplaced_count / get_metrics()),
+        not added to unplaced_items, so memory stays flat however many fail.
+        """
+        for index, item in enumerate(items):
+            width, height, depth, item_type = item[:4]
+            color = item[4] if len(item) > 4 else None
+            placed = self._place_item(width, height, depth, item_type, color, record_unplaced=False)
+            if placed is None:
+                self.streamed_unplaced_count += 1
+                yield {
+                    "event": "unplaced", "index": index,
+                    "width": width, "height": height, "depth": depth,
+                    "item_type": item_type, "color": color
+                }
+            else:
+                shelf, (x, y, z, w, h, d, _, _) = placed
+                yield {
+                    "event": "placed", "index": index, "shelf_id": shelf["id"],
+                    "x": x, "y": y, "z": z,
+                    "width": w, "height": h, "depth": d,
+                    "item_type": item_type, "color": color
+                }
+
+    # ---------- Slots ----------
 
-    def _find_best_slot(self, item_type, width, height, depth):
+    def find_best_slot(self, item_type, width, height, depth, shelves=None):
+        """
+        Best-fit search over `shelves` (default: all shelves of this packer; any
+        shelf dicts in the same format work, e.g. copies for a dry run).
+        Returns an opaque slot for occupy_slot(), or None if nothing fits.
+        """
         best = None
         min_waste = float("inf")
 
-        for shelf in self.shelves:
+        for shelf in (self.shelves if shelves is None else shelves):
             # Shelf compatibility: empty set means not yet restricted;
             # otherwise the item_type must be allowed.
             if shelf["compatibility"] and item_type not in shelf["compatibility"]:
@@ -202,18 +269,11 @@ class FixedShelfPacker3DIncremental:
 
         return best
 
-    def _place_next_item(self):
-        if not self.items:
-            return
-
-        width, height, depth, item_type, color = self.items.pop(0)
-        fit = self._find_best_slot(item_type, width, height, depth)
-
-        if not fit:
-            # could not place — leave items fixed, record as unplaced
-            self.unplaced_items.append((width, height, depth, item_type, color))
-            return
-
+    def occupy_slot(self, fit, item_type, color):
+        """
+        Puts an item into a slot returned by find_best_slot() and splits that
+        free space; returns (shelf, placed_tuple).
+        """
         shelf, idx, x, y, z, w, h, d = fit
 
         # Initialize shelf compatibility if it was open
@@ -221,7 +281,8 @@ class FixedShelfPacker3DIncremental:
             shelf["compatibility"] = self.compatibility_rules.get(item_type, {item_type}).copy()
 
         # Place the item
-        shelf["placed_items"].append((x, y, z, w, h, d, item_type, color))
+        placed = (x, y, z, w, h, d, item_type, color)
+        shelf["placed_items"].append(placed)
 
         # Split the free space (guillotine-style)
         del shelf["free_spaces"][idx]
@@ -241,97 +302,80 @@ class FixedShelfPacker3DIncremental:
             fs for fs in shelf["free_spaces"] if fs[3] > 0 and fs[4] > 0 and fs[5] > 0
         ]
 
-    # ---------- Visualization & Serialization ----------
-
-    def _draw_frame(self):
-        self.ax.clear()
-        self.ax.set_title("3D Shelf Packing (Incremental — fixed items stay put)", fontsize=14)
-        self.ax.set_xlabel("Width (X)")
-        self.ax.set_ylabel("Height (Y)")
-        self.ax.set_zlabel("Depth (Z)")
-
-        self.ax.set_xlim(0, self.shelf_width)
-        self.ax.set_ylim(0, self.shelf_height)
-        self.ax.set_zlim(0, self.shelf_depth * self.shelf_count + 20)
-        self.ax.view_init(elev=25, azim=-60)
-
-        color_map = {
-            "toxic": "red",
-            "acid": "blue",
-            "flammable": "orange",
-            "biohazard": "purple",
-            "explosive": "yellow",
-            "corrosive": "brown",
-            "normal": "green",
-        }
+        return shelf, placed
 
-        # Draw shelves & placed items
-        for shelf in self.shelves:
-            shelf_id = shelf["id"]
-            if self.selected_shelf_id is not None and shelf_id != self.selected_shelf_id:
-                continue
+    # ---------- Packing internals ----------
 
-            x0, y0, z0 = 0, 0, shelf_id * self.shelf_depth
-            x1 = self.shelf_width
-            y1 = self.shelf_height
-            z1 = z0 + self.shelf_depth
-
-            edges = [
-                [(x0, x1), (y0, y0), (z0, z0)],
-                [(x0, x1), (y1, y1), (z0, z0)],
-                [(x0, x1), (y0, y0), (z1, z1)],
-                [(x0, x1), (y1, y1), (z1, z1)],
-                [(x0, x0), (y0, y1), (z0, z0)],
-                [(x1, x1), (y0, y1), (z0, z0)],
-                [(x0, x0), (y0, y1), (z1, z1)],
-                [(x1, x1), (y0, y1), (z1, z1)],
-                [(x0, x0), (y0, y0), (z0, z1)],
-                [(x1, x1), (y0, y0), (z0, z1)],
-                [(x0, x0), (y1, y1), (z0, z1)],
-                [(x1, x1), (y1, y1), (z0, z1)],
-            ]
-            for xe, ye, ze in edges:
-                self.ax.plot3D(xe, ye, ze, color='blue', linewidth=1.0, alpha=0.3)
+    def _place_next_item(self):
+        if not self.items:
+            return
 
-            for x, y, z, w, h, d, item_type, item_color in shelf["placed_items"]:
-                z_offset = shelf_id * self.shelf_depth
-                color = item_color if item_color else color_map.get(item_type, "gray")
-                self.ax.bar3d(x, y, z_offset + z, w, h, d, color=color, alpha=0.7, edgecolor="black")
+        self._place_item(*self.items.popleft())
 
-        # legend from seen types
-        seen = {}
-        for shelf in self.shelves:
-            for _, _, _, _, _, _, item_type, item_color in shelf["placed_items"]:
-                if item_type not in seen:
-                    seen[item_type] = item_color if item_color else color_map.get(item_type, "gray")
-        legend_patches = [mpatches.Patch(color=c, label=t) for t, c in seen.items()]
-        if legend_patches:
-            self.ax.legend(handles=legend_patches, loc='upper left', fontsize=7)
-
-    def animate(self, save_path="static/shelf_incremental.gif"):
+    def _place_item(self, width, height, depth, item_type, color, record_unplaced=True):
         """
-        Optional: animate just the state (no per-item animation unless you
-        call place_all_new_items() step by step externally). Here we
-        simply render the final state to a single-frame GIF.
+        Places one item; returns (shelf, placed_tuple) or None when it did not
+        fit (added to unplaced_items when record_unplaced).
         """
-        # If you want the original step-by-step effect, you can instead:
-        # - Keep items in a queue and create frames by placing one per frame.
+        fit = self.find_best_slot(item_type, width, height, depth)
+
+        if not fit:
+            # could not place — leave items fixed, record as unplaced
+            if record_unplaced:
+                self.unplaced_items.append((width, height, depth, item_type, color))
+            return None
 
-        # one-frame animation for compatibility with your current flow
-        def _frame(_):
-            self._draw_frame()
-            return []
+        return self.occupy_slot(fit, item_type, color)
 
-        anim = animation.FuncAnimation(
-            self.fig, _frame, frames=1, interval=500, repeat=False, blit=False
+    # ---------- Visualization & Serialization ----------
+
+    def snapshot_state(self):
+        """Plain-data view of what snapshot() draws (render cache key)."""
+        return shelf_snapshot_state(self.shelves, self.shelf_width, self.shelf_height, self.shelf_depth, self.shelf_count)
+
+    def snapshot(self, save_path, image_format="png", dpi=100, elev=25, azim=-60):
+        """Still PNG/WebP of the current state, rendered with a single savefig."""
+        render_snapshot(
+            self.shelves, self.shelf_width, self.shelf_height, self.shelf_depth, self.shelf_count, save_path,
+            title="3D Shelf Packing (Incremental — fixed items stay put)", selected_shelf_id=self.selected_shelf_id,
+            image_format=image_format, dpi=dpi, elev=elev, azim=azim,
         )
-        anim.save(save_path, writer='pillow')
-        plt.close(self.fig)
 
-    def get_packing_result_json(self):
+    def animate(self, save_path="static/shelf_incremental.gif", timings=None):
+        """
+        Renders the current state to a single-frame GIF (the format /generate-incremental
+        has always returned). Drawn once via snapshot() and converted with Pillow;
+        use snapshot() directly for PNG/WebP.
+        timings: optional dict; drawing time is added to "render", the GIF conversion to "encode".
+        """
+        started = time.perf_counter()
+        buf = io.BytesIO()
+        self.snapshot(buf, image_format="png")
+        buf.seek(0)
+        started = add_timing(timings, "render", started)
+        with Image.open(buf) as img:
+            img.convert("RGB").save(save_path, format="GIF")
+        add_timing(timings, "encode", started)
+
+    def check_feasibility(self, items):
+        """
+        Read-only capacity query: can these [w,h,d,type,...] cartons be placed on the
+        current layout, and roughly where (see shelf_feasibility.check_feasibility).
+        """
+        return check_feasibility(self.shelves, self.compatibility_rules, items)
+
+    def get_metrics(self, exact=True):
+        """Volume/utilization metrics of the current layout (see shelf_geometry.packing_metrics)."""
+        return packing_metrics(self.shelves, len(self.unplaced_items) + self.streamed_unplaced_count, exact=exact)
+
+    def get_packing_result_json(self, include_free_spaces=True):
+        """
+        include_free_spaces=False drops "free_spaces" from every shelf; they are
+        rebuilt from placed_items when the state is loaded again.
+        """
         shelves_data = []
         for shelf in self.shelves:
-            shelves_data.append({
+            shelf_dict = {
                 "id": shelf["id"],
                 "width": shelf["width"],
                 "height": shelf["height"],
@@ -345,11 +389,13 @@ class FixedShelfPacker3DIncremental:
                     }
                     for (x, y, z, w, h, d, item_type, color) in shelf["placed_items"]
                 ],
-                "free_spaces": [
+            }
+            if include_free_spaces:
+                shelf_dict["free_spaces"] = [
                     {"x": x, "y": y, "z": z, "width": w, "height": h, "depth": d}
                     for (x, y, z, w, h, d) in shelf["free_spaces"]
-                ],
-            })
+                ]
+            shelves_data.append(shelf_dict)
 
         result = {
             "shelves": shelves_data,
@@ -362,3 +408,7 @@ class FixedShelfPacker3DIncremental:
             ]
         }
         return result
+
+    def get_packing_result_columnar(self, include_free_spaces=True):
+        """Same state as get_packing_result_json(), as a ColumnarState (use .to_bytes() to persist)."""
+        return ColumnarState.from_packer(self, include_free_spaces=include_free_spaces)
@@ -0,0 +1,169 @@
+# ShelfSpaceOptimization/shelf_render.py
+
+import time
+
+_plt = None
+
+# Fallback colors if an item doesn't provide one
+COLOR_MAP = {
+    "toxic": "red",
+    "acid": "blue",
+    "flammable": "orange",
+    "biohazard": "purple",
+    "explosive": "yellow",
+    "corrosive": "brown",
+    "normal": "green",
+}
+
+
+def pyplot():
+    """
+    matplotlib.pyplot on the Agg backend, with the 3D projection registered.
+    Imported on first render, so headless packing never loads matplotlib.
+    """
+    global _plt
+    if _plt is None:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        from mpl_toolkits.mplot3d import Axes3D  # noqa: F401  (needed for 3D projection)
+        _plt = plt
+    return _plt
+
+
+def add_timing(timings, stage, since):
+    """Adds the seconds since `since` to timings[stage] (no-op when timings is None); returns now."""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + (now - since)
+    return now
+
+
+def pillow_writer(fps, timings=None):
+    """
+    matplotlib's PillowWriter. With a `timings` dict, time spent rasterizing
+    frames is added to timings["render"] and writing the GIF to timings["encode"].
+    """
+    from matplotlib.animation import PillowWriter
+
+    if timings is None:
+        return PillowWriter(fps=fps)
+
+    class TimedPillowWriter(PillowWriter):
+        def grab_frame(self, **savefig_kwargs):
+            started = time.perf_counter()
+            super().grab_frame(**savefig_kwargs)
+            add_timing(timings, "render", started)
+
+        def finish(self):
+            started = time.perf_counter()
+            super().finish()
+            add_timing(timings, "encode", started)
+
+    return TimedPillowWriter(fps=fps)
+
+
+def item_color(item_type, color):
+    return color if color else COLOR_MAP.get(item_type, "gray")
+
+
+def setup_axes(ax, title, shelf_width, shelf_height, shelf_depth, shelf_count, zlabel="Depth (Z)"):
+    ax.set_title(title, fontsize=14)
+    ax.set_xlabel("Width (X)")
+    ax.set_ylabel("Height (Y)")
+    ax.set_zlabel(zlabel)
+
+    ax.set_xlim(0, shelf_width)
+    ax.set_ylim(0, shelf_height)
+    ax.set_zlim(0, shelf_depth * shelf_count + 20)
+    ax.view_init(elev=25, azim=-60)
+
+
+def visible_shelves(shelves, selected_shelf_id):
+    return [s for s in shelves if selected_shelf_id is None or s["id"] == selected_shelf_id]
+
+
+def draw_shelf_frames(ax, shelves, shelf_width, shelf_height, shelf_depth):
+    """
+    Wireframes of all given shelves as ONE Line3DCollection (12 edges per shelf)
+    instead of 12 plot3D lines per shelf.
+    """
+    segments = []
+    for shelf in shelves:
+        x0, y0, z0 = 0, 0, shelf["id"] * shelf_depth
+        x1, y1, z1 = shelf_width, shelf_height, z0 + shelf_depth
+        for ya, za in [(y0, z0), (y1, z0), (y0, z1), (y1, z1)]:
+            segments.append([(x0, ya, za), (x1, ya, za)])
+        for xa, za in [(x0, z0), (x1, z0), (x0, z1), (x1, z1)]:
+            segments.append([(xa, y0, za), (xa, y1, za)])
+        for xa, ya in [(x0, y0), (x1, y0), (x0, y1), (x1, y1)]:
+            segments.append([(xa, ya, z0), (xa, ya, z1)])
+
+    if segments:
+        from mpl_toolkits.mplot3d.art3d import Line3DCollection
+        ax.add_collection3d(Line3DCollection(segments, colors='blue', linewidths=1.0, alpha=0.3))
+
+
+def draw_item(ax, shelf_id, shelf_depth, placed):
+    x, y, z, w, h, d, item_type, color = placed
+    ax.bar3d(x, y, shelf_id * shelf_depth + z, w, h, d,
+             color=item_color(item_type, color), alpha=0.7, edgecolor="black")
+
+
+def draw_legend(ax, seen):
+    """seen: {item_type: color} in first-seen order."""
+    import matplotlib.patches as mpatches
+    legend_patches = [mpatches.Patch(color=c, label=t) for t, c in seen.items()]
+    if legend_patches:
+        ax.legend(handles=legend_patches, loc='upper left', fontsize=7)
+
+
+def info_panel_text(lines, max_lines):
+    """Last `max_lines` lines, with a count of the ones left out."""
+    if len(lines) <= max_lines:
+        return "\n".join(lines)
+    hidden = len(lines) - max_lines
+    return "\n".join([f"... {hidden} earlier item(s)"] + lines[-max_lines:])
+
+
+def shelf_snapshot_state(shelves, shelf_width, shelf_height, shelf_depth, shelf_count):
+    """
+    Everything a snapshot depends on, as plain data (free spaces are not drawn,
+    so they are left out). Used as the render cache key.
+    """
+    return {
+        "shelf": [shelf_width, shelf_height, shelf_depth, shelf_count],
+        "shelves": [[shelf["id"], [list(p) for p in shelf["placed_items"]]] for shelf in shelves],
+    }
+
+
+def render_snapshot(shelves, shelf_width, shelf_height, shelf_depth, shelf_count, save_path,
+                    title="3D Shelf Packing", selected_shelf_id=None, image_format="png", dpi=100,
+                    elev=25, azim=-60, zlabel="Depth (Z)"):
+    """
+    Renders the current layout straight to a still PNG/WebP with savefig
+    (no FuncAnimation / GIF writer involved).
+    """
+    plt = pyplot()
+    fig = plt.figure(figsize=(12, 8))
+    try:
+        ax = fig.add_subplot(111, projection='3d')
+        setup_axes(ax, title, shelf_width, shelf_height, shelf_depth, shelf_count, zlabel=zlabel)
+        ax.view_init(elev=elev, azim=azim)
+
+        visible = visible_shelves(shelves, selected_shelf_id)
+        draw_shelf_frames(ax, visible, shelf_width, shelf_height, shelf_depth)
+        for shelf in visible:
+            for placed in shelf["placed_items"]:
+                draw_item(ax, shelf["id"], shelf_depth, placed)
+
+        seen = {}
+        for shelf in shelves:
+            for _, _, _, _, _, _, item_type, color in shelf["placed_items"]:
+                if item_type not in seen:
+                    seen[item_type] = item_color(item_type, color)
+        draw_legend(ax, seen)
+
+        fig.savefig(save_path, format=image_format, dpi=dpi)
+    finally:
+        plt.close(fig)
@@ -0,0 +1,244 @@
+# ShelfSpaceOptimization/shelf_sharding.py
+
+import math
+import os
+from concurrent.futures import wait
+from typing import Dict, Any, List, Tuple, Optional
+
+from ServerRuntime.pools import WorkerPool, check_timeout
+
+from .shelf_problem import FixedShelfPacker3D
+from .shelf_problem_new import FixedShelfPacker3DIncremental
+from .shelf_geometry import occupied_volume
+
+MODES = ("full", "incremental")
+
+# Created on first use and reused across requests, so a sharded pack pays no process start-up
+_shard_pool = None
+
+
+def _get_shard_pool() -> WorkerPool:
+    global _shard_pool
+    if _shard_pool is None:
+        _shard_pool = WorkerPool(os.cpu_count() or 1, name="shards")
+    return _shard_pool
+
+
+def _class_key(compatibility) -> Tuple[str, ...]:
+    return tuple(sorted(str(t) for t in compatibility))
+
+
+def _item_class(rules: Dict[str, List[str]], item_type) -> Tuple[str, ...]:
+    # Same set a shelf gets when this item is the first one placed on it
+    return _class_key(rules.get(item_type, [item_type]))
+
+
+def _allocate_empty_shelves(need: Dict[Tuple, float], has_shelves: set, empty_ids: List[int],
+                            shelf_volume: float) -> Dict[Tuple, List[int]]:
+    """
+    Splits the empty shelves between the classes that have items. Each class first
+    gets the number of shelves its uncovered volume asks for (at least one if it
+    has no shelf yet); when there are fewer shelves than that, they are shared out
+    by largest remainder. Spare shelves are handed out round-robin (biggest need
+    first) so packing slack is not left unused.
+    """
+    classes = sorted(need, key=lambda c: (-need[c], c))
+    allocation = {c: [] for c in classes}
+    if not classes or not empty_ids:
+        return allocation
+
+    wanted = {
+        c: max(0 if c in has_shelves else 1, math.ceil(need[c] / shelf_volume) if shelf_volume > 0 else 1)
+        for c in classes
+    }
+    total = sum(wanted.values())
+    if total > len(empty_ids):
+        exact = {c: len(empty_ids) * wanted[c] / total for c in classes}
+        counts = {c: int(exact[c]) for c in classes}
+        spare = len(empty_ids) - sum(counts.values())
+        for c in sorted(classes, key=lambda c: (-(exact[c] - counts[c]), c))[:spare]:
+            counts[c] += 1
+    else:
+        counts = dict(wanted)
+        spare = len(empty_ids) - total
+        for i in range(spare):
+            counts[classes[i % len(classes)]] += 1
+
+    ids = iter(empty_ids)
+    for c in classes:
+        allocation[c] = [next(ids) for _ in range(counts[c])]
+    return allocation
+
+
+def _pack_shard(mode: str, config: Dict[str, Any], shelves_json: List[Dict[str, Any]], items: List[List[Any]]) -> Dict[str, Any]:
+    """Packs one compatibility shard in a worker process; returns its result JSON with original shelf ids."""
+    if mode == "full":
+        packer = FixedShelfPacker3D(
+            shelf_width=config["shelf_width"],
+            shelf_height=config["shelf_height"],
+            shelf_depth=config["shelf_depth"],
+            shelf_count=len(shelves_json),
+            compatibility_rules=config["compatibility_rules"],
+        )
+        for shelf, shelf_json in zip(packer.shelves, shelves_json):
+            shelf["id"] = shelf_json["id"]
+        for item in items:
+            packer.add_item(*item)
+        packer.place_all_items()
+    else:
+        packer = FixedShelfPacker3DIncremental(
+            shelf_width=config["shelf_width"],
+            shelf_height=config["shelf_height"],
+            shelf_depth=config["shelf_depth"],
+            shelf_count=len(shelves_json),
+            compatibility_rules=config["compatibility_rules"],
+            existing_state={"shelves": shelves_json, "unplaced_items": []},
+        )
+        for item in items:
+            packer.add_item(*item)
+        packer.place_all_new_items()
+    return packer.get_packing_result_json()
+
+
+def pack_sharded(payload: Dict[str, Any], mode: str = "full", timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Sharded packing: partitions items and shelves by compatibility class and packs
+    the shards concurrently on the shared shard pool (one worker per CPU), then
+    merges them into one get_packing_result_json()-shaped result.
+
+    mode="full":        repack all items onto empty shelves (FixedShelfPacker3D)
+    mode="incremental": keep existing_state; shelves that already have a class stay
+                        in that class's shard, empty shelves are shared out
+                        (FixedShelfPacker3DIncremental)
+
+    Each item only goes to shelves of its own class (the compatibility set the
+    shelf would get if that item were placed first). The sequential packers can
+    also put an item on a shelf of another class that happens to accept it, so
+    the layout can differ from a single-process run; that is the price of
+    independent shards.
+
+    `timeout` is a budget in seconds for the shards (ValueError unless a
+    positive number); when it runs out, this call's shards are killed and
+    TimeoutError is raised. Other requests' shards are not affected.
+
+    Returns:
+      {
+        "result": {"shelves": [...], "unplaced_items": [...]},
+        "shards": [{"class": [...], "shelf_ids": [...], "items": n, "unplaced": k}, ...]
+      }
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}; expected one of {MODES}")
+    check_timeout(timeout)
+
+    config = {k: payload[k] for k in ("shelf_width", "shelf_height", "shelf_depth", "shelf_count", "compatibility_rules")}
+    rules = config["compatibility_rules"]
+    items = [list(i) for i in payload.get("items", []) or []]
+    shelf_volume = float(config["shelf_width"]) * float(config["shelf_height"]) * float(config["shelf_depth"])
+
+    # ---------- Shelves per class ----------
+    prev_unplaced = []
+    if mode == "incremental" and payload.get("existing_state"):
+        loaded = FixedShelfPacker3DIncremental(
+            shelf_width=config["shelf_width"],
+            shelf_height=config["shelf_height"],
+            shelf_depth=config["shelf_depth"],
+            shelf_count=config["shelf_count"],
+            compatibility_rules=rules,
+            existing_state=payload["existing_state"],
+        )
+        state = loaded.get_packing_result_json()
+        compat_by_id = {s["id"]: s["compatibility"] for s in loaded.shelves}
+        prev_unplaced = state["unplaced_items"]
+    else:
+        state = FixedShelfPacker3DIncremental(
+            shelf_width=config["shelf_width"],
+            shelf_height=config["shelf_height"],
+            shelf_depth=config["shelf_depth"],
+            shelf_count=config["shelf_count"],
+            compatibility_rules=rules,
+        ).get_packing_result_json()
+        compat_by_id = {}
+
+    shelves_by_class: Dict[Tuple, List[Dict[str, Any]]] = {}
+    empty_ids = []
+    shelf_json_by_id = {}
+    for shelf_json in state["shelves"]:
+        shelf_json_by_id[shelf_json["id"]] = shelf_json
+        compat = compat_by_id.get(shelf_json["id"])
+        if compat:
+            shelves_by_class.setdefault(_class_key(compat), []).append(shelf_json)
+        else:
+            empty_ids.append(shelf_json["id"])
+
+    # ---------- Items per class + empty shelf allocation ----------
+    items_by_class: Dict[Tuple, List[List[Any]]] = {}
+    for item in items:
+        items_by_class.setdefault(_item_class(rules, item[3]), []).append(item)
+
+    # uncovered volume per class: item volume minus the empty volume left on the
+    # class's shelves (shelf minus the union of its placed items; free-space lists
+    # overlap, so their sum would overcount)
+    need = {}
+    for cls, cls_items in items_by_class.items():
+        demand = sum(float(i[0]) * float(i[1]) * float(i[2]) for i in cls_items)
+        free = sum(
+            shelf_volume - occupied_volume(
+                s["width"], s["height"], s["depth"],
+                [(p["x"], p["y"], p["z"], p["width"], p["height"], p["depth"]) for p in s["placed_items"]]
+            )
+            for s in shelves_by_class.get(cls, [])
+        )
+        need[cls] = max(0.0, demand - free)
+
+    for cls, ids in _allocate_empty_shelves(need, set(shelves_by_class), empty_ids, shelf_volume).items():
+        shelves_by_class.setdefault(cls, []).extend(shelf_json_by_id[i] for i in ids)
+
+    # ---------- Pack shards concurrently ----------
+    shards = [(cls, shelves_by_class.get(cls, []), cls_items) for cls, cls_items in items_by_class.items()]
+    runnable = [s for s in shards if s[1]]
+
+    results = {}
+    if runnable:
+        pool = _get_shard_pool()
+        futures = {
+            cls: pool.submit(_pack_shard, mode, config, shelves, cls_items)
+            for cls, shelves, cls_items in runnable
+        }
+        _, not_done = wait(futures.values(), timeout=timeout)
+        if not_done:
+            for future in futures.values():
+                pool.kill(future)
+            raise TimeoutError(f"Sharded packing exceeded {timeout}s")
+        results = {cls: f.result() for cls, f in futures.items()}
+
+    # ---------- Merge ----------
+    merged_shelves = dict(shelf_json_by_id)
+    unplaced = list(prev_unplaced)
+    shard_info = []
+    for cls, shelves, cls_items in shards:
+        if cls in results:
+            for shelf_json in results[cls]["shelves"]:
+                merged_shelves[shelf_json["id"]] = shelf_json
+            shard_unplaced = results[cls]["unplaced_items"]
+        else:
+            # no shelf left for this class
+            shard_unplaced = [
+                {"width": w, "height": h, "depth": d, "item_type": t, "color": c}
+                for (w, h, d, t, c) in (tuple(i) + (None,) * (5 - len(i)) for i in cls_items)
+            ]
+        unplaced.extend(shard_unplaced)
+        shard_info.append({
+            "class": list(cls),
+            "shelf_ids": [s["id"] for s in shelves],
+            "items": len(cls_items),
+            "unplaced": len(shard_unplaced),
+        })
+
+    return {
+        "result": {
+            "shelves": [merged_shelves[i] for i in sorted(merged_shelves)],
+            "unplaced_items": unplaced,
+        },
+        "shards": shard_info,
+    }
@@ -0,0 +1,286 @@
+# ShelfSpaceOptimization/shelf_state.py
+
+"""
+Compact columnar (struct-of-arrays) encoding of a packing state.
+
+The JSON state produced by get_packing_result_json() holds one dict per placed
+item and per free space. Here the same information is kept as a handful of
+NumPy arrays plus interned item-type / color tables:
+
+  shelf_id      int64   (S,)     shelf ids in shelf order
+  shelf_dims    float64 (S, 3)   width, height, depth
+  placed_shelf  int32   (P,)     row in the shelf arrays (grouped, ascending)
+  placed_box    float64 (P, 6)   x, y, z, width, height, depth
+  placed_type   int32   (P,)     index into header["types"]
+  placed_color  int32   (P,)     index into header["colors"]
+  free_shelf    int32   (F,)     row in the shelf arrays (grouped, ascending)
+  free_box      float64 (F, 6)   x, y, z, width, height, depth
+  unplaced_box  float64 (U, 3)   width, height, depth
+  unplaced_type int32   (U,)
+  unplaced_color int32  (U,)
+
+Binary layout: b"WMSS" | uint32 header length | JSON header | 8-byte aligned
+raw array buffers. from_bytes() maps the arrays straight onto the input buffer
+with np.frombuffer, so loading does not copy the coordinate data.
+"""
+
+import json
+import struct
+from typing import Dict, Any, List
+
+import numpy as np
+
+
+MAGIC = b"WMSS"
+FORMAT_VERSION = 1
+
+_SCHEMA = {
+    "shelf_id": ("<i8", 1),
+    "shelf_dims": ("<f8", 3),
+    "placed_shelf": ("<i4", 1),
+    "placed_box": ("<f8", 6),
+    "placed_type": ("<i4", 1),
+    "placed_color": ("<i4", 1),
+    "free_shelf": ("<i4", 1),
+    "free_box": ("<f8", 6),
+    "unplaced_box": ("<f8", 3),
+    "unplaced_type": ("<i4", 1),
+    "unplaced_color": ("<i4", 1),
+}
+
+
+class _Interner:
+    def __init__(self):
+        self.values = []
+        self._index = {}
+
+    def __call__(self, value):
+        idx = self._index.get(value)
+        if idx is None:
+            idx = self._index[value] = len(self.values)
+            self.values.append(value)
+        return idx
+
+
+def _column(rows, name):
+    dtype, width = _SCHEMA[name]
+    shape = (len(rows),) if width == 1 else (len(rows), width)
+    return np.asarray(rows, dtype=dtype).reshape(shape)
+
+
+class ColumnarState:
+    """
+    Struct-of-arrays packing state. `arrays` maps the names in _SCHEMA to NumPy
+    arrays; `types` / `colors` are the interned item_type / color tables.
+    `has_free_spaces` is False when free spaces were not stored and have to be
+    rebuilt from the placed items on load.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], types: List[Any], colors: List[Any],
+                 has_free_spaces: bool = True):
+        self.arrays = arrays
+        self.types = types
+        self.colors = colors
+        self.has_free_spaces = has_free_spaces
+
+    # ---------- Builders ----------
+
+    @classmethod
+    def from_shelves(cls, shelves, unplaced_items, include_free_spaces=True):
+        """
+        Builds the columns straight from packer internals: shelves with tuple
+        placed_items / free_spaces and (w, h, d, item_type, color) unplaced tuples.
+        """
+        types, colors = _Interner(), _Interner()
+        shelf_id, shelf_dims = [], []
+        placed_shelf, placed_box, placed_type, placed_color = [], [], [], []
+        free_shelf, free_box = [], []
+
+        for row, shelf in enumerate(shelves):
+            shelf_id.append(shelf["id"])
+            shelf_dims.append((shelf["width"], shelf["height"], shelf["depth"]))
+            for (x, y, z, w, h, d, item_type, color) in shelf["placed_items"]:
+                placed_shelf.append(row)
+                placed_box.append((x, y, z, w, h, d))
+                placed_type.append(types(item_type))
+                placed_color.append(colors(color))
+            if include_free_spaces:
+                for fs in shelf["free_spaces"]:
+                    free_shelf.append(row)
+                    free_box.append(fs)
+
+        unplaced_box, unplaced_type, unplaced_color = [], [], []
+        for (w, h, d, item_type, color) in unplaced_items:
+            unplaced_box.append((w, h, d))
+            unplaced_type.append(types(item_type))
+            unplaced_color.append(colors(color))
+
+        columns = {
+            "shelf_id": shelf_id, "shelf_dims": shelf_dims,
+            "placed_shelf": placed_shelf, "placed_box": placed_box,
+            "placed_type": placed_type, "placed_color": placed_color,
+            "free_shelf": free_shelf, "free_box": free_box,
+            "unplaced_box": unplaced_box, "unplaced_type": unplaced_type,
+            "unplaced_color": unplaced_color,
+        }
+        arrays = {name: _column(rows, name) for name, rows in columns.items()}
+        return cls(arrays, types.values, colors.values, has_free_spaces=include_free_spaces)
+
+    @classmethod
+    def from_packer(cls, packer, include_free_spaces=True):
+        return cls.from_shelves(packer.shelves, packer.unplaced_items, include_free_spaces)
+
+    @classmethod
+    def from_json(cls, state_dict: Dict[str, Any]):
+        """Builds the columns from the JSON view (get_packing_result_json() format)."""
+        shelves = []
+        has_free_spaces = False
+        for s in state_dict.get("shelves", []):
+            if "free_spaces" in s:
+                has_free_spaces = True
+            shelves.append({
+                "id": s.get("id"),
+                "width": s["width"], "height": s["height"], "depth": s["depth"],
+                "placed_items": [
+                    (pi["x"], pi["y"], pi["z"], pi["width"], pi["height"], pi["depth"],
+                     pi.get("item_type"), pi.get("color"))
+                    for pi in s.get("placed_items", [])
+                ],
+                "free_spaces": [
+                    (fs["x"], fs["y"], fs["z"], fs["width"], fs["height"], fs["depth"])
+                    for fs in s.get("free_spaces", [])
+                ],
+            })
+        unplaced = [
+            (ui["width"], ui["height"], ui["depth"], ui.get("item_type"), ui.get("color"))
+            for ui in state_dict.get("unplaced_items", [])
+        ]
+        return cls.from_shelves(shelves, unplaced, include_free_spaces=has_free_spaces)
+
+    # ---------- Views ----------
+
+    def iter_shelves(self):
+        """
+        Yields shelves in the packer's internal format (tuples), one shelf at a
+        time. Per-shelf slices come from the grouped index arrays, and rows are
+        converted with ndarray.tolist() so there is no per-field dict work.
+        """
+        a = self.arrays
+        n = len(a["shelf_id"])
+        placed_bounds = np.searchsorted(a["placed_shelf"], np.arange(n + 1))
+        free_bounds = np.searchsorted(a["free_shelf"], np.arange(n + 1))
+        types, colors = self.types, self.colors
+        shelf_ids = a["shelf_id"].tolist()
+        dims = a["shelf_dims"].tolist()
+
+        for row in range(n):
+            p0, p1 = placed_bounds[row], placed_bounds[row + 1]
+            f0, f1 = free_bounds[row], free_bounds[row + 1]
+            placed = [
+                (*box, types[t], colors[c])
+                for box, t, c in zip(
+                    a["placed_box"][p0:p1].tolist(),
+                    a["placed_type"][p0:p1].tolist(),
+                    a["placed_color"][p0:p1].tolist(),
+                )
+            ]
+            w, h, d = dims[row]
+            yield {
+                "id": shelf_ids[row],
+                "width": w,
+                "height": h,
+                "depth": d,
+                "placed_items": placed,
+                "free_spaces": [tuple(fs) for fs in a["free_box"][f0:f1].tolist()],
+            }
+
+    def unplaced_items(self):
+        a = self.arrays
+        return [
+            (w, h, d, self.types[t], self.colors[c])
+            for (w, h, d), t, c in zip(
+                a["unplaced_box"].tolist(),
+                a["unplaced_type"].tolist(),
+                a["unplaced_color"].tolist(),
+            )
+        ]
+
+    def to_json(self) -> Dict[str, Any]:
+        """Optional JSON view, same shape as get_packing_result_json()."""
+        shelves = []
+        for shelf in self.iter_shelves():
+            shelf_dict = {
+                "id": shelf["id"],
+                "width": shelf["width"],
+                "height": shelf["height"],
+                "depth": shelf["depth"],
+                "placed_items": [
+                    {"x": x, "y": y, "z": z, "width": w, "height": h, "depth": d,
+                     "item_type": item_type, "color": color}
+                    for (x, y, z, w, h, d, item_type, color) in shelf["placed_items"]
+                ],
+            }
+            if self.has_free_spaces:
+                shelf_dict["free_spaces"] = [
+                    {"x": x, "y": y, "z": z, "width": w, "height": h, "depth": d}
+                    for (x, y, z, w, h, d) in shelf["free_spaces"]
+                ]
+            shelves.append(shelf_dict)
+
+        return {
+            "shelves": shelves,
+            "unplaced_items": [
+                {"width": w, "height": h, "depth": d, "item_type": item_type, "color": color}
+                for (w, h, d, item_type, color) in self.unplaced_items()
+            ],
+        }
+
+    # ---------- Binary encoding ----------
+
+    def to_bytes(self) -> bytes:
+        offset = 0
+        layout = {}
+        buffers = []
+        for name in _SCHEMA:
+            arr = np.ascontiguousarray(self.arrays[name])
+            pad = (-offset) % 8
+            if pad:
+                buffers.append(b"\0" * pad)
+                offset += pad
+            layout[name] = {"shape": list(arr.shape), "offset": offset}
+            buffers.append(arr.tobytes())
+            offset += arr.nbytes
+
+        header = json.dumps({
+            "version": FORMAT_VERSION,
+            "types": self.types,
+            "colors": self.colors,
+            "has_free_spaces": self.has_free_spaces,
+            "arrays": layout,
+        }).encode("utf-8")
+        # keep the data section 8-byte aligned relative to the start of the buffer
+        header += b" " * ((-(len(MAGIC) + 4 + len(header))) % 8)
+        return b"".join([MAGIC, struct.pack("<I", len(header)), header] + buffers)
+
+    @classmethod
+    def from_bytes(cls, buf):
+        """Zero-copy load: arrays are read-only views into `buf`."""
+        view = memoryview(buf)
+        if bytes(view[:4]) != MAGIC:
+            raise ValueError("Not a columnar packing state (bad magic)")
+        (header_len,) = struct.unpack_from("<I", view, 4)
+        data_start = 8 + header_len
+        header = json.loads(bytes(view[8:data_start]).decode("utf-8"))
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar state version {header.get('version')}")
+
+        arrays = {}
+        for name, (dtype, _) in _SCHEMA.items():
+            spec = header["arrays"][name]
+            shape = tuple(spec["shape"])
+            count = int(np.prod(shape)) if shape else 0
+            arrays[name] = np.frombuffer(
+                view, dtype=dtype, count=count, offset=data_start + spec["offset"]
+            ).reshape(shape)
+
+        return cls(arrays, header["types"], header["colors"], header.get("has_free_spaces", True))
@@ -0,0 +1,178 @@
+# ShelfSpaceOptimization/shelf_state_store.py
+
+import json
+import os
+import sqlite3
+from collections import Counter
+from contextlib import closing
+from typing import Dict, Any, List, Optional, Tuple
+
+from .shelf_problem_new import FixedShelfPacker3DIncremental
+from .shelf_state import ColumnarState
+
+
+class StateVersionConflict(Exception):
+    """Raised when a write expects a version other than the stored one."""
+
+    def __init__(self, warehouse_id, expected_version, current_version):
+        super().__init__(
+            f"Packing state for {warehouse_id!r} is at version {current_version}, "
+            f"expected {expected_version}"
+        )
+        self.warehouse_id = warehouse_id
+        self.expected_version = expected_version
+        self.current_version = current_version
+
+
+class PackingStateStore:
+    """
+    Server-side packing state, one row per warehouse:
+      (warehouse_id, version, config JSON, columnar state blob)
+
+    version starts at 1 on the first write and is bumped on every write.
+    Writes are optimistic: put() only succeeds if the stored version still
+    equals `expected_version` (0 = "must not exist yet").
+    """
+
+    def __init__(self, path: str = "state/packing_state.sqlite3"):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS packing_state (
+                    warehouse_id TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    config TEXT NOT NULL,
+                    state BLOB NOT NULL
+                )
+                """
+            )
+
+    def _connect(self):
+        # one short-lived connection per call keeps this safe across request threads
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, warehouse_id: str) -> Tuple[int, Optional[Dict[str, Any]], Optional[ColumnarState]]:
+        """Returns (version, config, state); (0, None, None) when nothing is stored."""
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT version, config, state FROM packing_state WHERE warehouse_id = ?",
+                (warehouse_id,),
+            ).fetchone()
+        if row is None:
+            return 0, None, None
+        version, config, blob = row
+        return version, json.loads(config), ColumnarState.from_bytes(blob)
+
+    def put(self, warehouse_id: str, config: Dict[str, Any], state: ColumnarState, expected_version: int) -> int:
+        """Stores `state` if the current version equals `expected_version`; returns the new version."""
+        blob = state.to_bytes()
+        config_json = json.dumps(config)
+        conn = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front so check-and-set is atomic
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT version FROM packing_state WHERE warehouse_id = ?", (warehouse_id,)
+            ).fetchone()
+            current = row[0] if row else 0
+            if current != expected_version:
+                conn.rollback()
+                raise StateVersionConflict(warehouse_id, expected_version, current)
+
+            new_version = current + 1
+            conn.execute(
+                "INSERT OR REPLACE INTO packing_state (warehouse_id, version, config, state) VALUES (?, ?, ?, ?)",
+                (warehouse_id, new_version, config_json, blob),
+            )
+            conn.commit()
+            return new_version
+        finally:
+            conn.close()
+
+    def delete(self, warehouse_id: str):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM packing_state WHERE warehouse_id = ?", (warehouse_id,))
+
+
+CONFIG_KEYS = ("shelf_width", "shelf_height", "shelf_depth", "shelf_count", "compatibility_rules")
+
+
+def _free_space_json(fs):
+    x, y, z, w, h, d = fs
+    return {"x": x, "y": y, "z": z, "width": w, "height": h, "depth": d}
+
+
+def pack_delta(
+    store: PackingStateStore,
+    warehouse_id: str,
+    expected_version: int,
+    items: List[List[Any]],
+    config: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Places NEW items against the stored state of `warehouse_id` and returns only
+    what changed:
+      {
+        "warehouse_id": ..., "version": <new version>,
+        "placements": [{"index", "shelf_id", "x", "y", "z", "width", "height", "depth", "item_type", "color"}],
+        "unplaced": [{"index", "width", "height", "depth", "item_type", "color"}],
+        "free_space_changes": [{"shelf_id": .., "removed": [...], "added": [...]}]
+      }
+    `config` (shelf dims/count + compatibility_rules) is required for the first
+    write and optional afterwards; when given it replaces the stored config.
+    Raises StateVersionConflict if the stored version != expected_version, either
+    up front or because another writer got in while we were packing.
+    The stored state's unplaced_items are this delta's only (earlier ones were
+    returned by their own delta), so the state does not grow with rejections.
+    """
+    version, stored_config, state = store.get(warehouse_id)
+    if version != expected_version:
+        raise StateVersionConflict(warehouse_id, expected_version, version)
+
+    config = {k: config[k] for k in CONFIG_KEYS if k in config} if config else stored_config
+    # presence, not truthiness: compatibility_rules={} is a valid "no rules" config
+    if not config or any(config.get(k) is None for k in CONFIG_KEYS):
+        raise ValueError(f"Missing packing config for {warehouse_id!r}: {list(CONFIG_KEYS)}")
+
+    packer = FixedShelfPacker3DIncremental(
+        shelf_width=config["shelf_width"],
+        shelf_height=config["shelf_height"],
+        shelf_depth=config["shelf_depth"],
+        shelf_count=config["shelf_count"],
+        compatibility_rules=config["compatibility_rules"],
+        existing_state=state,
+    )
+
+    free_before = {shelf["id"]: list(shelf["free_spaces"]) for shelf in packer.shelves}
+
+    placements, unplaced = [], []
+    for record in packer.iter_place_items(items):
+        event = record.pop("event")
+        (placements if event == "placed" else unplaced).append(record)
+
+    # only shelves that received an item can have different free spaces
+    free_space_changes = []
+    shelves_by_id = {shelf["id"]: shelf for shelf in packer.shelves}
+    for shelf_id in sorted({p["shelf_id"] for p in placements}):
+        before = Counter(free_before[shelf_id])
+        after = Counter(shelves_by_id[shelf_id]["free_spaces"])
+        free_space_changes.append({
+            "shelf_id": shelf_id,
+            "removed": [_free_space_json(fs) for fs in (before - after).elements()],
+            "added": [_free_space_json(fs) for fs in (after - before).elements()],
+        })
+
+    packer.unplaced_items = [
+        (u["width"], u["height"], u["depth"], u["item_type"], u["color"]) for u in unplaced
+    ]
+    new_version = store.put(warehouse_id, config, packer.get_packing_result_columnar(), expected_version)
+
+    return {
+        "warehouse_id": warehouse_id,
+        "version": new_version,
+        "placements": placements,
+        "unplaced": unplaced,
+        "free_space_changes": free_space_changes,
+    }
@@ -0,0 +1,93 @@
+# benchmarks/bench_import_time.py
+"""
+Server start-up cost: time to import Server/main.app.py and the process's
+peak RSS right after, measured in a fresh interpreter per run (so nothing is
+already cached in sys.modules), then the same with subsystems warmed up.
+
+  python benchmarks/bench_import_time.py --repeat 5
+  python benchmarks/bench_import_time.py --warmup none render all --output startup.jsonl
+
+Prints one JSON object per run: import_ms, warmup_ms (plus per-subsystem
+timings from ServerRuntime.warmup.warm_up), max_rss_mb after import and after
+warm-up, and which heavy libraries were loaded at each point.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SERVER_DIR = os.path.join(ROOT, "Server")
+
+HEAVY_MODULES = ["matplotlib", "mpl_toolkits.mplot3d", "pandas", "ortools", "serial", "PIL", "numpy",
+                 "prophet", "torch", "ultralytics", "cv2", "sklearn"]
+
+# Runs in the child interpreter; prints one JSON line
+CHILD = r"""
+import importlib.util, json, resource, sys, time
+
+def rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
+
+heavy = HEAVY
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location("main_app", "main.app.py")
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+record = {
+    "import_ms": (time.perf_counter() - started) * 1000.0,
+    "max_rss_mb": rss_mb(),
+    "loaded": [m for m in heavy if m in sys.modules],
+}
+if WARMUP is not None:
+    started = time.perf_counter()
+    record["warmup"] = module.warm_up(module.parse_subsystems(WARMUP))
+    record["warmup_ms"] = (time.perf_counter() - started) * 1000.0
+    record["max_rss_mb_warm"] = rss_mb()
+    record["loaded_warm"] = [m for m in heavy if m in sys.modules]
+print(json.dumps(record))
+"""
+
+
+def measure(warmup):
+    code = CHILD.replace("HEAVY", repr(HEAVY_MODULES)).replace("WARMUP", repr(warmup))
+    proc = subprocess.run([sys.executable, "-c", code], cwd=SERVER_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Server import failed:\n{proc.stderr}")
+    # the server prints status lines; the record is the last line
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--warmup", nargs="+", default=["none", "all"],
+                        help="'none', 'all' or comma-separated subsystems (see ServerRuntime/warmup.py)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="append JSON lines here instead of stdout")
+    args = parser.parse_args()
+
+    meta = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+    out = open(args.output, "a") if args.output else sys.stdout
+    try:
+        for warmup in args.warmup:
+            for run in range(args.repeat):
+                record = measure(None if warmup == "none" else warmup)
+                out.write(json.dumps({**meta, "warmup_set": warmup, "run": run, **record}) + "\n")
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
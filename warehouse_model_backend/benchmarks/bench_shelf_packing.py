@@ -0,0 +1,237 @@
+# benchmarks/bench_shelf_packing.py
+"""
+Headless benchmark for FixedShelfPacker3D, FixedShelfPacker3DIncremental and
+compare_packers on synthetic carton streams.
+
+Each run prints one JSON object per line (or appends to --output), e.g.
+
+  python benchmarks/bench_shelf_packing.py --items 500 2000 --distribution lognormal \\
+      --hazard-mix normal=0.6,flammable=0.2,toxic=0.1,acid=0.1 --rules pairs --repeat 3
+
+Recorded per run: items/s, packing seconds, peak traced memory (separate
+tracemalloc pass so it does not skew timing), free-space list size sampled over
+time, utilization / used volume (exact, via get_metrics) and unplaced count.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ShelfSpaceOptimization.shelf_problem import FixedShelfPacker3D
+from ShelfSpaceOptimization.shelf_problem_new import FixedShelfPacker3DIncremental
+from ShelfSpaceOptimization.shelf_compare import compare_packers
+
+HAZARD_TYPES = ["normal", "flammable", "toxic", "acid", "corrosive", "explosive", "biohazard"]
+
+# Compatibility presets: which types may share a shelf
+RULE_PRESETS = {
+    # every type on its own shelves
+    "strict": lambda types: {t: [t] for t in types},
+    # normal goods mix with everything except explosives; hazards pair up
+    "pairs": lambda types: {
+        "normal": [t for t in types if t != "explosive"],
+        "flammable": ["flammable", "normal"],
+        "toxic": ["toxic", "biohazard", "normal"],
+        "biohazard": ["biohazard", "toxic", "normal"],
+        "acid": ["acid", "corrosive", "normal"],
+        "corrosive": ["corrosive", "acid", "normal"],
+        "explosive": ["explosive"],
+    },
+    # anything goes
+    "open": lambda types: {t: list(types) for t in types},
+}
+
+
+def _size_sampler(distribution, rng, min_side, max_side):
+    if distribution == "uniform":
+        return lambda: rng.randint(min_side, max_side)
+    if distribution == "lognormal":
+        # many small cartons, long tail of big ones
+        mid = (min_side * max_side) ** 0.5
+        return lambda: int(min(max_side, max(min_side, rng.lognormvariate(0, 0.6) * mid / 1.5)))
+    if distribution == "bimodal":
+        small = (min_side, max(min_side, (min_side + max_side) // 3))
+        large = (max(min_side, (2 * max_side) // 3), max_side)
+        return lambda: rng.randint(*(small if rng.random() < 0.75 else large))
+    raise ValueError(f"Unknown distribution {distribution!r}")
+
+
+def parse_mix(text):
+    """'normal=0.6,toxic=0.4' -> {'normal': 0.6, 'toxic': 0.4}"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(HAZARD_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown hazard types {sorted(unknown)}; known: {HAZARD_TYPES}")
+    return mix
+
+
+def generate_cartons(count, distribution, hazard_mix, seed, min_side, max_side):
+    """Deterministic carton stream: list of [w, h, d, item_type, None]."""
+    rng = random.Random(seed)
+    side = _size_sampler(distribution, rng, min_side, max_side)
+    types, weights = zip(*hazard_mix.items())
+    return [[side(), side(), side(), rng.choices(types, weights)[0], None] for _ in range(count)]
+
+
+def _free_space_count(packer):
+    return sum(len(s["free_spaces"]) for s in packer.shelves)
+
+
+def _make_packer(kind, args, rules):
+    cls = FixedShelfPacker3D if kind == "full" else FixedShelfPacker3DIncremental
+    return cls(
+        shelf_width=args.shelf_width,
+        shelf_height=args.shelf_height,
+        shelf_depth=args.shelf_depth,
+        shelf_count=args.shelf_count,
+        compatibility_rules=rules,
+    )
+
+
+def _pack(kind, args, rules, cartons, sample_every=None):
+    """Packs all cartons one by one; returns (packer, seconds, free-space samples)."""
+    packer = _make_packer(kind, args, rules)
+    samples = []
+    started = time.perf_counter()
+    if kind == "full":
+        for c in cartons:
+            packer.add_item(*c)
+        for i in range(len(cartons)):
+            packer.place_item()
+            if sample_every and (i + 1) % sample_every == 0:
+                samples.append([i + 1, _free_space_count(packer)])
+    else:
+        for i, _ in enumerate(packer.iter_place_items(cartons)):
+            if sample_every and (i + 1) % sample_every == 0:
+                samples.append([i + 1, _free_space_count(packer)])
+    return packer, time.perf_counter() - started, samples
+
+
+def bench_packer(kind, args, rules, cartons):
+    # timing pass (free-space sampling is cheap: a sum over shelves every K items)
+    packer, seconds, samples = _pack(kind, args, rules, cartons, sample_every=args.sample_every)
+
+    # memory pass
+    tracemalloc.start()
+    _pack(kind, args, rules, cartons)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # outside the timed passes, so the exact (union) volume costs nothing here
+    metrics = packer.get_metrics(exact=True)
+    return {
+        "seconds": seconds,
+        "items_per_s": len(cartons) / seconds if seconds > 0 else None,
+        "peak_mem_bytes": peak,
+        "free_spaces_final": _free_space_count(packer),
+        "free_spaces_over_time": samples,
+        "utilization_pct": metrics["utilization_pct"],
+        "used_volume": metrics["used_volume"],
+        "placed_volume_sum": metrics["placed_volume_sum"],
+        "unplaced_count": metrics["unplaced_count"],
+    }
+
+
+def bench_compare(args, rules, cartons):
+    # half the stream is "already on the shelves", the other half arrives new
+    split = len(cartons) // 2
+    existing = _make_packer("incremental", args, rules)
+    for _ in existing.iter_place_items(cartons[:split]):
+        pass
+    payload = {
+        "shelf_width": args.shelf_width,
+        "shelf_height": args.shelf_height,
+        "shelf_depth": args.shelf_depth,
+        "shelf_count": args.shelf_count,
+        "compatibility_rules": rules,
+        "items": cartons[split:],
+        "existing_state": existing.get_packing_result_json(),
+    }
+    started = time.perf_counter()
+    result = compare_packers(payload)
+    seconds = time.perf_counter() - started
+    return {
+        "seconds": seconds,
+        "items_per_s": len(cartons) / seconds if seconds > 0 else None,
+        "better_method": result["better_method"],
+        "full_utilization_pct": result["full"]["utilization_pct"],
+        "incremental_utilization_pct": result["incremental"]["utilization_pct"],
+        "full_unplaced_count": result["full"]["unplaced_count"],
+        "incremental_unplaced_count": result["incremental"]["unplaced_count"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, nargs="+", default=[200, 1000], help="carton counts to run")
+    parser.add_argument("--packers", default="full,incremental,compare",
+                        help="comma list of: full, incremental, compare")
+    parser.add_argument("--distribution", choices=["uniform", "lognormal", "bimodal"], default="uniform")
+    parser.add_argument("--hazard-mix", default="normal=0.6,flammable=0.15,toxic=0.1,acid=0.1,explosive=0.05",
+                        help="type=weight,... over " + ",".join(HAZARD_TYPES))
+    parser.add_argument("--rules", choices=sorted(RULE_PRESETS), default="pairs")
+    parser.add_argument("--min-side", type=int, default=5)
+    parser.add_argument("--max-side", type=int, default=40)
+    parser.add_argument("--shelf-width", type=float, default=100)
+    parser.add_argument("--shelf-height", type=float, default=50)
+    parser.add_argument("--shelf-depth", type=float, default=60)
+    parser.add_argument("--shelf-count", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sample-every", type=int, default=50, help="free-space sample interval (items)")
+    parser.add_argument("--output", help="append JSON lines here instead of stdout")
+    args = parser.parse_args(argv)
+
+    hazard_mix = parse_mix(args.hazard_mix)
+    rules = RULE_PRESETS[args.rules](HAZARD_TYPES)
+    packers = [p.strip() for p in args.packers.split(",") if p.strip()]
+
+    out = open(args.output, "a") if args.output else sys.stdout
+    try:
+        for count in args.items:
+            for rep in range(args.repeat):
+                seed = args.seed + rep
+                cartons = generate_cartons(count, args.distribution, hazard_mix, seed,
+                                           args.min_side, args.max_side)
+                for kind in packers:
+                    if kind == "compare":
+                        stats = bench_compare(args, rules, cartons)
+                    elif kind in ("full", "incremental"):
+                        stats = bench_packer(kind, args, rules, cartons)
+                    else:
+                        raise ValueError(f"Unknown packer {kind!r}")
+
+                    record = {
+                        "benchmark": "shelf_packing",
+                        "packer": kind,
+                        "items": count,
+                        "repeat": rep,
+                        "seed": seed,
+                        "distribution": args.distribution,
+                        "hazard_mix": hazard_mix,
+                        "rules": args.rules,
+                        "shelf": [args.shelf_width, args.shelf_height, args.shelf_depth, args.shelf_count],
+                        "python": platform.python_version(),
+                        "timestamp": datetime.now(timezone.utc).isoformat(),
+                        **stats,
+                    }
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# tests/test_serial_writer.py
+"""
+SerialWriter against a fake port whose first write fails, so no hardware or
+pyserial URL handler is needed:
+
+  python -m pytest tests/test_serial_writer.py
+"""
+
+import os
+import sys
+import time
+
+import pytest
+import serial
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ServerRuntime.serial_writer import SerialWriter
+
+
+class FlakyPort:
+    """Stands in for serial.Serial; the first `failures` writes raise like an unplugged cable."""
+
+    def __init__(self, failures=1):
+        self.failures = failures
+        self.lines = []
+        self.is_open = True
+
+    def write(self, data):
+        if self.failures:
+            self.failures -= 1
+            raise serial.SerialException("device reports readiness to read but returned no data")
+        self.lines.append(data.decode("utf-8").strip())
+        return len(data)
+
+    def close(self):
+        self.is_open = False
+
+
+@pytest.fixture
+def flaky_port(monkeypatch):
+    port = FlakyPort(failures=1)
+    monkeypatch.setattr(serial, "serial_for_url", lambda *args, **kwargs: port)
+    return port
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_resend_after_failed_write_is_not_coalesced(flaky_port):
+    writer = SerialWriter("fake://", heartbeat_interval=None, reconnect_interval=0.0)
+    writer.start()
+    try:
+        assert writer.send("1,0,0,0")
+        assert _wait_for(lambda: writer.stats()["write_errors"] == 1)
+
+        # the first copy never reached the port, so this one must be written
+        assert writer.send("1,0,0,0")
+        assert _wait_for(lambda: flaky_port.lines == ["1,0,0,0"])
+
+        # now it is on the wire: an identical signal is coalesced
+        assert not writer.send("1,0,0,0")
+        stats = writer.stats()
+        assert stats["writes"] == 1 and stats["dropped"] == 1 and stats["coalesced"] == 1
+    finally:
+        writer.stop()
+
+
+def test_heartbeat_resends_newest_requested_signal(flaky_port):
+    writer = SerialWriter("fake://", heartbeat_interval=0.05, reconnect_interval=0.0)
+    writer.start()
+    try:
+        writer.send("0,1,0,0")  # dropped by the failing write
+        assert _wait_for(lambda: flaky_port.lines[:1] == ["0,1,0,0"])
+        assert writer.stats()["last_signal"] == "0,1,0,0"
+
+        writer.send("0,0,1,0")
+        assert _wait_for(lambda: flaky_port.lines[-1:] == ["0,0,1,0"])
+        # heartbeats keep repeating the newest signal, never an older one
+        first = flaky_port.lines.index("0,0,1,0")
+        assert _wait_for(lambda: len(flaky_port.lines) >= first + 3)
+        assert set(flaky_port.lines[:first]) == {"0,1,0,0"}
+        assert set(flaky_port.lines[first:]) == {"0,0,1,0"}
+    finally:
+        writer.stop()
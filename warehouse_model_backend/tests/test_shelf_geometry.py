@@ -0,0 +1,83 @@
+# tests/test_shelf_geometry.py
+"""
+Volume and free-space geometry against a brute-force voxel grid (integer
+layouts, so every unit cube is either covered or not):
+
+  python -m pytest tests/test_shelf_geometry.py
+"""
+
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ShelfSpaceOptimization import shelf_geometry
+from ShelfSpaceOptimization.shelf_geometry import occupied_volume, packing_metrics, reconstruct_free_spaces
+from ShelfSpaceOptimization.shelf_problem_new import FixedShelfPacker3DIncremental
+
+
+def _voxels(boxes, width, height, depth):
+    """Boolean (width, height, depth) grid of the unit cubes covered by `boxes` (clipped to the shelf)."""
+    grid = np.zeros((width, height, depth), dtype=bool)
+    for x, y, z, w, h, d in (tuple(int(round(v)) for v in b[:6]) for b in boxes):
+        grid[max(0, x):max(0, x + w), max(0, y):max(0, y + h), max(0, z):max(0, z + d)] = True
+    return grid
+
+
+def _random_boxes(rng, width, height, depth, count):
+    # overlapping and partly outside the shelf on purpose
+    return [
+        (rng.randint(-2, width), rng.randint(-2, height), rng.randint(-2, depth),
+         rng.randint(1, 6), rng.randint(1, 6), rng.randint(1, 6), "a", None)
+        for _ in range(count)
+    ]
+
+
+def test_occupied_volume_counts_overlaps_once(monkeypatch):
+    rng = random.Random(7)
+    for chunk_cells in (shelf_geometry._UNION_CHUNK_CELLS, 7):  # one chunk / many x chunks
+        monkeypatch.setattr(shelf_geometry, "_UNION_CHUNK_CELLS", chunk_cells)
+        for _ in range(100):
+            width, height, depth = rng.randint(3, 15), rng.randint(3, 15), rng.randint(3, 15)
+            boxes = _random_boxes(rng, width, height, depth, rng.randint(0, 25))
+            assert occupied_volume(width, height, depth, boxes) == _voxels(boxes, width, height, depth).sum()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_reconstructed_free_spaces_cover_the_packers_free_volume(seed):
+    rng = random.Random(seed)
+    packer = FixedShelfPacker3DIncremental(10, 8, 6, 3, {"a": ["a"], "b": ["b"]})
+    items = [[rng.randint(1, 5), rng.randint(1, 4), rng.randint(1, 3), rng.choice("ab"), None] for _ in range(40)]
+    for _ in packer.iter_place_items(items):
+        pass
+
+    for shelf in packer.shelves:
+        placed = _voxels(shelf["placed_items"], 10, 8, 6)
+        free = reconstruct_free_spaces(10, 8, 6, shelf["placed_items"])
+        rebuilt = np.zeros_like(placed, dtype=int)
+        for box in free:
+            rebuilt += _voxels([box], 10, 8, 6)
+
+        # disjoint boxes that fill exactly the volume no item occupies
+        assert rebuilt.max(initial=0) <= 1
+        assert np.array_equal(rebuilt.astype(bool), ~placed)
+        assert sum(w * h * d for _, _, _, w, h, d in free) == 10 * 8 * 6 - occupied_volume(10, 8, 6, shelf["placed_items"])
+        # everything the packer itself still offers (and no item uses) survives the rebuild;
+        # its own free spaces overlap each other and placed items, so their plain sum is no oracle
+        packer_free = _voxels(shelf["free_spaces"], 10, 8, 6) & ~placed
+        assert not (packer_free & ~rebuilt.astype(bool)).any()
+
+
+def test_packing_metrics_never_exceed_capacity():
+    # two identical boxes on the same spot: summed volume is twice the union
+    shelf = {"width": 4, "height": 4, "depth": 4,
+             "placed_items": [(0, 0, 0, 4, 4, 2, "a", None), (0, 0, 0, 4, 4, 2, "a", None)]}
+    metrics = packing_metrics([shelf], unplaced_count=0)
+    assert metrics["used_volume"] == 32
+    assert metrics["utilization_pct"] == 50.0
+    assert metrics["placed_volume_sum"] == 64
+    assert packing_metrics([shelf], unplaced_count=0, exact=False)["used_volume"] == 64
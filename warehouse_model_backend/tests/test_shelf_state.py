@@ -0,0 +1,69 @@
+# tests/test_shelf_state.py
+"""
+Columnar packing state: binary round trip and packer reload.
+
+  python -m pytest tests/test_shelf_state.py
+"""
+
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ShelfSpaceOptimization.shelf_problem_new import FixedShelfPacker3DIncremental
+from ShelfSpaceOptimization.shelf_state import ColumnarState
+
+
+def _packed(seed=3):
+    rng = random.Random(seed)
+    packer = FixedShelfPacker3DIncremental(12, 10, 8, 3, {"a": ["a"], "b": ["b", "c"], "c": ["b", "c"]})
+    items = [
+        [rng.randint(1, 5), rng.randint(1, 5), rng.randint(1, 4), rng.choice("abc"), rng.choice(["red", None])]
+        for _ in range(40)
+    ]
+    for item in items:
+        packer.add_item(*item)
+    packer.place_all_new_items()
+    return packer
+
+
+@pytest.mark.parametrize("include_free_spaces", [True, False])
+def test_bytes_round_trip(include_free_spaces):
+    packer = _packed()
+    assert packer.unplaced_items  # both sections are exercised
+    state = packer.get_packing_result_columnar(include_free_spaces=include_free_spaces)
+
+    loaded = ColumnarState.from_bytes(state.to_bytes())
+
+    assert loaded.has_free_spaces == include_free_spaces
+    assert loaded.to_json() == state.to_json()
+    assert loaded.to_json() == packer.get_packing_result_json(include_free_spaces=include_free_spaces)
+    for name, arr in state.arrays.items():
+        assert loaded.arrays[name].dtype == arr.dtype
+        np.testing.assert_array_equal(loaded.arrays[name], arr)
+
+
+def test_from_bytes_does_not_copy():
+    blob = bytearray(_packed().get_packing_result_columnar().to_bytes())
+    loaded = ColumnarState.from_bytes(blob)
+    box = loaded.arrays["placed_box"]
+    assert not box.flags.owndata
+    assert np.shares_memory(box, np.frombuffer(blob, dtype=np.uint8))
+
+
+def test_reloaded_packer_continues_from_the_same_layout():
+    packer = _packed()
+    reloaded = FixedShelfPacker3DIncremental(
+        12, 10, 8, 3, {"a": ["a"], "b": ["b", "c"], "c": ["b", "c"]},
+        existing_state=ColumnarState.from_bytes(packer.get_packing_result_columnar().to_bytes()),
+    )
+    assert reloaded.get_packing_result_json() == packer.get_packing_result_json()
+
+
+def test_rejects_foreign_bytes():
+    with pytest.raises(ValueError):
+        ColumnarState.from_bytes(b"GIF89a" + b"\0" * 32)
@@ -0,0 +1,54 @@
+# tests/test_shelf_state_store.py
+"""
+Versioned packing state (PackingStateStore / pack_delta) on a throwaway
+SQLite file:
+
+  python -m pytest tests/test_shelf_state_store.py
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ShelfSpaceOptimization.shelf_state_store import PackingStateStore, StateVersionConflict, pack_delta
+
+CONFIG = {
+    "shelf_width": 10, "shelf_height": 10, "shelf_depth": 10, "shelf_count": 2,
+    "compatibility_rules": {},  # no rules is a valid config
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PackingStateStore(str(tmp_path / "packing_state.sqlite3"))
+
+
+def test_stale_expected_version_is_rejected(store):
+    first = pack_delta(store, "wh-1", 0, [[2, 2, 2, "a", "red"]], CONFIG)
+    assert first["version"] == 1 and len(first["placements"]) == 1
+
+    second = pack_delta(store, "wh-1", 1, [[3, 3, 3, "b", "blue"]])
+    assert second["version"] == 2
+
+    # a writer still holding version 1 must not overwrite version 2
+    with pytest.raises(StateVersionConflict) as conflict:
+        pack_delta(store, "wh-1", 1, [[1, 1, 1, "a", "red"]])
+    assert (conflict.value.expected_version, conflict.value.current_version) == (1, 2)
+
+    version, config, state = store.get("wh-1")
+    assert version == 2 and config == CONFIG
+    assert sum(len(shelf["placed_items"]) for shelf in state.iter_shelves()) == 2
+
+
+def test_first_write_must_expect_version_zero(store):
+    with pytest.raises(StateVersionConflict):
+        pack_delta(store, "wh-2", 3, [[1, 1, 1, "a", "red"]], CONFIG)
+    assert store.get("wh-2") == (0, None, None)
+
+
+def test_config_is_required_for_the_first_write(store):
+    with pytest.raises(ValueError):
+        pack_delta(store, "wh-3", 0, [[1, 1, 1, "a", "red"]])